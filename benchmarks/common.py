@@ -0,0 +1,105 @@
+"""
+Shared setup for the benchmark scripts.
+
+Each benchmark runs against a throwaway SQLite database so the project
+database is never touched:
+
+    python -m benchmarks.search_bench --products 100000
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(db_path=None):
+    """Configures Django on a scratch database and applies the migrations."""
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shop.settings")
+
+    from django.conf import settings
+    if db_path is None:
+        db_path = Path(tempfile.mkdtemp()) / "bench.sqlite3"
+    settings.DATABASES["default"]["NAME"] = str(db_path)
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+    return db_path
+
+
+WORDS = (
+    "wireless bluetooth gaming laptop keyboard mechanical earbuds headphones noise "
+    "cancelling mouse monitor ultra slim pro max mini portable charger speaker usb "
+    "console controller camera lens tripod smart watch fitness tracker tablet stylus"
+).split()
+SYLLABLES = "ka ro mi zen tor vex lu pha dri nox qua sel tri bo xen ly".split()
+# Real catalogs have a long tail of model names and features, so term
+# frequencies follow a Zipf-like curve instead of every word being common.
+VOCABULARY = WORDS + [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+VOCABULARY_WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def words(rng, k):
+    return " ".join(rng.choices(VOCABULARY, weights=VOCABULARY_WEIGHTS, k=k))
+
+
+def populate_catalog(n_products, seed=1, batch_size=5000):
+    """
+    Bulk creates a synthetic catalog. bulk_create bypasses the model signals,
+    so derived indexes must be rebuilt by the caller.
+    """
+    from products.models import Brand, Category, Product, SubCategory
+
+    rng = random.Random(seed)
+    brands = Brand.objects.bulk_create([Brand(name=f"Brand{i} {rng.choice(WORDS)}") for i in range(50)])
+    categories = Category.objects.bulk_create([Category(name=f"Category{i}") for i in range(12)])
+    subcategories = SubCategory.objects.bulk_create([
+        SubCategory(name=f"{rng.choice(WORDS)} {i}", category=rng.choice(categories)) for i in range(60)
+    ])
+
+    batch = []
+    for i in range(n_products):
+        subcategory = rng.choice(subcategories)
+        batch.append(Product(
+            name=f"{words(rng, 3)} {i}",
+            description=words(rng, 25),
+            brand=rng.choice(brands),
+            category_id=subcategory.category_id,
+            subcategory=subcategory,
+            price=Decimal(rng.randint(500, 300000)) / 100,
+            stock=rng.randint(0, 50),
+        ))
+        if len(batch) >= batch_size:
+            Product.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Product.objects.bulk_create(batch)
+
+
+def measure(fn, repeat=20, warmup=2):
+    """Returns (median, p95) wall time of fn() in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def report(label, timings):
+    median, p95 = timings
+    print(f"{label:<48} median {median:8.2f} ms   p95 {p95:8.2f} ms")
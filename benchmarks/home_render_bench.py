@@ -0,0 +1,48 @@
+"""
+Render time of the storefront home page with a cold and a warm product
+card cache, for the anonymous and the logged-in card variants.
+
+    python -m benchmarks.home_render_bench --products 20000
+"""
+import argparse
+
+from benchmarks.common import measure, populate_catalog, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from products.cards import card_cache
+
+    print(f"Populating {args.products} products...")
+    populate_catalog(args.products)
+
+    anonymous = Client()
+    logged_in = Client()
+    user = get_user_model().objects.create_user(username="bench", email="bench@example.com", password="bench")
+    logged_in.force_login(user)
+    pages = ["/", "/?sort=price-asc", "/?sort=rating"]
+
+    def render(client, cold):
+        def run():
+            for url in pages:
+                if cold:
+                    card_cache().clear()
+                response = client.get(url)
+                assert response.status_code == 200, response.status_code
+        return run
+
+    for label, client in (("anonymous", anonymous), ("logged in", logged_in)):
+        report(f"home, {label}, cold card cache (3 pages)", measure(render(client, True), repeat=args.repeat))
+        report(f"home, {label}, warm card cache (3 pages)", measure(render(client, False), repeat=args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Throughput of the import_catalog command: a fresh import of a generated
+feed, then a second pass over the same feed that updates every row.
+
+    python -m benchmarks.import_bench --products 1000000
+"""
+import argparse
+import csv
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import WORDS, setup_django, words
+
+
+def write_feed(path, n_products, seed=1):
+    rng = random.Random(seed)
+    brands = [f"Brand{i} {rng.choice(WORDS)}" for i in range(50)]
+    subcategories = [(f"Category{i % 12}", f"{rng.choice(WORDS)} {i}") for i in range(60)]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sku", "name", "description", "brand", "category", "subcategory", "price", "stock"])
+        for i in range(n_products):
+            category, subcategory = rng.choice(subcategories)
+            writer.writerow([
+                f"SKU{i:08d}", f"{words(rng, 3)} {i}", words(rng, 25), rng.choice(brands),
+                category, subcategory, f"{rng.randint(500, 300000) / 100:.2f}", rng.randint(0, 50),
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from products.importer import import_catalog
+
+    feed = Path(tempfile.mkdtemp()) / "feed.csv"
+    print(f"Writing a {args.products} row feed...")
+    write_feed(feed, args.products)
+
+    for label in ("fresh import", "re-import (updates)"):
+        start = time.perf_counter()
+        result = import_catalog(feed, batch_size=args.batch_size, refresh_similar=False)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<24} {result.rows} rows in {elapsed:7.1f} s   {result.rows / elapsed:9.0f} rows/s "
+              f"({result.created} created, {result.updated} updated)")
+
+
+if __name__ == "__main__":
+    main()
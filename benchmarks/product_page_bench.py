@@ -0,0 +1,66 @@
+"""
+Compares the per-view similar-products query the product page used to run
+with the precomputed ProductNeighbors lookup, and times the whole page.
+
+    python -m benchmarks.product_page_bench --products 100000
+"""
+import argparse
+import random
+
+from benchmarks.common import measure, populate_catalog, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db.models import Avg, F
+    from django.test import Client
+    from products.catalog import get_catalog
+    from products.models import Product
+    from products.similar import build_neighbors
+
+    print(f"Populating {args.products} products...")
+    populate_catalog(args.products)
+    print(f"Built {build_neighbors()} similar-product lists.")
+
+    ids = list(Product.objects.values_list("id", flat=True))
+    rng = random.Random(7)
+    sample = [rng.choice(ids) for _ in range(args.repeat + 2)]
+    get_catalog()
+
+    def per_view_query():
+        # What view_more ran before the lists were precomputed.
+        product = Product.objects.get(id=rng.choice(sample))
+        return list(
+            Product.objects.filter(subcategory=product.subcategory)
+            .exclude(id=product.id)
+            .annotate(avg_rating=Avg("order_reviews__rating"))[:10]
+        )
+
+    def precomputed():
+        product = (
+            Product.objects.select_related("neighbors")
+            .annotate(avg_rating=F("rating_stats__mean"))
+            .get(id=rng.choice(sample))
+        )
+        catalog = get_catalog()
+        return [catalog.product_by_id[i] for i in product.neighbors.ids]
+
+    client = Client()
+
+    def page():
+        response = client.get(f"/product/{rng.choice(sample)}/")
+        assert response.status_code == 200, response.status_code
+
+    report("similar products, per-view query", measure(per_view_query, repeat=args.repeat))
+    report("similar products, precomputed", measure(precomputed, repeat=args.repeat))
+    report("product page, full render", measure(page, repeat=args.repeat))
+
+
+if __name__ == "__main__":
+    main()
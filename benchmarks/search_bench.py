@@ -0,0 +1,50 @@
+"""
+Compares the FTS5 search path with the original icontains/Q-object search.
+
+    python -m benchmarks.search_bench --products 100000
+"""
+import argparse
+
+from benchmarks.common import measure, populate_catalog, report, setup_django
+
+QUERIES = ["wireless", "gaming lap", "noise cancelling headphones", "brand7", "kazen"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db.models import Q
+    from products.models import Product
+    from products.search import filter_by_query, order_by_relevance, rebuild_index
+
+    print(f"Populating {args.products} products...")
+    populate_catalog(args.products)
+    rebuild_index()
+
+    def q_path(query):
+        # The search home() used before the FTS index existed.
+        qs = Product.objects.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(brand__name__icontains=query) |
+            Q(category__name__icontains=query) |
+            Q(subcategory__name__icontains=query)
+        ).distinct()
+        return qs.count(), list(qs[:10])
+
+    def fts_path(query):
+        qs = order_by_relevance(filter_by_query(Product.objects.all(), query))
+        return qs.count(), list(qs[:10])
+
+    for query in QUERIES:
+        report(f"Q objects  {query!r}", measure(lambda: q_path(query), repeat=args.repeat))
+        report(f"FTS5/BM25  {query!r}", measure(lambda: fts_path(query), repeat=args.repeat))
+
+
+if __name__ == "__main__":
+    main()
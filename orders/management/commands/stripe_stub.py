@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from orders.stripe_stub import StripeStub
+
+
+class Command(BaseCommand):
+    help = "Serve a local stub of the Stripe PaymentIntents API for offline runs (see orders.stripe_stub)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=12111)
+        parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+
+    def handle(self, *args, **options):
+        stub = StripeStub(options["host"], options["port"], options["latency"])
+        self.stdout.write(f"Stripe stub on {stub.url}; set STRIPE_API_BASE={stub.url}. Ctrl-C to stop.")
+        try:
+            stub.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.server.server_close()
+            self.stdout.write(f"Served {stub.requests} requests.")
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_coupon'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartPaymentIntent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart_key', models.CharField(max_length=64, unique=True)),
+                ('intent_id', models.CharField(db_index=True, max_length=255)),
+                ('client_secret', models.CharField(max_length=255)),
+                ('amount', models.PositiveIntegerField()),
+                ('cart_hash', models.CharField(max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -41,6 +41,18 @@ class Order(models.Model):
         return f"Order {self.id} - {self.email}"
 
 
+class CartPaymentIntent(models.Model):
+    """The Stripe PaymentIntent opened for a cart, reused while the cart is unpaid (see orders.payments)."""
+    cart_key = models.CharField(max_length=64, unique=True)
+    intent_id = models.CharField(max_length=255, db_index=True)
+    client_secret = models.CharField(max_length=255)
+    amount = models.PositiveIntegerField()  # cents
+    cart_hash = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.intent_id} ({self.cart_key})"
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
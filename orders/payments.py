@@ -0,0 +1,103 @@
+"""
+PaymentIntents of carts.
+
+create_payment_intent asks for an intent for the cart's current quote
+(orders.pricing). The intent is recorded against the cart in
+CartPaymentIntent, with its amount and a hash of the cart's lines,
+coupon and amount, and is reused:
+
+- same hash: the recorded client secret is returned once Stripe confirms
+  the intent can still be paid (one read, no write),
+- another hash: the intent is updated in place with the new amount,
+- no intent yet, or the intent was paid or canceled meanwhile (say the
+  order was never completed): a new one is created.
+
+Creates and updates carry idempotency keys derived from the cart, its
+version and the hash, so a retried or doubled request never opens a
+second intent, while a cart that returns to an earlier state (a new
+version) still gets its update. complete_order forgets the intent once
+the order exists.
+
+Every Stripe call goes through one shared HTTP client, which keeps its
+connections alive, has connect and read timeouts (STRIPE_TIMEOUT) and
+retries failed calls (STRIPE_MAX_NETWORK_RETRIES). STRIPE_API_BASE points
+the calls at another server, such as the local stub (orders.stripe_stub).
+"""
+import hashlib
+import json
+
+import stripe
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from shop.carts import get_cart
+from .models import CartPaymentIntent
+
+CURRENCY = "usd"
+# Intents in these states cannot be paid (again) or updated.
+FINAL_STATUSES = ("succeeded", "canceled")
+
+
+def configure():
+    """Points the stripe library at STRIPE_API_BASE through the shared client; run at startup."""
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.api_base = settings.STRIPE_API_BASE
+    stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+    # One session per thread, reused across requests (keep-alive).
+    stripe.default_http_client = stripe.RequestsClient(timeout=settings.STRIPE_TIMEOUT)
+
+
+def cart_hash(cart, amount, coupon_code):
+    payload = json.dumps([sorted(cart.lines()), amount, CURRENCY, coupon_code])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def payment_intent(request, quote):
+    """
+    The (intent id, client secret) to pay quote, the current quote of the
+    request's cart, opening or updating a PaymentIntent only when needed.
+    """
+    cart = get_cart(request)
+    amount = int(quote["final_total"] * 100)
+    digest = cart_hash(cart, amount, quote["coupon_code"])
+    record = CartPaymentIntent.objects.filter(cart_key=cart.key).first()
+    intent = None
+    if record is not None:
+        try:
+            if record.cart_hash == digest:
+                intent = stripe.PaymentIntent.retrieve(record.intent_id)
+                if intent.status not in FINAL_STATUSES:
+                    return record.intent_id, record.client_secret
+                intent = None
+            else:
+                intent = stripe.PaymentIntent.modify(
+                    record.intent_id, amount=amount, metadata={"cart_hash": digest},
+                    idempotency_key=f"pi-update:{record.intent_id}:{cart.version}:{digest}",
+                )
+        except stripe.InvalidRequestError:
+            # Paid, canceled or gone since: start over.
+            intent = None
+    if intent is None:
+        # Keyed apart from the intent it replaces, which may have been created for this very cart version.
+        replaced = record.intent_id if record is not None else ""
+        intent = stripe.PaymentIntent.create(
+            amount=amount, currency=CURRENCY, metadata={"cart_hash": digest},
+            idempotency_key=f"pi-create:{cart.key}:{cart.version}:{digest}:{replaced}",
+        )
+    remember(cart.key, intent, amount, digest)
+    return intent.id, intent.client_secret
+
+
+def remember(cart_key, intent, amount, digest):
+    values = {"intent_id": intent.id, "client_secret": intent.client_secret, "amount": amount, "cart_hash": digest}
+    try:
+        with transaction.atomic():
+            CartPaymentIntent.objects.update_or_create(cart_key=cart_key, defaults=values)
+    except IntegrityError:
+        # A parallel request recorded the cart's intent first; both got it from the same idempotency key.
+        CartPaymentIntent.objects.filter(cart_key=cart_key).update(**values)
+
+
+def forget(intent_id):
+    """Drops the record of a paid intent, so the cart's next checkout opens a new one."""
+    CartPaymentIntent.objects.filter(intent_id=intent_id).delete()
@@ -0,0 +1,65 @@
+"""
+Cart quotes: subtotal, coupon discount, shipping and total.
+
+The cart page shows the quote of the server-side cart (/orders/quote/)
+and create_payment_intent charges the same amounts, so a PaymentIntent
+is only created once the visitor actually pays. A quote depends on the
+cart's lines, the product prices and the session's coupon, so it is
+memoized in QUOTE_CACHE under the cart's version, the catalog version
+and the coupon; any of them moving retires it.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+
+from products.catalog import get_catalog
+from shop.carts import get_cart
+from .models import Coupon
+
+# Orders below FREE_SHIPPING_FROM (after the discount) pay SHIPPING_RATE of it for shipping.
+FREE_SHIPPING_FROM = Decimal("300")
+SHIPPING_RATE = Decimal("0.10")
+
+
+def session_coupon(request):
+    """The valid coupon applied to the session, if any."""
+    coupon_id = request.session.get("coupon_id")
+    if not coupon_id:
+        return None
+    coupon = Coupon.objects.filter(id=coupon_id).first()
+    return coupon if coupon is not None and coupon.is_valid() else None
+
+
+def price(subtotal, coupon=None):
+    """The quote of a cart worth subtotal (a Decimal) with coupon applied."""
+    discount = subtotal * coupon.discount / Decimal("100") if coupon else Decimal("0")
+    after_discount = max(subtotal - discount, Decimal("0"))
+    shipping_fee = after_discount * SHIPPING_RATE if after_discount < FREE_SHIPPING_FROM else Decimal("0")
+    return {
+        "subtotal": subtotal,
+        "discount": discount,
+        "shipping_fee": shipping_fee,
+        "final_total": max(after_discount + shipping_fee, Decimal("0")),
+        "coupon_code": coupon.code if coupon else None,
+    }
+
+
+def cart_quote(request):
+    """
+    The quote of the request's cart (Decimal amounts, plus its number of
+    lines), memoized per cart version, catalog version and coupon.
+    """
+    cart = get_cart(request)
+    coupon = session_coupon(request)
+    if cart.key is None:
+        # Nothing was ever added.
+        return {**price(Decimal("0"), coupon), "lines": 0}
+    cache = caches[settings.QUOTE_CACHE]
+    key = f"quote:{cart.key}:{cart.version}:{get_catalog().version}:{coupon.pk if coupon else 0}"
+    quote = cache.get(key)
+    if quote is None:
+        totals = cart.totals()
+        quote = {**price(Decimal(str(totals["total_price"])), coupon), "lines": totals["lines"]}
+        cache.set(key, quote, settings.QUOTE_CACHE_TIMEOUT)
+    return quote
@@ -0,0 +1,91 @@
+"""
+Review pages for the product page.
+
+A product's reviews live in two tables, products.Review and orders.Review,
+which together feed its rating stats (products.ratings), so the page
+lists both: newest first, a page at a time, read with one UNION query
+that joins the authors. Pages continue from the last review shown; the
+cursor is its (created_at, table, id), which orders rows of both tables
+totally, and each half of the query only scans the product's reviews
+through the product_id index. Every page costs one query however many
+reviews the product has.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import CharField, Q, Value
+
+from products.models import Review as ProductReview
+from .models import Review
+
+REVIEWS_PER_PAGE = 10
+# Table tag of each review model, also the tie-breaker of the page order.
+SOURCES = (("p", ProductReview), ("o", Review))
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+FIELDS = ("id", "rating", "comment", "created_at", "user__username")
+
+
+def _after(source, cursor):
+    """Q for the rows of source that sort after cursor (newest first, then table, then id, descending)."""
+    created_at, cursor_source, cursor_id = cursor
+    if source == cursor_source:
+        return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=cursor_id)
+    if source < cursor_source:
+        return Q(created_at__lte=created_at)
+    return Q(created_at__lt=created_at)
+
+
+def review_page(product_id, before=None, per_page=REVIEWS_PER_PAGE):
+    """Returns (reviews, next_cursor) with reviews as dicts; next_cursor is None on the last page."""
+    parts = []
+    for source, model in SOURCES:
+        rows = model.objects.filter(product_id=product_id)
+        if before is not None:
+            rows = rows.filter(_after(source, before))
+        parts.append(
+            rows.order_by().values(*FIELDS).annotate(source=Value(source, output_field=CharField()))
+        )
+    query = parts[0].union(*parts[1:], all=True).order_by("-created_at", "-source", "-id")
+    reviews = [
+        {
+            "id": row["id"], "source": row["source"], "user": row["user__username"],
+            "rating": row["rating"], "comment": row["comment"], "created_at": row["created_at"],
+        }
+        for row in query[:per_page + 1]
+    ]
+    if len(reviews) > per_page:
+        reviews = reviews[:per_page]
+        return reviews, format_cursor(reviews[-1])
+    return reviews, None
+
+
+def format_cursor(review):
+    micros = (review["created_at"] - EPOCH) // timedelta(microseconds=1)
+    return f"{micros}-{review['source']}-{review['id']}"
+
+
+def parse_cursor(value):
+    try:
+        micros, source, review_id = (value or "").split("-")
+        return EPOCH + timedelta(microseconds=int(micros)), source, int(review_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def serialize_review(review):
+    return {
+        "id": review["id"],
+        "user": review["user"],
+        "rating": review["rating"],
+        "comment": review["comment"],
+        "created_at": review["created_at"].isoformat(),
+    }
+
+
+def histogram_rows(stats):
+    """[{rating, count, percent}] from the precomputed stats, highest rating first."""
+    histogram = stats.histogram if stats else []
+    total = sum(histogram)
+    return [
+        {"rating": rating, "count": count, "percent": round(100 * count / total) if total else 0}
+        for rating, count in reversed(list(enumerate(histogram, start=1)))
+    ]
@@ -0,0 +1,163 @@
+"""
+A local stand-in for the part of the Stripe API the shop calls, to run
+and measure the payment flow offline:
+
+    python manage.py stripe_stub --port 12111 --latency 0.3
+    STRIPE_API_BASE=http://127.0.0.1:12111 STRIPE_SECRET_KEY=sk_test_stub python manage.py runserver
+
+It serves POST /v1/payment_intents, GET and POST /v1/payment_intents/<id>
+and POST /v1/payment_intents/<id>/confirm (which succeeds at once).
+Like Stripe it replays the first response of an Idempotency-Key, rejects
+a key reused with other parameters, and refuses to update intents that
+succeeded or were canceled. Intents live in memory. --latency adds that
+many seconds to every response, roughly a real round trip to Stripe.
+
+Only the server side is covered: Stripe.js in the browser still talks to
+Stripe itself.
+"""
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+PREFIX = "/v1/payment_intents"
+FINAL_STATUSES = ("succeeded", "canceled")
+
+
+def parse_form(body):
+    """Stripe's form encoding, with metadata[key]=value nested one level."""
+    params = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        if "[" in key and key.endswith("]"):
+            outer, inner = key[:-1].split("[", 1)
+            params.setdefault(outer, {})[inner] = value
+        else:
+            params[key] = value
+    return params
+
+
+def stripe_error(status, message, type="invalid_request_error", code=None):
+    return status, {"error": {"type": type, "message": message, "code": code}}
+
+
+class StripeStub:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.latency = latency
+        self.intents = {}
+        self.replies = {}  # idempotency key -> (request, reply)
+        self.requests = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.answer("GET")
+
+            def do_POST(self):
+                self.answer("POST")
+
+            def answer(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else ""
+                status, payload = stub.handle(method, self.path, parse_form(body), self.headers.get("Idempotency-Key"))
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serves from a background thread (tests); returns the stub."""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, method, path, params, idempotency_key=None):
+        if self.latency:
+            time.sleep(self.latency)
+        path = path.split("?", 1)[0].rstrip("/")
+        with self.lock:
+            self.requests += 1
+            if method == "POST" and idempotency_key:
+                request = (path, params)
+                if idempotency_key in self.replies:
+                    previous, reply = self.replies[idempotency_key]
+                    if previous != request:
+                        return stripe_error(
+                            400, "Keys for idempotent requests can only be used with the same parameters they "
+                            "were first used with.", type="idempotency_error",
+                        )
+                    return reply
+                reply = self.route(method, path, params)
+                self.replies[idempotency_key] = (request, reply)
+                return reply
+            return self.route(method, path, params)
+
+    def route(self, method, path, params):
+        if not path.startswith(PREFIX):
+            return stripe_error(404, f"Unrecognized request URL ({method}: {path}).")
+        parts = path[len(PREFIX):].strip("/").split("/") if path != PREFIX else []
+        if not parts and method == "POST":
+            return self.create(params)
+        intent = self.intents.get(parts[0]) if parts else None
+        if intent is None:
+            return stripe_error(404, "No such payment_intent", code="resource_missing")
+        if len(parts) == 1 and method == "GET":
+            return 200, intent
+        if intent["status"] in FINAL_STATUSES:
+            return stripe_error(
+                400, f"This PaymentIntent's status is {intent['status']} and cannot be changed.",
+                code="payment_intent_unexpected_state",
+            )
+        if len(parts) == 1 and method == "POST":
+            return self.update(intent, params)
+        if parts[1:] == ["confirm"] and method == "POST":
+            intent["status"] = "succeeded"
+            return 200, intent
+        return stripe_error(404, f"Unrecognized request URL ({method}: {path}).")
+
+    def create(self, params):
+        if not params.get("amount", "").isdigit() or not params.get("currency"):
+            return stripe_error(400, "Missing required param: amount or currency.", code="parameter_missing")
+        intent_id = f"pi_{secrets.token_hex(12)}"
+        self.intents[intent_id] = intent = {
+            "id": intent_id,
+            "object": "payment_intent",
+            "amount": int(params["amount"]),
+            "currency": params["currency"],
+            "status": "requires_payment_method",
+            "client_secret": f"{intent_id}_secret_{secrets.token_hex(12)}",
+            "metadata": params.get("metadata", {}),
+            "created": int(time.time()),
+            "livemode": False,
+        }
+        return 200, intent
+
+    def update(self, intent, params):
+        if "amount" in params:
+            if not params["amount"].isdigit():
+                return stripe_error(400, "Invalid integer: amount.", code="parameter_invalid_integer")
+            intent["amount"] = int(params["amount"])
+        intent["metadata"].update(params.get("metadata", {}))
+        return 200, intent
@@ -1,3 +1,174 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from products.models import Category, Product, Review as ProductReview
+from . import payments
+from .models import CartPaymentIntent, Coupon, Order, Review
+from .stripe_stub import StripeStub
+
+
+class CartQuoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Audio")
+        self.product = Product.objects.create(name="Speaker", description="", category=category, price=100, stock=5)
+        self.client.post("/api/cart/add/", {"item_id": self.product.pk, "quantity": 2}, content_type="application/json")
+
+    def test_quote_is_priced_from_the_server_cart(self):
+        quote = self.client.get("/orders/quote/").json()
+        self.assertEqual(
+            (quote["subtotal"], quote["discount"], quote["shipping_fee"], quote["final_total"]),
+            (200.0, 0.0, 20.0, 220.0),
+        )
+
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code="half", discount=50, valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1)
+        )
+        session = self.client.session
+        session["coupon_id"] = coupon.pk
+        session.save()
+        quote = self.client.get("/orders/quote/").json()
+        self.assertEqual((quote["discount"], quote["final_total"], quote["coupon_code"]), (100.0, 110.0, "half"))
+
+        # Memoized until the cart changes.
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/orders/quote/")
+        self.assertFalse([q for q in queries if "shop_cartitem" in q["sql"]])
+        self.client.post("/api/cart/add/", {"item_id": self.product.pk}, content_type="application/json")
+        self.assertEqual(self.client.get("/orders/quote/").json()["subtotal"], 300.0)
+
+    def test_order_is_built_from_the_server_cart(self):
+        # Whatever cart the client posts, the order holds the server cart at its quote.
+        response = self.client.post("/orders/complete-order/", {
+            "email": "buyer@example.com", "address": "Main St", "paymentIntentId": "pi_paid",
+            "cart": [{"name": "Speaker", "price": 1, "quantity": 2}],
+        }, content_type="application/json").json()
+        order = Order.objects.get(pk=response["order_id"])
+        self.assertEqual((order.total_price, response["total_paid"]), (220, 220.0))
+        self.assertEqual(
+            list(order.items.values_list("product_id", "name", "category", "price", "quantity")),
+            [(self.product.pk, "Speaker", "Audio", 100, 2)],
+        )
+        self.assertIn("2x Speaker - $100", mail.outbox[0].body)
+        self.assertEqual(self.client.get("/orders/quote/").json()["lines"], 0)
+
+        response = self.client.post("/orders/complete-order/", {
+            "email": "buyer@example.com", "paymentIntentId": "pi_paid", "cart": [{"name": "Speaker", "price": 1}],
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+class PaymentIntentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stub = StripeStub().start()
+        self.addCleanup(self.stub.stop)
+        settings = override_settings(STRIPE_API_BASE=self.stub.url, STRIPE_SECRET_KEY="sk_test_stub")
+        settings.enable()
+        payments.configure()
+        self.addCleanup(payments.configure)
+        self.addCleanup(settings.disable)
+
+        category = Category.objects.create(name="Audio")
+        self.product = Product.objects.create(name="Speaker", description="", category=category, price=100, stock=5)
+        self.add()
+
+    def add(self):
+        self.client.post("/api/cart/add/", {"item_id": self.product.pk}, content_type="application/json")
+
+    def start_payment(self):
+        data = self.client.post("/orders/create-payment-intent/", {}, content_type="application/json").json()
+        return data["paymentIntentId"], data["clientSecret"]
+
+    def set_quantity(self, quantity):
+        item = self.client.get("/api/cart/").json()[0]
+        self.client.post("/api/cart/update/", {"item_id": item["id"], "quantity": quantity}, content_type="application/json")
+
+    def test_intent_is_reused_while_the_cart_is_unpaid(self):
+        first, secret = self.start_payment()
+        self.assertEqual(self.start_payment(), (first, secret))
+        # Reusing the intent only reads it back.
+        self.assertEqual(self.stub.requests, 2)
+
+        # A lost record is recovered through the idempotency key.
+        CartPaymentIntent.objects.all().delete()
+        self.assertEqual(self.start_payment()[0], first)
+
+        # A changed cart updates the same intent.
+        self.add()
+        self.assertEqual(self.start_payment()[0], first)
+        self.assertEqual(self.stub.intents[first]["amount"], 22000)
+        self.assertEqual(len(self.stub.intents), 1)
+
+        # A paid intent cannot be updated: the next change opens a new one.
+        self.stub.intents[first]["status"] = "succeeded"
+        self.add()
+        self.assertNotEqual(self.start_payment()[0], first)
+        self.assertEqual(len(self.stub.intents), 2)
+
+    def test_cart_returning_to_an_earlier_state_updates_the_intent(self):
+        intent_id = None
+        for quantity in (1, 2, 1, 2):
+            self.set_quantity(quantity)
+            intent_id, _ = self.start_payment()
+            self.assertEqual(self.stub.intents[intent_id]["amount"], quantity * 11000)
+        self.assertEqual(CartPaymentIntent.objects.get().amount, 22000)
+        self.assertEqual(len(self.stub.intents), 1)
+
+    def test_settled_intent_is_not_handed_out_again(self):
+        first, _ = self.start_payment()
+        # Paid, but the order was never completed: the unchanged cart gets a new intent.
+        self.stub.intents[first]["status"] = "succeeded"
+        second, secret = self.start_payment()
+        self.assertNotEqual(second, first)
+        self.assertEqual(self.stub.intents[second]["status"], "requires_payment_method")
+        self.assertEqual(self.start_payment(), (second, secret))
+
+
+class ProductReviewPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Audio")
+
+    def reviewed(self, count):
+        """A product with count reviews, alternating between the two review tables."""
+        product = Product.objects.create(name=f"Speaker {count}", description="", category=self.category, price=10)
+        order = Order.objects.create(email="a@example.com", address="", total_price=10, payment_intent_id="pi")
+        for i in range(count):
+            user = get_user_model().objects.create_user(f"reviewer-{product.pk}-{i}")
+            model_kwargs = {"order": order} if i % 2 else {}
+            (Review if i % 2 else ProductReview).objects.create(
+                product=product, user=user, rating=i % 10 + 1, comment=f"review {i}", **model_kwargs
+            )
+        return product
+
+    def page_queries(self, product):
+        self.client.get(f"/orders/product/{product.pk}/")  # warm the catalog snapshot
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/orders/product/{product.pk}/")
+        return len(queries), response
+
+    def test_page_covers_the_counted_reviews_in_constant_queries(self):
+        few, _ = self.page_queries(self.reviewed(1))
+        product = self.reviewed(25)
+        many, response = self.page_queries(product)
+        self.assertEqual(many, few)
+        self.assertEqual(response.context["review_count"], 25)
+        self.assertContains(response, f"reviewer-{product.pk}-24")
+
+        seen = [review["comment"] for review in response.context["reviews"]]
+        cursor = response.context["reviews_next"]
+        while cursor:
+            with self.assertNumQueries(2):
+                data = self.client.get(f"/orders/product/{product.pk}/reviews/", {"cursor": cursor}).json()
+            seen += [review["comment"] for review in data["results"]]
+            cursor = data["next"]
+        self.assertEqual(sorted(seen), sorted(f"review {i}" for i in range(25)))
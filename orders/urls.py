@@ -9,6 +9,7 @@ urlpatterns = [
     path('complete/', views.complete_order, name='complete_order'),
     
     # Payment and order management
+    path("quote/", views.cart_quote_view, name="cart_quote"),
     path("create-payment-intent/", views.create_payment_intent, name="create_payment_intent"),
     path("save-order/<int:product_id>/", views.save_order, name="save_order"),
     path("complete-order/", views.complete_order, name="complete_order"),
@@ -21,6 +22,8 @@ urlpatterns = [
         name="add_order_review",
     ),
 
+    path("product/<int:product_id>/reviews/", views.product_reviews, name="product_reviews"),
+
     # Product details (used for redirect)
     path(
         "product/<int:product_id>/",
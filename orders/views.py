@@ -1,20 +1,22 @@
 import json
-import stripe
 from django.shortcuts import render, get_object_or_404, redirect
 from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.core.mail import send_mail
 from django.contrib.auth.decorators import login_required
-from django.db.models import Avg
+from django.db.models import F
 from decimal import Decimal
 from django.utils import timezone
 from django.contrib import messages
 from .models import Coupon
-from products.models import Product
+from products.models import Product, ProductNeighbors, ProductRatingStats
+from products.catalog import get_catalog
+from shop.carts import get_cart
 from .models import Order, OrderItem, Review
-
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from .payments import forget, payment_intent
+from .pricing import cart_quote, session_coupon
+from .reviews import histogram_rows, parse_cursor, review_page, serialize_review
 
 
 def apply_coupon(request):
@@ -51,19 +53,22 @@ def apply_coupon(request):
 def view_more(request, product_id):
     # Get the main product with average rating
     product = get_object_or_404(
-        Product.objects.annotate(avg_rating=Avg("order_reviews__rating")),
+        Product.objects.select_related("brand", "category", "subcategory", "neighbors", "rating_stats")
+        .annotate(avg_rating=F("rating_stats__mean")),
         id=product_id
     )
 
-    # Filter similar products by subcategory, exclude current product, with avg_rating
-    if product.subcategory:
-        similar_products = (
-            Product.objects.filter(subcategory=product.subcategory)
-            .exclude(id=product.id)
-            .annotate(avg_rating=Avg("order_reviews__rating"))[:10]
-        )
-    else:
-        similar_products = Product.objects.none()
+    # Similar products: precomputed neighbor ids, resolved from the catalog snapshot
+    catalog = get_catalog()
+    try:
+        neighbor_ids = product.neighbors.ids
+    except ProductNeighbors.DoesNotExist:
+        # Not computed yet: fall back to the same subcategory
+        neighbor_ids = [
+            p.id for p in catalog.products_by_subcategory.get(product.subcategory_id, [])
+            if p.id != product.id
+        ][:settings.SIMILAR_PRODUCTS_COUNT] if product.subcategory_id else []
+    similar_products = [catalog.product_by_id[i] for i in neighbor_ids if i in catalog.product_by_id]
 
     # Check if user purchased the product
     purchased_order_id = None
@@ -76,14 +81,36 @@ def view_more(request, product_id):
         if purchased_orders.exists():
             purchased_order_id = purchased_orders.first().id
 
+    # First page of reviews (authors joined) and the precomputed rating histogram
+    reviews, next_cursor = review_page(product.id)
+    try:
+        stats = product.rating_stats
+    except ProductRatingStats.DoesNotExist:
+        stats = None
+
     context = {
         "product": product,
         "similar_products": similar_products,
         "purchased_order_id": purchased_order_id,
+        "reviews": reviews,
+        "reviews_next": next_cursor,
+        "review_count": stats.count if stats else 0,
+        "rating_histogram": histogram_rows(stats),
     }
     return render(request, "orders/view_more.html", context)
 
 
+def product_reviews(request, product_id):
+    """Further pages of a product's reviews for the "Load more" button: ?cursor=<id>."""
+    if not Product.objects.filter(id=product_id).exists():
+        return JsonResponse({"error": "Product not found"}, status=404)
+    reviews, next_cursor = review_page(product_id, parse_cursor(request.GET.get("cursor")))
+    return JsonResponse({
+        "results": [serialize_review(review) for review in reviews],
+        "next": next_cursor,
+    })
+
+
 # ---------------- REVIEWS ----------------
 @csrf_exempt
 def add_review(request):
@@ -162,6 +189,16 @@ def add_order_review(request, product_id, order_id):
     return redirect("orders:view_more", product_id=product.id)
 
 
+# ---------------- CART QUOTE ----------------
+def quote_json(quote):
+    return {key: float(value) if isinstance(value, Decimal) else value for key, value in quote.items()}
+
+
+def cart_quote_view(request):
+    """Subtotal, discount, shipping and total of the cart, for display; creates no PaymentIntent."""
+    return JsonResponse(quote_json(cart_quote(request)))
+
+
 # ---------------- STRIPE PAYMENT ----------------
 @csrf_exempt
 def create_payment_intent(request):
@@ -169,72 +206,20 @@ def create_payment_intent(request):
         return JsonResponse({"error": "Invalid method"}, status=405)
 
     try:
-        data = json.loads(request.body)
-        cart = data.get("cart", [])
-        if not cart:
+        # Charge the quote of the server-side cart, the one the cart page shows.
+        quote = cart_quote(request)
+        if not quote["lines"]:
             return JsonResponse({"error": "Empty cart"}, status=400)
-
-        # -----------------------------------
-        # 1️⃣ Calculate total WITHOUT coupon
-        amount = sum(
-            Decimal(str(item["price"])) * Decimal(str(item["quantity"]))
-            for item in cart
-        )
-
-        # 2️⃣ Apply coupon
-        coupon_id = request.session.get("coupon_id")
-        discount_amount = Decimal("0")
-
-        if coupon_id:
-            try:
-                coupon = Coupon.objects.get(id=coupon_id)
-                discount_amount = (amount * coupon.discount / Decimal("100"))
-                print(f"Coupon {coupon.code} applied: -{discount_amount}")
-            except Coupon.DoesNotExist:
-                pass
-            
-        # 3️⃣ Apply shipping fee
-        shipping_fee = Decimal("0")
-        subtotal_after_discount = amount - discount_amount
-
-        if subtotal_after_discount < 0:
-            subtotal_after_discount = Decimal("0")
-
-        if subtotal_after_discount < Decimal("300"):
-            shipping_fee = subtotal_after_discount * Decimal("0.10")  # 10%
-        else:
-            shipping_fee = Decimal("0")
-
-        final_total = subtotal_after_discount + shipping_fee
-
-        # Prevent negative values
-        if final_total < 0:
-            final_total = Decimal("0.00")
+        final_total = quote["final_total"]
 
         # If total is zero → free order
         if final_total <= 0:
-            return JsonResponse({
-                "freeOrder": True,
-                "subtotal": float(amount),
-                "discount": float(discount_amount),
-                "shipping_fee": float(shipping_fee),
-                "final_total": 0,
-            })
-
-        amount_cents = int(final_total * 100)
-
-        intent = stripe.PaymentIntent.create(
-            amount=amount_cents,
-            currency="usd",
-        )
+            return JsonResponse({"freeOrder": True, **quote_json(quote), "final_total": 0})
 
-        return JsonResponse({
-            "clientSecret": intent.client_secret,
-            "subtotal": float(amount),
-            "discount": float(discount_amount),
-            "shipping_fee": float(shipping_fee),
-            "final_total": float(final_total),
-        })
+        # The cart's open intent, reused or updated while the cart is unpaid.
+        intent_id, client_secret = payment_intent(request, quote)
+
+        return JsonResponse({"clientSecret": client_secret, "paymentIntentId": intent_id, **quote_json(quote)})
 
 
     except Exception as e:
@@ -248,7 +233,6 @@ def complete_order(request):
 
     try:
         data = json.loads(request.body)
-        cart = data.get("cart", [])
         address = data.get("address", "")
         payment_intent_id = data.get("paymentIntentId", "")
         email = data.get("email", "").strip()
@@ -258,41 +242,17 @@ def complete_order(request):
             email = request.user.email
 
         # Basic validation
-        if not cart or not email or not payment_intent_id:
+        if not email or not payment_intent_id:
             return JsonResponse({"error": "Missing data"}, status=400)
 
-        # 1️⃣ Subtotal
-        total_price = sum(
-            Decimal(str(i.get("price", 0))) * Decimal(str(i.get("quantity", 1)))
-            for i in cart
-        )
-        
-        # 2️⃣ Discount
-        discount = Decimal(0)
-        coupon = None
-        coupon_id = request.session.get("coupon_id")
-        
-        if coupon_id:
-            try:
-                coupon = Coupon.objects.get(id=coupon_id)
-                if coupon.is_valid():
-                    discount = (coupon.discount / Decimal(100)) * total_price
-            except Coupon.DoesNotExist:
-                pass
-            
-        subtotal_after_discount = total_price - discount
-        if subtotal_after_discount < 0:
-            subtotal_after_discount = Decimal("0")
-        
-        # 3️⃣ Shipping
-        if subtotal_after_discount >= Decimal("300"):
-            shipping_fee = Decimal("0")
-        else:
-            shipping_fee = subtotal_after_discount * Decimal("0.10")
-        
-        # 4️⃣ Final total
-        final_price = subtotal_after_discount + shipping_fee
-        
+        # 1️⃣ The server-side cart and its quote: what create_payment_intent charged
+        cart = get_cart(request)
+        quote = cart_quote(request)
+        lines = cart.items()
+        if not quote["lines"] or not lines:
+            return JsonResponse({"error": "Empty cart"}, status=400)
+        coupon = session_coupon(request)
+        total_price, discount, final_price = quote["subtotal"], quote["discount"], quote["final_total"]
 
         # 4️⃣ Create the order
         order = Order.objects.create(
@@ -304,28 +264,32 @@ def complete_order(request):
             status="completed",
         )
 
+        # The intent is paid: the cart's next checkout opens a new one
+        forget(payment_intent_id)
+
         # Save coupon info on the order if used
         if coupon:
             order.coupon = coupon
             order.discount_amount = discount
             order.save()
 
-        # 5️⃣ Create order items
-        for item in cart:
-            product = Product.objects.filter(name=item.get("name")).first()
-            OrderItem.objects.create(
+        # 5️⃣ Create order items, at the current prices the quote used
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
-                product=product,
-                name=item.get("name", ""),
-                brand=item.get("brand", ""),
-                category=item.get("category", ""),
-                price=item.get("price", 0),
-                quantity=item.get("quantity", 1),
+                product=line.product,
+                name=line.product.name,
+                brand=line.product.brand.name if line.product.brand else "",
+                category=line.product.category.name if line.product.category else "",
+                price=line.product.price or 0,
+                quantity=line.quantity,
             )
+            for line in lines
+        ])
 
         # 6️⃣ Send confirmation email
         order_lines = "\n".join([
-            f'{i["quantity"]}x {i["name"]} - ${i["price"]}' for i in cart
+            f"{item.quantity}x {item.name} - ${item.price}" for item in items
         ])
         message = (
             f"Thank you for your order!\n\n"
@@ -345,16 +309,14 @@ def complete_order(request):
 
         # 7️⃣ Try clearing user's cart
         try:
-            from shop.utils import get_user_cart
-            cart_obj = get_user_cart(request)
-            cart_obj.items.all().delete()
+            cart.clear()
         except Exception as e:
             print("Cart clearing failed:", e)
 
         # 8️⃣ Clear applied coupon after checkout
         request.session["coupon_id"] = None
 
-        order_item_ids = [item.id for item in order.items.all()]
+        order_item_ids = [item.id for item in items]
         return JsonResponse({
             "success": True,
             "order_id": order.id,
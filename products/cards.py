@@ -0,0 +1,86 @@
+"""
+Fragment cache for the storefront product cards.
+
+A rendered card is cached under the product id, its card_version and
+updated_at, so a stale card is never looked up again once the product
+moves on. card_version is bumped by the signals in products.signals
+whenever something the card shows changes without saving the product
+itself: a review (stars), a brand or category rename.
+
+The cards of one page are fetched with a single get_many; only the misses
+are rendered and written back with set_many.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.db.models.functions import Now
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = "products/_product_card.html"
+
+
+def stars10to5_py(avg_rating):
+    """
+    Converts a 10-point rating to a list of 5 stars: 'full', 'half', 'empty'.
+    """
+    try:
+        avg_rating = float(avg_rating)
+    except (ValueError, TypeError):
+        return ["empty"] * 5
+
+    stars = []
+    five_scale = avg_rating / 2
+    for i in range(1, 6):
+        if five_scale >= i:
+            stars.append("full")
+        elif five_scale >= i - 0.5:
+            stars.append("half")
+        else:
+            stars.append("empty")
+    return stars
+
+
+def card_cache():
+    return caches[settings.PRODUCT_CARD_CACHE]
+
+
+def card_key(product, authenticated):
+    # Logged-in visitors get an active add-to-cart button, anonymous ones a disabled one.
+    variant = "user" if authenticated else "anon"
+    stamp = product.updated_at.timestamp() if product.updated_at else 0
+    return f"product-card:{product.pk}:{product.card_version}:{stamp}:{variant}"
+
+
+def bump_card_versions(queryset):
+    """Invalidates the cached cards of every product in queryset."""
+    return queryset.update(card_version=F("card_version") + 1, updated_at=Now())
+
+
+def render_card(product, authenticated):
+    return render_to_string(CARD_TEMPLATE, {
+        "product": product,
+        "stars": stars10to5_py(product.avg_rating),
+        "authenticated": authenticated,
+    })
+
+
+def render_cards(products, authenticated):
+    """
+    The card HTML of each product, in order. products are Product instances
+    annotated with avg_rating (brand and category needed on a miss) or
+    catalog snapshot records.
+    """
+    cache = card_cache()
+    keys = [card_key(product, authenticated) for product in products]
+    cached = cache.get_many(keys)
+    missing = {}
+    cards = []
+    for key, product in zip(keys, products):
+        html = cached.get(key)
+        if html is None:
+            html = missing[key] = render_card(product, authenticated)
+        cards.append(mark_safe(html))
+    if missing:
+        cache.set_many(missing, settings.PRODUCT_CARD_CACHE_TIMEOUT)
+    return cards
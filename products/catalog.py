@@ -0,0 +1,232 @@
+"""
+Process-local, immutable snapshot of the catalog.
+
+Categories, brands, subcategories and the product list are read on nearly
+every request but change rarely. Each worker process keeps one compact
+snapshot of them in memory and serves reads from it. Writes bump the
+shared CatalogVersion row in the same transaction (see products.signals);
+a worker compares its snapshot's version with that row at most once every
+CATALOG_SNAPSHOT_CHECK_INTERVAL seconds and rebuilds lazily when it moved.
+Writes made by the worker itself invalidate its snapshot immediately.
+"""
+import threading
+import time
+from functools import cached_property
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.db.models.functions import Now
+
+from .models import Brand, CatalogVersion, Category, Product, SubCategory
+
+
+class CategoryRecord:
+    __slots__ = ("id", "name", "parent_id", "path")
+
+    def __init__(self, id, name, parent_id, path):
+        self.id = id
+        self.name = name
+        self.parent_id = parent_id
+        self.path = path
+
+    def __str__(self):
+        return self.name
+
+
+class SubCategoryRecord:
+    __slots__ = ("id", "name", "category_id")
+
+    def __init__(self, id, name, category_id):
+        self.id = id
+        self.name = name
+        self.category_id = category_id
+
+    def __str__(self):
+        return self.name
+
+
+class BrandRecord:
+    __slots__ = ("id", "name")
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+class ImageRecord:
+    """Stands in for an ImageFieldFile in templates: truthy, with a url."""
+    __slots__ = ("name", "url")
+
+    def __init__(self, name):
+        self.name = name
+        self.url = default_storage.url(name)
+
+    def __str__(self):
+        return self.name
+
+
+class ProductRecord:
+    """
+    The card-level fields of a product (no description). brand, category and
+    subcategory point at the shared records of the same snapshot.
+    """
+    __slots__ = (
+        "id", "name", "price", "stock", "image", "image_hash", "avg_rating", "updated_at", "card_version",
+        "brand_id", "category_id", "subcategory_id", "brand", "category", "subcategory",
+    )
+
+    def __init__(self, id, name, price, stock, image, image_hash, avg_rating, updated_at, card_version,
+                 brand, category, subcategory):
+        self.id = id
+        self.name = name
+        self.price = price
+        self.stock = stock
+        self.image = image
+        self.image_hash = image_hash
+        self.avg_rating = avg_rating
+        self.updated_at = updated_at
+        self.card_version = card_version
+        self.brand = brand
+        self.category = category
+        self.subcategory = subcategory
+        self.brand_id = brand.id if brand else None
+        self.category_id = category.id if category else None
+        self.subcategory_id = subcategory.id if subcategory else None
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
+
+
+class CatalogSnapshot:
+    def __init__(self, version, categories, subcategories, brands, products):
+        self.version = version
+        self.built_at = time.time()
+        self.categories = tuple(categories)
+        self.subcategories = tuple(subcategories)
+        self.brands = tuple(brands)
+        self.products = tuple(products)
+
+        self.category_by_id = {c.id: c for c in self.categories}
+        self.subcategory_by_id = {s.id: s for s in self.subcategories}
+        self.brand_by_id = {b.id: b for b in self.brands}
+        self.product_by_id = {p.id: p for p in self.products}
+        self.category_ids_by_name = {}
+        for category in self.categories:
+            self.category_ids_by_name.setdefault(category.name, []).append(category.id)
+        self.products_by_subcategory = {}
+        for product in self.products:
+            self.products_by_subcategory.setdefault(product.subcategory_id, []).append(product)
+
+    def category_names(self):
+        return sorted({c.name for c in self.categories})
+
+    @cached_property
+    def taxonomy(self):
+        from .taxonomy import build_tree
+        return build_tree(self)
+
+
+def build_snapshot(version):
+    categories = [
+        CategoryRecord(*row) for row in Category.objects.order_by("id").values_list("id", "name", "parent_id", "path")
+    ]
+    subcategories = [
+        SubCategoryRecord(*row) for row in SubCategory.objects.order_by("id").values_list("id", "name", "category_id")
+    ]
+    brands = [BrandRecord(*row) for row in Brand.objects.order_by("id").values_list("id", "name")]
+
+    category_by_id = {c.id: c for c in categories}
+    subcategory_by_id = {s.id: s for s in subcategories}
+    brand_by_id = {b.id: b for b in brands}
+    rows = (
+        Product.objects.order_by("id")
+        .values_list("id", "name", "price", "stock", "image", "image_hash", "rating_stats__mean", "updated_at",
+                     "card_version", "brand_id", "category_id", "subcategory_id")
+        .iterator(chunk_size=5000)
+    )
+    products = [
+        ProductRecord(
+            id, name, price, stock, ImageRecord(image) if image else None, image_hash, mean or 0,
+            updated_at, card_version,
+            brand_by_id.get(brand_id), category_by_id.get(category_id), subcategory_by_id.get(subcategory_id),
+        )
+        for (id, name, price, stock, image, image_hash, mean, updated_at, card_version,
+             brand_id, category_id, subcategory_id) in rows
+    ]
+    return CatalogSnapshot(version, categories, subcategories, brands, products)
+
+
+def current_version():
+    return CatalogVersion.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+
+def bump_catalog_version():
+    """Called inside the writing transaction, so readers never see the new version before the data."""
+    if not CatalogVersion.objects.filter(pk=1).update(version=F("version") + 1, updated_at=Now()):
+        CatalogVersion.objects.create(pk=1, version=1)
+    catalog_cache.invalidate()
+
+
+class CatalogCache:
+    def __init__(self):
+        self.snapshot = None
+        self.checked_at = 0.0
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.version_checks = 0
+
+    def invalidate(self):
+        self.dirty = True
+
+    def get(self):
+        snapshot = self.snapshot
+        now = time.monotonic()
+        if snapshot is not None and not self.dirty:
+            if now - self.checked_at < settings.CATALOG_SNAPSHOT_CHECK_INTERVAL:
+                self.hits += 1
+                return snapshot
+            self.version_checks += 1
+            version = current_version()
+            self.checked_at = now
+            if version == snapshot.version:
+                self.hits += 1
+                return snapshot
+
+        self.misses += 1
+        with self.lock:
+            if self.snapshot is snapshot:
+                self.dirty = False
+                self.snapshot = build_snapshot(current_version())
+                self.checked_at = time.monotonic()
+                self.rebuilds += 1
+            return self.snapshot
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "rebuilds": self.rebuilds,
+            "version_checks": self.version_checks,
+            "version": snapshot.version if snapshot else None,
+            "products": len(snapshot.products) if snapshot else 0,
+            "built_at": snapshot.built_at if snapshot else None,
+        }
+
+
+catalog_cache = CatalogCache()
+
+
+def get_catalog():
+    return catalog_cache.get()
@@ -0,0 +1,68 @@
+"""
+Conditional GET for the catalog APIs.
+
+Each endpoint gets a cheap stamp computed before any queryset or
+serializer work: the single CatalogVersion row for listings (any catalog
+write moves it), or the product's own updated_at and card_version for a
+detail (both move on every change to what the detail shows, see
+products.cards). If-None-Match / If-Modified-Since that still match are
+answered with 304 straight away.
+
+Responses are public: browsers always revalidate (max-age=0), shared
+caches may reuse them for CATALOG_API_SHARED_MAX_AGE seconds.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import CatalogVersion, Product
+
+
+def catalog_stamp(request, *args, **kwargs):
+    row = CatalogVersion.objects.filter(pk=1).values_list("version", "updated_at").first()
+    if row is None:
+        return None
+    version, updated_at = row
+    return f'W/"catalog-{version}"', updated_at
+
+
+def product_stamp(request, pk, *args, **kwargs):
+    row = Product.objects.filter(pk=pk).values_list("updated_at", "card_version").first()
+    if row is None:
+        return None
+    updated_at, card_version = row
+    return f'W/"product-{pk}-{card_version}-{updated_at.timestamp()}"', updated_at
+
+
+def conditional_get(stamp):
+    """
+    View decorator: stamp(request, *args, **kwargs) returns (etag,
+    last_modified) or None to skip validation (e.g. a missing object).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            validators = stamp(request, *args, **kwargs)
+            if validators is None:
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = validators
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response["ETag"] = etag
+                if timestamp is not None:
+                    response["Last-Modified"] = http_date(timestamp)
+                patch_cache_control(
+                    response, public=True, max_age=0, s_maxage=settings.CATALOG_API_SHARED_MAX_AGE
+                )
+                patch_vary_headers(response, ("Accept",))
+            return response
+        return wrapper
+    return decorator
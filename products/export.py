@@ -0,0 +1,117 @@
+"""
+Streaming catalog export as NDJSON or CSV, for partner syncs.
+
+Products are read in keyset batches (id > last id, ORDER BY id LIMIT n),
+so no query holds a cursor open for the whole export and memory stays flat
+whatever the catalog size. updated_since restricts the export to products
+changed since a point in time for incremental syncs; every row carries its
+updated_at so the partner can use the newest one as the next watermark.
+
+The same generators back the /api/products/export/ endpoint and the
+export_catalog command.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, time
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Product
+
+EXPORT_FIELDS = [
+    "id", "sku", "name", "description", "brand", "category", "subcategory",
+    "price", "stock", "image", "average_rating", "updated_at",
+]
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+# Lines are grouped into blocks of about this many characters per write.
+BLOCK_SIZE = 64 * 1024
+
+
+def parse_since(value):
+    """ISO date or date/time -> aware datetime; raises ValueError for anything else."""
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date/time: {value}")
+        since = datetime.combine(day, time.min)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def export_rows(updated_since=None, batch_size=2000):
+    """Yields one dict per product, ordered by id."""
+    products = Product.objects.all()
+    if updated_since is not None:
+        products = products.filter(updated_at__gte=updated_since)
+    columns = (
+        "id", "sku", "name", "description", "brand__name", "category__name", "subcategory__name",
+        "price", "stock", "image", "rating_stats__mean", "updated_at",
+    )
+    last_id = 0
+    while True:
+        batch = list(products.filter(id__gt=last_id).order_by("id").values_list(*columns)[:batch_size])
+        for row in batch:
+            values = dict(zip(EXPORT_FIELDS, row))
+            values["price"] = str(values["price"]) if values["price"] is not None else None
+            values["image"] = default_storage.url(values["image"]) if values["image"] else None
+            values["average_rating"] = values["average_rating"] or 0
+            values["updated_at"] = values["updated_at"].isoformat()
+            yield values
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1][0]
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+class _Line:
+    """File-like target for csv.writer that hands back what it was given."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(["" if row[field] is None else row[field] for field in EXPORT_FIELDS])
+
+
+def export_lines(format, updated_since=None, batch_size=2000):
+    rows = export_rows(updated_since, batch_size)
+    return csv_lines(rows) if format == "csv" else ndjson_lines(rows)
+
+
+def blocks(lines, size=BLOCK_SIZE):
+    """Joins lines into blocks of about size characters, encoded as UTF-8."""
+    block, length = [], 0
+    for line in lines:
+        block.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(block).encode()
+            block, length = [], 0
+    if block:
+        yield "".join(block).encode()
+
+
+def gzip_blocks(chunks):
+    """Compresses a byte stream into a single gzip member on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
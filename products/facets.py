@@ -0,0 +1,342 @@
+"""
+Faceted navigation over category, subcategory, brand, price band and stock.
+
+FacetCell stores how many products fall into each distinct combination of
+facet values. The cells are adjusted by the product signals in
+products.signals and can be rebuilt with the rebuild_facets command, so
+facet counts for any filter combination come from one small table instead
+of a GROUP BY per facet over the products.
+
+Counts are disjunctive: values of the same facet are OR'd, different facets
+are AND'd, and each facet is counted with every filter except its own.
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, F, IntegerField, Q, Sum, When
+
+from .catalog import get_catalog
+from .models import FacetCell, Product
+from .taxonomy import expand_subtrees, subtree_q
+
+FACETS = ["category", "subcategory", "brand", "price_bucket", "in_stock"]
+
+# Bucket n covers PRICE_BUCKETS[n - 1] as [low, high); bucket 0 is "no price".
+PRICE_BUCKETS = [
+    (None, Decimal("50")),
+    (Decimal("50"), Decimal("100")),
+    (Decimal("100"), Decimal("250")),
+    (Decimal("250"), Decimal("500")),
+    (Decimal("500"), Decimal("1000")),
+    (Decimal("1000"), None),
+]
+
+STOCK_VALUES = {"in": True, "out": False}
+
+
+def price_bucket(price):
+    if price is None:
+        return 0
+    price = Decimal(str(price))
+    for number, (low, high) in enumerate(PRICE_BUCKETS, start=1):
+        if (low is None or price >= low) and (high is None or price < high):
+            return number
+    return 0
+
+
+def price_bucket_label(number):
+    low, high = PRICE_BUCKETS[number - 1]
+    if low is None:
+        return f"Under {high} $"
+    if high is None:
+        return f"{low} $ and up"
+    return f"{low} - {high} $"
+
+
+def price_bucket_q(number):
+    low, high = PRICE_BUCKETS[number - 1]
+    q = Q(price__isnull=False)
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def product_cell(product):
+    """The FacetCell key a product instance belongs to."""
+    return (
+        product.category_id or 0,
+        product.subcategory_id or 0,
+        product.brand_id or 0,
+        price_bucket(product.price),
+        bool(product.stock),
+    )
+
+
+# ---------------- MAINTENANCE ----------------
+def _adjust(key, delta):
+    fields = dict(zip(FACETS, key))
+    updated = FacetCell.objects.filter(**fields).update(count=F("count") + delta)
+    if not updated and delta > 0:
+        FacetCell.objects.create(count=delta, **fields)
+
+
+def move_product(old_key, new_key):
+    """Moves one product between cells; either key may be None (created / deleted)."""
+    if old_key == new_key:
+        return
+    with transaction.atomic():
+        if old_key is not None:
+            _adjust(old_key, -1)
+            FacetCell.objects.filter(count__lte=0).delete()
+        if new_key is not None:
+            _adjust(new_key, 1)
+
+
+def clear_facet_value(facet, value):
+    """Folds the cells of a deleted brand/category/subcategory into "not set"."""
+    with transaction.atomic():
+        for cell in FacetCell.objects.filter(**{facet: value}):
+            key = [getattr(cell, name) for name in FACETS]
+            key[FACETS.index(facet)] = 0
+            _adjust(tuple(key), cell.count)
+            cell.delete()
+
+
+def rebuild_facets(batch_size=1000):
+    """Recounts every cell from the products table. Returns the number of cells."""
+    counts = Counter()
+    rows = Product.objects.values_list("category_id", "subcategory_id", "brand_id", "price", "stock")
+    for category_id, subcategory_id, brand_id, price, stock in rows.iterator(chunk_size=5000):
+        counts[(category_id or 0, subcategory_id or 0, brand_id or 0, price_bucket(price), bool(stock))] += 1
+
+    with transaction.atomic():
+        FacetCell.objects.all().delete()
+        FacetCell.objects.bulk_create(
+            [FacetCell(count=n, **dict(zip(FACETS, key))) for key, n in counts.items()],
+            batch_size=batch_size,
+        )
+    return len(counts)
+
+
+# ---------------- SELECTION ----------------
+def _ints(values):
+    result = set()
+    for value in values:
+        try:
+            result.add(int(value))
+        except (TypeError, ValueError):
+            pass
+    return result
+
+
+def parse_selection(params):
+    """
+    Reads the multi-select facet filters from a QueryDict:
+    ?category=<name>&subcategory=<id>&brand=<id>&price=<bucket>&stock=in|out
+    Every parameter may be repeated and a category includes its whole subtree.
+    Returns {facet: set of cell values}; category_roots keeps the picked ids
+    and category_paths their materialized paths.
+    """
+    selection = {}
+    names = [n for n in params.getlist("category") if n and n.lower() != "none"]
+    if names:
+        catalog = get_catalog()
+        ids = {i for name in names for i in catalog.category_ids_by_name.get(name, [])}
+        selection["category"] = expand_subtrees(catalog, ids) or {-1}
+        selection["category_roots"] = ids
+        selection["category_paths"] = {catalog.category_by_id[i].path for i in ids if i in catalog.category_by_id}
+    for facet, param in (("subcategory", "subcategory"), ("brand", "brand")):
+        ids = _ints(params.getlist(param))
+        if ids:
+            selection[facet] = ids
+    buckets = {b for b in _ints(params.getlist("price")) if 1 <= b <= len(PRICE_BUCKETS)}
+    if buckets:
+        selection["price_bucket"] = buckets
+    stock = {STOCK_VALUES[v] for v in params.getlist("stock") if v in STOCK_VALUES}
+    if stock:
+        selection["in_stock"] = stock
+    return selection
+
+
+def filter_products(queryset, selection):
+    """Applies a parsed selection to a Product queryset."""
+    if selection.get("category_paths"):
+        # One range scan on the indexed materialized path per picked category.
+        q = Q(pk__in=[])
+        for path in selection["category_paths"]:
+            q |= subtree_q(path, "category__path")
+        queryset = queryset.filter(q)
+    elif "category" in selection:
+        queryset = queryset.filter(category_id__in=selection["category"])
+    if "subcategory" in selection:
+        queryset = queryset.filter(subcategory_id__in=selection["subcategory"])
+    if "brand" in selection:
+        queryset = queryset.filter(brand_id__in=selection["brand"])
+    if "price_bucket" in selection:
+        q = Q(pk__in=[])
+        for number in selection["price_bucket"]:
+            q |= price_bucket_q(number)
+        queryset = queryset.filter(q)
+    if selection.get("in_stock") == {True}:
+        queryset = queryset.filter(stock__gt=0)
+    elif selection.get("in_stock") == {False}:
+        queryset = queryset.filter(Q(stock=0) | Q(stock__isnull=True))
+    return queryset
+
+
+# ---------------- COUNTS ----------------
+def cells_for_queryset(queryset):
+    """
+    Cells computed on the fly for an arbitrary product queryset, for when
+    the result set is narrowed by something the cells do not know (search).
+    """
+    bucket = Case(
+        *[When(price_bucket_q(number), then=number) for number in range(1, len(PRICE_BUCKETS) + 1)],
+        default=0,
+        output_field=IntegerField(),
+    )
+    in_stock = Case(When(stock__gt=0, then=True), default=False, output_field=BooleanField())
+    rows = (
+        queryset.order_by()
+        .annotate(facet_bucket=bucket, facet_in_stock=in_stock)
+        .values("category_id", "subcategory_id", "brand_id", "facet_bucket", "facet_in_stock")
+        .annotate(n=Count("id", distinct=True))
+    )
+    return [
+        (r["category_id"] or 0, r["subcategory_id"] or 0, r["brand_id"] or 0,
+         r["facet_bucket"], bool(r["facet_in_stock"]), r["n"])
+        for r in rows
+    ]
+
+
+def facet_counts(selection, cells=None):
+    """Returns {facet: {value: count}} for the selection, from FacetCell unless cells are given."""
+    if cells is None:
+        cells = FacetCell.objects.values_list(*FACETS, "count")
+    counts = {facet: defaultdict(int) for facet in FACETS}
+    for cell in cells:
+        key, n = cell[:-1], cell[-1]
+        failing = [facet for facet, value in zip(FACETS, key)
+                   if facet in selection and value not in selection[facet]]
+        if len(failing) > 1:
+            continue
+        for facet, value in zip(FACETS, key):
+            if not failing or failing == [facet]:
+                counts[facet][value] += n
+    return counts
+
+
+def build_facets(selection, counts):
+    """Option lists for templates and the API: [{value, label, count, selected}]."""
+    def options(pairs, facet, url_value=lambda v: v, selected=None):
+        if selected is None:
+            selected = selection.get(facet, set())
+        return [
+            {"value": url_value(value), "label": label, "count": counts[facet].get(value, 0),
+             "selected": value in selected}
+            for value, label in pairs
+            if counts[facet].get(value, 0) or value in selected
+        ]
+
+    catalog = get_catalog()
+
+    def by_name(records):
+        return [(r.id, r.name) for r in sorted(records, key=lambda r: r.name)]
+
+    # A category counts the products of its whole subtree.
+    category_counts = counts["category"]
+    counts["category"] = {
+        c.id: sum(category_counts.get(i, 0) for i in expand_subtrees(catalog, [c.id]))
+        for c in catalog.categories
+    }
+    categories = by_name(catalog.categories)
+    category_names = dict(categories)
+    category_options = options(categories, "category", url_value=category_names.get,
+                               selected=selection.get("category_roots", set()))
+    return {
+        "category": category_options,
+        "subcategory": options(by_name(catalog.subcategories), "subcategory"),
+        "brand": options(by_name(catalog.brands), "brand"),
+        "price": options(
+            [(n, price_bucket_label(n)) for n in range(1, len(PRICE_BUCKETS) + 1)], "price_bucket"
+        ),
+        "stock": options([(True, "In stock"), (False, "Out of stock")], "in_stock",
+                         url_value=lambda v: "in" if v else "out"),
+    }
+
+
+# ---------------- CATEGORY TREE ----------------
+def category_brand_counts():
+    """{(category, subcategory, brand): products}, in one GROUP BY over the cells."""
+    rows = FacetCell.objects.order_by().values_list("category", "subcategory", "brand").annotate(n=Sum("count"))
+    return {(category, subcategory, brand): n for category, subcategory, brand, n in rows}
+
+
+def build_category_tree(catalog, counts):
+    """
+    The taxonomy of products.taxonomy.build_tree with product counts and
+    brand lists: [{id, name, product_count, brands: [{id, name,
+    product_count}], children, subcategories: [{id, name, product_count,
+    brands}]}]. A category counts the products of its whole subtree.
+    """
+    direct = defaultdict(Counter)
+    by_subcategory = defaultdict(Counter)
+    for (category, subcategory, brand), n in counts.items():
+        direct[category][brand] += n
+        if subcategory:
+            by_subcategory[subcategory][brand] += n
+
+    def brands(counter):
+        return sorted(
+            ({"id": brand, "name": catalog.brand_by_id[brand].name, "product_count": n}
+             for brand, n in counter.items() if brand in catalog.brand_by_id),
+            key=lambda b: b["name"],
+        )
+
+    nodes = {c.id: {"id": c.id, "name": c.name, "children": [], "subcategories": []} for c in catalog.categories}
+    for subcategory in sorted(catalog.subcategories, key=lambda s: s.name):
+        if subcategory.category_id in nodes:
+            counter = by_subcategory.get(subcategory.id, Counter())
+            nodes[subcategory.category_id]["subcategories"].append({
+                "id": subcategory.id,
+                "name": subcategory.name,
+                "product_count": sum(counter.values()),
+                "brands": brands(counter),
+            })
+    roots = []
+    for category in sorted(catalog.categories, key=lambda c: c.name):
+        parent = nodes.get(category.parent_id)
+        (parent["children"] if parent else roots).append(nodes[category.id])
+
+    def total(node):
+        counter = Counter(direct.get(node["id"], Counter()))
+        for child in node["children"]:
+            counter.update(total(child))
+        node["product_count"] = sum(counter.values())
+        node["brands"] = brands(counter)
+        return counter
+
+    for root in roots:
+        total(root)
+    return roots
+
+
+def category_tree():
+    """
+    The counted category tree of the current catalog version, from the
+    shared cache. Keyed by the version, so any catalog write retires it and
+    the first request after rebuilds it with a single aggregate query.
+    """
+    catalog = get_catalog()
+    cache = caches[settings.CATEGORY_TREE_CACHE]
+    key = f"category-tree:{catalog.version}"
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_category_tree(catalog, category_brand_counts())
+        cache.set(key, tree, settings.CATEGORY_TREE_CACHE_TIMEOUT)
+    return tree
@@ -0,0 +1,155 @@
+"""
+Resized WebP derivatives of the product images.
+
+Product.image keeps the original upload; cards, carousels and the cart
+show one of a few fixed-width WebP copies instead (PRODUCT_IMAGE_WIDTHS),
+offered to the browser as a srcset. Derivatives are stored next to the
+media under the sha256 of the original's bytes:
+
+    derivatives/ab/abcdef...-400.webp
+
+so identical uploads share them and a replaced image never serves a stale
+copy. Product.image_hash records the digest once the derivatives exist.
+
+They are written when a product is saved with a new image (see
+products.signals). Products that were never saved that way (imports,
+older rows) point at the product_image view instead, which renders the
+derivative on first request and redirects to it; the
+build_image_derivatives command backfills the whole catalog.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+DERIVATIVE_DIR = "derivatives"
+
+
+class DerivativeError(Exception):
+    """The original image is missing or cannot be decoded."""
+
+
+def image_widths():
+    return settings.PRODUCT_IMAGE_WIDTHS
+
+
+def derivative_name(digest, width):
+    return f"{DERIVATIVE_DIR}/{digest[:2]}/{digest}-{width}.webp"
+
+
+def render_derivative(image, width):
+    """WebP bytes of image scaled down to width (never up)."""
+    copy = image.copy()
+    copy.thumbnail((width, width * 4), Image.LANCZOS)
+    out = io.BytesIO()
+    copy.save(out, "WEBP", quality=settings.PRODUCT_IMAGE_QUALITY, method=4)
+    return out.getvalue()
+
+
+def _store(name, data, storage):
+    saved = storage.save(name, ContentFile(data))
+    if saved != name:
+        # Another worker wrote the same derivative first; the storage renamed ours.
+        storage.delete(saved)
+
+
+def ensure_derivatives(name, digest=None, force=False, storage=default_storage):
+    """
+    Writes the missing derivatives of the original stored as name (all of
+    them with force) and returns its digest. The original is only read
+    when something has to be rendered or digest is unknown.
+    """
+    widths = image_widths()
+    if digest and not force and all(storage.exists(derivative_name(digest, w)) for w in widths):
+        return digest
+    try:
+        with storage.open(name, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        raise DerivativeError(f"{name}: {e}")
+    digest = hashlib.sha256(data).hexdigest()
+    missing = [w for w in widths if force or not storage.exists(derivative_name(digest, w))]
+    if not missing:
+        return digest
+    try:
+        image = Image.open(io.BytesIO(data))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            alpha = "transparency" in image.info or image.mode in ("LA", "PA")
+            image = image.convert("RGBA" if alpha else "RGB")
+        for width in missing:
+            target = derivative_name(digest, width)
+            if force and storage.exists(target):
+                storage.delete(target)
+            _store(target, render_derivative(image, width), storage)
+    except (UnidentifiedImageError, OSError) as e:
+        raise DerivativeError(f"{name}: {e}")
+    return digest
+
+
+def delete_derivatives(digest, storage=default_storage):
+    """Removes every derivative stored under digest (whatever its width)."""
+    directory = f"{DERIVATIVE_DIR}/{digest[:2]}"
+    try:
+        files = storage.listdir(directory)[1]
+    except FileNotFoundError:
+        return 0
+    stale = [name for name in files if name.startswith(f"{digest}-")]
+    for name in stale:
+        storage.delete(f"{directory}/{name}")
+    return len(stale)
+
+
+def derive(job):
+    """Process pool entry point: (name, digest, force) -> (name, digest, error)."""
+    name, digest, force = job
+    try:
+        return name, ensure_derivatives(name, digest, force), None
+    except DerivativeError as e:
+        return name, None, str(e)
+
+
+def init_worker():
+    # Spawned workers start with a bare interpreter; forked ones already have Django.
+    import django
+    django.setup()
+
+
+def refresh_product_image(product):
+    """
+    Brings product.image_hash (and the derivatives) in line with
+    product.image after a save. A missing or broken file leaves the hash
+    empty: the lazy view then falls back to the original.
+    """
+    name = product.image.name if product.image else ""
+    if name and name == getattr(product, "_image_name", None) and product.image_hash:
+        return
+    digest = ""
+    if name:
+        try:
+            digest = ensure_derivatives(name)
+        except DerivativeError:
+            pass
+    if digest != product.image_hash:
+        type(product).objects.filter(pk=product.pk).update(image_hash=digest)
+        product.image_hash = digest
+
+
+def thumbnail_url(product, width):
+    """URL of one derivative of product's image, or "" without an image."""
+    if not product.image:
+        return ""
+    if product.image_hash:
+        return default_storage.url(derivative_name(product.image_hash, width))
+    return reverse("product-image", args=[product.pk, width])
+
+
+def srcset(product):
+    """The srcset attribute value for product's image, or ""."""
+    if not product.image:
+        return ""
+    return ", ".join(f"{thumbnail_url(product, width)} {width}w" for width in image_widths())
@@ -0,0 +1,351 @@
+"""
+Bulk catalog import from CSV or JSON Lines (optionally gzipped).
+
+Rows are streamed from disk and upserted on Product.sku in batches, each
+batch in its own transaction, so memory stays flat whatever the feed size.
+Brand, category and subcategory names are resolved through in-memory
+lookups; unknown names are created in bulk as they appear.
+
+Columns: sku is required, name too for new products; description, brand,
+category, subcategory, price, stock and image are optional. Only the
+columns present in the CSV header (or the first valid JSON object) are
+written on update, so a sku/price/stock feed updates prices and stock and
+leaves the rest alone (it cannot create products). A JSON object with
+other columns than that first one is rejected.
+
+bulk_create bypasses the model signals: each batch creates the missing
+rating stats rows and reindexes its products for search; facets, similar
+products and the catalog version are refreshed once at the end.
+"""
+import csv
+import gzip
+import io
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import facets, search, similar
+from .catalog import bump_catalog_version
+from .models import Brand, Category, Product, ProductRatingStats, SubCategory, empty_histogram
+from .taxonomy import ROOT_PATH, child_path, path_depth
+
+# Feed columns -> Product fields they write on update.
+UPDATE_FIELDS = {
+    "name": ["name"],
+    "description": ["description"],
+    "brand": ["brand"],
+    "category": ["category", "subcategory"],
+    "subcategory": ["subcategory"],
+    "price": ["price"],
+    "stock": ["stock"],
+    "image": ["image"],
+}
+MAX_ERRORS_REPORTED = 20
+PRICE_FIELD = Product._meta.get_field("price")
+# Prices must fit Product.price: below 10 ** (max_digits - decimal_places).
+MAX_PRICE = Decimal(10) ** (PRICE_FIELD.max_digits - PRICE_FIELD.decimal_places)
+EMPTY_HISTOGRAM = json.dumps(empty_histogram())
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def open_feed(path):
+    if str(path).endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path), encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def feed_format(path, format=None):
+    if format:
+        return format
+    name = str(path).removesuffix(".gz")
+    return "jsonl" if name.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def read_rows(stream, format):
+    """Yields (line number, {column: value}) from an open feed."""
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, ImportRowError(f"invalid JSON: {e.msg}")
+
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+def feed_columns(row):
+    """The UPDATE_FIELDS columns row carries."""
+    return tuple(c for c in UPDATE_FIELDS if c in row)
+
+
+def update_fields_of(columns):
+    """The Product fields written on update by a feed with these columns."""
+    return sorted({f for c in columns for f in UPDATE_FIELDS[c]}) + ["updated_at"]
+
+
+def check_columns(columns, expected):
+    """Rejects a row whose columns differ from the feed's (its gaps would be written as blanks)."""
+    problems = []
+    missing = [c for c in expected if c not in columns]
+    if missing:
+        problems.append(f"missing {', '.join(missing)}")
+    unexpected = [c for c in columns if c not in expected]
+    if unexpected:
+        problems.append(f"unexpected {', '.join(unexpected)}")
+    if problems:
+        raise ImportRowError(f"columns differ from the first row: {'; '.join(problems)}")
+
+
+def clean_row(row, line, require_name=True):
+    """Normalizes one feed row; raises ImportRowError when it cannot be imported."""
+    if isinstance(row, ImportRowError):
+        raise row
+    sku, name = _text(row.get("sku")), _text(row.get("name"))
+    if not sku:
+        raise ImportRowError("missing sku")
+    if len(sku) > 64:
+        raise ImportRowError("sku longer than 64 characters")
+    if require_name and not name:
+        raise ImportRowError("missing name")
+    if len(name) > 100:
+        raise ImportRowError("name longer than 100 characters")
+    price = _text(row.get("price"))
+    stock = _text(row.get("stock"))
+    try:
+        price = Decimal(price).quantize(Decimal("0.01")) if price else None
+    except InvalidOperation:
+        raise ImportRowError(f"invalid price {price!r}")
+    if price is not None:
+        if not price.is_finite():
+            raise ImportRowError(f"invalid price {price!r}")
+        if price < 0:
+            raise ImportRowError("negative price")
+        if price >= MAX_PRICE:
+            raise ImportRowError(f"price {price} has more than {PRICE_FIELD.max_digits} digits")
+    try:
+        stock = int(stock) if stock else None
+    except ValueError:
+        raise ImportRowError(f"invalid stock {stock!r}")
+    if stock is not None and stock < 0:
+        raise ImportRowError("negative stock")
+    return {
+        "line": line,
+        "sku": sku,
+        "name": name,
+        "description": _text(row.get("description")),
+        "brand": _text(row.get("brand")),
+        "category": _text(row.get("category")),
+        "subcategory": _text(row.get("subcategory")),
+        "price": price,
+        "stock": stock,
+        "image": _text(row.get("image")),
+    }
+
+
+class NameLookup:
+    """Name -> id maps for brands, categories and subcategories (per category)."""
+
+    def __init__(self):
+        self.brands = {}
+        for id, name in Brand.objects.order_by("-id").values_list("id", "name"):
+            self.brands[name] = id
+        self.categories = {}
+        for id, name in Category.objects.order_by("-id").values_list("id", "name"):
+            self.categories[name] = id
+        self.subcategories = {}
+        for id, category_id, name in SubCategory.objects.order_by("-id").values_list("id", "category_id", "name"):
+            self.subcategories[(category_id, name)] = id
+        self.created = {"brands": 0, "categories": 0, "subcategories": 0}
+
+    def resolve(self, rows):
+        """Creates the names of rows that do not exist yet, in bulk."""
+        brands = {r["brand"] for r in rows if r["brand"] and r["brand"] not in self.brands}
+        if brands:
+            for brand in Brand.objects.bulk_create([Brand(name=name) for name in sorted(brands)]):
+                self.brands[brand.name] = brand.id
+            self.created["brands"] += len(brands)
+
+        categories = {r["category"] for r in rows if r["category"] and r["category"] not in self.categories}
+        if categories:
+            created = Category.objects.bulk_create([Category(name=name) for name in sorted(categories)])
+            for category in created:
+                category.path = child_path(ROOT_PATH, category.id)
+                category.depth = path_depth(category.path)
+                self.categories[category.name] = category.id
+            Category.objects.bulk_update(created, ["path", "depth"])
+            self.created["categories"] += len(categories)
+
+        subcategories = {
+            (self.categories[r["category"]], r["subcategory"])
+            for r in rows if r["category"] and r["subcategory"]
+        } - self.subcategories.keys()
+        if subcategories:
+            created = SubCategory.objects.bulk_create([
+                SubCategory(category_id=category_id, name=name) for category_id, name in sorted(subcategories)
+            ])
+            for subcategory in created:
+                self.subcategories[(subcategory.category_id, subcategory.name)] = subcategory.id
+            self.created["subcategories"] += len(subcategories)
+
+    def values(self, row, updated_at):
+        """The UPSERT_COLUMNS of one cleaned row."""
+        category_id = self.categories.get(row["category"])
+        return (
+            row["sku"],
+            row["name"],
+            row["description"],
+            self.brands.get(row["brand"]),
+            category_id,
+            self.subcategories.get((category_id, row["subcategory"])),
+            connection.ops.adapt_decimalfield_value(row["price"], 10, 2),
+            row["stock"],
+            row["image"] or None,
+            "",
+            updated_at,
+            1,
+        )
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.error_count = 0
+        self.names_created = {}
+        self.started = time.monotonic()
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.rows / elapsed if elapsed else 0.0
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS_REPORTED:
+            self.errors.append((line, message))
+
+
+# Columns of one upsert row, in statement order.
+UPSERT_COLUMNS = [
+    "sku", "name", "description", "brand_id", "category_id", "subcategory_id",
+    "price", "stock", "image", "image_hash", "updated_at", "card_version",
+]
+
+
+def upsert_sql(update_fields):
+    """
+    INSERT ... ON CONFLICT (sku) DO UPDATE for one row. Sent through
+    executemany: building a model instance per row costs more than the
+    database work at this volume.
+    """
+    quote = connection.ops.quote_name
+    columns = {f.name: f.column for f in Product._meta.concrete_fields}
+    updates = [f"{quote(columns[f])} = excluded.{quote(columns[f])}" for f in update_fields]
+    if "image" in update_fields:
+        # A new image has no derivatives yet (build_image_derivatives records them).
+        image, image_hash = quote("image"), quote("image_hash")
+        updates.append(f"{image_hash} = CASE WHEN {image} IS excluded.{image} THEN {image_hash} ELSE '' END")
+    updates = ", ".join(updates)
+    return (
+        f"INSERT INTO {quote(Product._meta.db_table)} ({', '.join(quote(c) for c in UPSERT_COLUMNS)}) "
+        f"VALUES ({', '.join(['%s'] * len(UPSERT_COLUMNS))}) "
+        f"ON CONFLICT ({quote('sku')}) DO UPDATE SET {updates}"
+    )
+
+
+def stats_sql():
+    """Empty ProductRatingStats row for a new product (what the post_save signal would create)."""
+    quote = connection.ops.quote_name
+    return (
+        f"INSERT INTO {quote(ProductRatingStats._meta.db_table)} "
+        f"({quote('product_id')}, {quote('count')}, {quote('total')}, {quote('mean')}, {quote('histogram')}) "
+        f"VALUES (%s, 0, 0, 0, %s) ON CONFLICT DO NOTHING"
+    )
+
+
+def upsert_batch(rows, lookup, update_fields, result):
+    # The last row wins when a sku repeats within a batch.
+    rows = list({row["sku"]: row for row in rows}.values())
+    with transaction.atomic():
+        existing = set(Product.objects.filter(sku__in=[row["sku"] for row in rows]).values_list("sku", flat=True))
+        if "name" not in update_fields:
+            for row in rows:
+                if row["sku"] not in existing:
+                    result.error(row["line"], f"unknown sku {row['sku']!r} (the feed has no name column)")
+            rows = [row for row in rows if row["sku"] in existing]
+            if not rows:
+                return
+        lookup.resolve(rows)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor:
+            cursor.executemany(upsert_sql(update_fields), [lookup.values(row, now) for row in rows])
+        ids = dict(Product.objects.filter(sku__in=[row["sku"] for row in rows]).values_list("sku", "id"))
+        new_ids = [id for sku, id in ids.items() if sku not in existing]
+        if new_ids:
+            with connection.cursor() as cursor:
+                cursor.executemany(stats_sql(), [(id, EMPTY_HISTOGRAM) for id in new_ids])
+        search.index_products(ids.values())
+    result.rows += len(rows)
+    result.updated += len(existing)
+    result.created += len(rows) - len(existing)
+
+
+def import_catalog(path, format=None, batch_size=2000, refresh_similar=True, progress=None):
+    """
+    Imports a feed file. progress(result) is called after every batch.
+    Returns an ImportResult.
+    """
+    format = feed_format(path, format)
+    result = ImportResult()
+    started_at = timezone.now()
+    lookup = NameLookup()
+    columns = update_fields = None
+    batch = []
+
+    with open_feed(path) as stream:
+        for line, row in read_rows(stream, format):
+            if not isinstance(row, (dict, ImportRowError)):
+                row = ImportRowError(f"expected a JSON object, got {type(row).__name__}")
+            # The columns are fixed by the first row that imports (every CSV row has the header's).
+            row_columns = feed_columns(row) if isinstance(row, dict) else ()
+            try:
+                if columns is not None and isinstance(row, dict):
+                    check_columns(row_columns, columns)
+                batch.append(clean_row(row, line, require_name="name" in (columns or row_columns)))
+            except ImportRowError as e:
+                result.error(line, str(e))
+                continue
+            if columns is None:
+                columns, update_fields = row_columns, update_fields_of(row_columns)
+            if len(batch) >= batch_size:
+                upsert_batch(batch, lookup, update_fields, result)
+                batch = []
+                if progress:
+                    progress(result)
+        if batch:
+            upsert_batch(batch, lookup, update_fields, result)
+            if progress:
+                progress(result)
+
+    if result.rows:
+        facets.rebuild_facets()
+        if refresh_similar:
+            similar.build_changed_since(started_at)
+        bump_catalog_version()
+    result.names_created = lookup.created
+    return result
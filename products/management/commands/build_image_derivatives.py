@@ -0,0 +1,53 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F
+from django.db.models.functions import Now
+
+from products.catalog import bump_catalog_version
+from products.images import derive, init_worker
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Generate the WebP derivatives of every product image across a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Re-render derivatives that already exist (e.g. after changing the quality).",
+        )
+        parser.add_argument("--batch-size", type=int, default=50, help="Images handed to a worker at a time.")
+
+    def handle(self, *args, **options):
+        # Each distinct file once, however many products share it.
+        jobs = {}
+        for name, digest in Product.objects.exclude(image="").exclude(image=None).values_list("image", "image_hash"):
+            jobs.setdefault(name, (name, digest or None, options["force"]))
+        # Workers only touch the storage; don't let them inherit open database connections.
+        connections.close_all()
+
+        processed, changed, errors = 0, 0, []
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=init_worker) as pool:
+            for name, digest, error in pool.map(derive, jobs.values(), chunksize=options["batch_size"]):
+                processed += 1
+                if error:
+                    errors.append(error)
+                    continue
+                # New srcset URLs: the cached cards of these products are stale.
+                changed += Product.objects.filter(image=name).exclude(image_hash=digest).update(
+                    image_hash=digest, card_version=F("card_version") + 1, updated_at=Now()
+                )
+                if options["verbosity"] >= 2 and processed % 100 == 0:
+                    self.stdout.write(f"{processed}/{len(jobs)} images")
+
+        if changed:
+            bump_catalog_version()
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} images ({changed} products updated, {len(errors)} failed)."
+        ))
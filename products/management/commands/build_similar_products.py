@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from products.similar import build_changed_since, build_neighbors
+
+
+class Command(BaseCommand):
+    help = "Precompute the similar-products lists shown on the product page."
+
+    def add_arguments(self, parser):
+        mode = parser.add_mutually_exclusive_group(required=True)
+        mode.add_argument("--full", action="store_true", help="Rebuild every product's list.")
+        mode.add_argument(
+            "--changed-since",
+            metavar="DATETIME",
+            help="Rebuild the lists affected by products updated since this ISO date/time.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options["full"]:
+            written = build_neighbors(batch_size=options["batch_size"])
+        else:
+            since = parse_datetime(options["changed_since"])
+            if since is None:
+                raise CommandError(f"Invalid date/time: {options['changed_since']}")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            written = build_changed_since(since, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} similar-product lists."))
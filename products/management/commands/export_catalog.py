@@ -0,0 +1,40 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.export import EXPORT_FORMATS, blocks, export_lines, parse_since
+
+
+class Command(BaseCommand):
+    help = "Write the catalog as NDJSON or CSV, optionally only products updated since a date."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="Output file (default: stdout); .gz is gzipped.")
+        parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+        parser.add_argument("--updated-since", metavar="DATETIME", help="ISO date or date/time.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        updated_since = None
+        if options["updated_since"]:
+            try:
+                updated_since = parse_since(options["updated_since"])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        chunks = blocks(export_lines(options["format"], updated_since, options["batch_size"]))
+        path = options["path"]
+        if path == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        opener = gzip.open if path.endswith(".gz") else open
+        written = 0
+        with opener(path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {path}."))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import import_catalog
+
+
+class Command(BaseCommand):
+    help = "Upsert brands, categories, subcategories and products from a CSV or JSON Lines feed (keyed on sku)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Feed file: .csv or .jsonl/.ndjson, optionally .gz")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Override the format guessed from the extension.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--skip-similar",
+            action="store_true",
+            help="Do not refresh similar products now (run build_similar_products later).",
+        )
+
+    def handle(self, *args, **options):
+        def progress(result):
+            self.stdout.write(f"{result.rows} rows ({result.rate:.0f} rows/s)")
+
+        try:
+            result = import_catalog(
+                options["path"],
+                format=options["format"],
+                batch_size=options["batch_size"],
+                refresh_similar=not options["skip_similar"],
+                progress=progress if options["verbosity"] > 1 else None,
+            )
+        except FileNotFoundError:
+            raise CommandError(f"No such file: {options['path']}")
+
+        for line, message in sorted(result.errors):
+            self.stderr.write(f"line {line}: {message}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f"... {result.error_count - len(result.errors)} more rejected rows")
+        names = ", ".join(f"{n} {kind}" for kind, n in result.names_created.items() if n)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.rows} rows ({result.created} created, {result.updated} updated"
+            f"{', new ' + names if names else ''}) at {result.rate:.0f} rows/s; "
+            f"{result.error_count} rejected."
+        ))
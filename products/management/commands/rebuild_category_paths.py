@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from products.catalog import bump_catalog_version
+from products.taxonomy import rebuild_paths
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized category paths from the parent links."
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_paths()
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt paths for {rebuilt} categories."))
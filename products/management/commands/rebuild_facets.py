@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = "Recount the facet cells (category, subcategory, brand, price band, stock) from the products."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cells = rebuild_facets(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {cells} facet cells."))
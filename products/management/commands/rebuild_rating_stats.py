@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.ratings import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized rating stats of every product from both review tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = rebuild_rating_stats(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating stats for {written} products."))
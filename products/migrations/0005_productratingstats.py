@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+import products.models
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    ProductRatingStats = apps.get_model("products", "ProductRatingStats")
+    histograms = {}
+    for model in (apps.get_model("products", "Review"), apps.get_model("orders", "Review")):
+        for product_id, rating in model.objects.values_list("product_id", "rating"):
+            histograms.setdefault(product_id, [0] * 10)[rating - 1] += 1
+
+    stats = []
+    for product_id in Product.objects.values_list("id", flat=True):
+        histogram = histograms.get(product_id, [0] * 10)
+        count = sum(histogram)
+        total = sum(rating * n for rating, n in enumerate(histogram, start=1))
+        stats.append(ProductRatingStats(
+            product_id=product_id,
+            count=count,
+            total=total,
+            mean=total / count if count else 0,
+            histogram=histogram,
+        ))
+    ProductRatingStats.objects.bulk_create(stats, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_subcategory_alter_product_subcategory'),
+        ('orders', '0006_coupon'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRatingStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to='products.product')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(db_index=True, default=0)),
+                ('histogram', models.JSONField(default=products.models.empty_histogram)),
+            ],
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
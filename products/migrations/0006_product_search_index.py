@@ -0,0 +1,46 @@
+from django.db import migrations
+
+SEARCH_COLUMNS = ["name", "description", "brand", "category", "subcategory"]
+CREATE_SEARCH_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_search USING fts5("
+    "name, description, brand, category, subcategory, "
+    "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+)
+CONFIGURE_RANK = (
+    "INSERT INTO products_search (products_search, rank) "
+    "VALUES ('rank', 'bm25(10.0, 1.0, 5.0, 3.0, 3.0)')"
+)
+DROP_SEARCH_TABLE = "DROP TABLE IF EXISTS products_search"
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    Product = apps.get_model("products", "Product")
+    schema_editor.execute(CREATE_SEARCH_TABLE)
+    schema_editor.execute(CONFIGURE_RANK)
+    rows = Product.objects.values_list(
+        "id", "name", "description", "brand__name", "category__name", "subcategory__name"
+    )
+    placeholders = ", ".join(["%s"] * (len(SEARCH_COLUMNS) + 1))
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO products_search (rowid, {', '.join(SEARCH_COLUMNS)}) VALUES ({placeholders})",
+            [[row[0]] + [value or "" for value in row[1:]] for row in rows],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(DROP_SEARCH_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_productratingstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:34
+
+from collections import Counter
+from decimal import Decimal
+
+from django.db import migrations, models
+
+PRICE_BOUNDS = [Decimal("50"), Decimal("100"), Decimal("250"), Decimal("500"), Decimal("1000")]
+
+
+def backfill_facet_cells(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    FacetCell = apps.get_model("products", "FacetCell")
+    counts = Counter()
+    rows = Product.objects.values_list("category_id", "subcategory_id", "brand_id", "price", "stock")
+    for category_id, subcategory_id, brand_id, price, stock in rows:
+        bucket = 0 if price is None else 1 + sum(price >= bound for bound in PRICE_BOUNDS)
+        counts[(category_id or 0, subcategory_id or 0, brand_id or 0, bucket, bool(stock))] += 1
+    FacetCell.objects.bulk_create([
+        FacetCell(category=c, subcategory=s, brand=b, price_bucket=p, in_stock=i, count=n)
+        for (c, s, b, p, i), n in counts.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.PositiveIntegerField(default=0)),
+                ('subcategory', models.PositiveIntegerField(default=0)),
+                ('brand', models.PositiveIntegerField(default=0)),
+                ('price_bucket', models.PositiveSmallIntegerField(default=0)),
+                ('in_stock', models.BooleanField(default=False)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='facetcell',
+            constraint=models.UniqueConstraint(fields=('category', 'subcategory', 'brand', 'price_bucket', 'in_stock'), name='unique_facet_cell'),
+        ),
+        migrations.RunPython(backfill_facet_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+def create_catalog_version(apps, schema_editor):
+    apps.get_model("products", "CatalogVersion").objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_facetcell'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_catalog_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+def backfill_category_paths(apps, schema_editor):
+    Category = apps.get_model("products", "Category")
+    parents = dict(Category.objects.values_list("id", "parent_id"))
+    paths = {}
+
+    def resolve(pk, seen=()):
+        if pk not in paths:
+            parent_id = parents.get(pk)
+            if parent_id is None or parent_id not in parents or parent_id in seen:
+                paths[pk] = f"/{pk}/"
+            else:
+                paths[pk] = f"{resolve(parent_id, seen + (pk,))}{pk}/"
+        return paths[pk]
+
+    for pk in parents:
+        Category.objects.filter(pk=pk).update(path=resolve(pk), depth=resolve(pk).count("/") - 2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_category_paths, migrations.RunPython.noop),
+    ]
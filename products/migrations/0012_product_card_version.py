@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_updated_at_productneighbors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='card_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:06
+
+from django.db import migrations, models
+import shop.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_product_image_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=shop.storage.content_storage, upload_to='products/'),
+        ),
+    ]
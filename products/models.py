@@ -1,6 +1,10 @@
+import struct
+
 from django.db import models
 from django.conf import settings
 
+from shop.storage import content_storage
+
 class Brand(models.Model):
     name = models.CharField(max_length=50)
 
@@ -10,6 +14,13 @@ class Brand(models.Model):
 class Category(models.Model):
     name = models.CharField(max_length=50)
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL)
+    # Materialized path of ancestor ids, e.g. "/1/4/7/", maintained by products.taxonomy.
+    path = models.CharField(max_length=255, blank=True, default="", db_index=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    def clean(self):
+        from .taxonomy import check_parent
+        check_parent(self)
 
     def __str__(self):
         return self.name
@@ -21,6 +32,8 @@ class SubCategory(models.Model):
         return self.name
 
 class Product(models.Model):
+    # Supplier stock-keeping unit; the key bulk imports upsert on (see products.importer).
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=100)
     description = models.TextField()
     brand = models.ForeignKey(Brand, null=True, blank=True, on_delete=models.SET_NULL, related_name="products")
@@ -28,13 +41,25 @@ class Product(models.Model):
     subcategory = models.ForeignKey(SubCategory, null=True, blank=True, on_delete=models.SET_NULL, related_name="products")  
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     stock = models.PositiveIntegerField(null=True, blank=True)
-    image = models.ImageField(upload_to='products/', null=True, blank=True)
+    image = models.ImageField(upload_to='products/', storage=content_storage, null=True, blank=True)
+    # sha256 of the image file; its resized derivatives are stored under it, see products.images.
+    image_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Bumped whenever anything shown on the storefront card changes, see products.cards.
+    card_version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        # Keyset pagination walks these (sort key, id) pairs, see products.pagination.
+        indexes = [
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["name", "id"], name="product_name_id_idx"),
+        ]
 
     def average_rating(self):
-        reviews = self.product_reviews.all()
-        if reviews.exists():
-            return sum(r.rating for r in reviews) / reviews.count()
-        return 0
+        try:
+            return self.rating_stats.mean
+        except ProductRatingStats.DoesNotExist:
+            return 0
 
     def __str__(self):
         return self.name
@@ -52,3 +77,83 @@ class Review(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.product.name} ({self.rating}/10)"
 
+
+
+def empty_histogram():
+    return [0] * 10
+
+
+class ProductRatingStats(models.Model):
+    """
+    Denormalized rating aggregates for a product, kept in sync with both
+    products.Review and orders.Review by the signals in products.signals.
+    histogram[i] holds the number of reviews rated i + 1.
+    """
+    product = models.OneToOneField(Product, primary_key=True, on_delete=models.CASCADE, related_name="rating_stats")
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0, db_index=True)
+    histogram = models.JSONField(default=empty_histogram)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.mean:.2f} ({self.count} reviews)"
+
+
+class FacetCell(models.Model):
+    """
+    One row per distinct (category, subcategory, brand, price bucket, stock)
+    combination with the number of products in it. Ids are stored as plain
+    integers with 0 meaning "not set". Maintained by products.facets.
+    """
+    category = models.PositiveIntegerField(default=0)
+    subcategory = models.PositiveIntegerField(default=0)
+    brand = models.PositiveIntegerField(default=0)
+    price_bucket = models.PositiveSmallIntegerField(default=0)
+    in_stock = models.BooleanField(default=False)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "subcategory", "brand", "price_bucket", "in_stock"],
+                name="unique_facet_cell",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.category}/{self.subcategory}/{self.brand}/{self.price_bucket}/{self.in_stock}: {self.count}"
+
+
+class CatalogVersion(models.Model):
+    """
+    Single-row counter bumped whenever catalog data (products, brands,
+    categories, subcategories, ratings) changes. Process-local caches compare
+    it with the version they were built from, see products.catalog.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Catalog v{self.version}"
+
+
+class ProductNeighbors(models.Model):
+    """
+    Precomputed "similar products" of a product, best first, packed as
+    little-endian uint32 ids. Built by products.similar.
+    """
+    product = models.OneToOneField(Product, primary_key=True, on_delete=models.CASCADE, related_name="neighbors")
+    neighbor_ids = models.BinaryField(default=bytes)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    @staticmethod
+    def pack(ids):
+        return struct.pack(f"<{len(ids)}I", *ids)
+
+    @property
+    def ids(self):
+        data = bytes(self.neighbor_ids)
+        return list(struct.unpack(f"<{len(data) // 4}I", data))
+
+    def __str__(self):
+        return f"Neighbors of {self.product_id}"
@@ -0,0 +1,112 @@
+"""
+Full-response cache for anonymous storefront pages.
+
+Entries are keyed on the path plus a normalized query string (see
+products.views.home_params), so "?sort=AZ&foo=1" and "?sort=AZ" share one
+entry, and stamped with the catalog snapshot version: a catalog write makes
+every entry stale without deleting anything.
+
+A stale or missing entry is recomputed by one request at a time. The
+request that wins the lock renders the page; concurrent requests serve the
+stale copy when there is one, otherwise wait briefly for the winner and
+only render themselves if it does not finish in time.
+
+Only requests that cannot see anything personal are served or stored:
+anonymous GET/HEAD, with no pending flash messages. A response that set a
+cookie, used the CSRF token or touched the session is never stored. Cached
+responses still go through SessionMiddleware, which adds Vary: Cookie
+because the user was looked up.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+
+from .catalog import get_catalog
+
+LOCK_TIMEOUT = 10
+WAIT_TIMEOUT = 2.0
+WAIT_INTERVAL = 0.05
+
+
+def page_cache():
+    return caches[settings.PAGE_CACHE]
+
+
+def page_key(path, params):
+    digest = hashlib.md5(f"{path}?{params.urlencode()}".encode()).hexdigest()
+    return f"page:{digest}"
+
+
+def cacheable_request(request):
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def cacheable_response(request, response):
+    session = getattr(request, "session", None)
+    return (
+        response.status_code == 200
+        and not response.cookies
+        and not response.streaming
+        and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+        and not (session is not None and session.modified)
+    )
+
+
+def _mark(response, state):
+    response["X-Page-Cache"] = state
+    return response
+
+
+def cache_anonymous_page(normalize):
+    """
+    View decorator. normalize(request.GET) returns the canonical QueryDict
+    the view reads, or None when the request must not be cached.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not cacheable_request(request):
+                return view(request, *args, **kwargs)
+            params = normalize(request.GET)
+            if params is None:
+                return view(request, *args, **kwargs)
+
+            cache = page_cache()
+            key = page_key(request.path, params)
+            version = get_catalog().version
+            entry = cache.get(key)
+            if entry is not None:
+                entry_version, fresh_until, response = entry
+                if entry_version == version and time.time() < fresh_until:
+                    return _mark(response, "hit")
+
+            lock = f"{key}:lock"
+            if not cache.add(lock, 1, LOCK_TIMEOUT):
+                if entry is not None:
+                    return _mark(entry[2], "stale")
+                deadline = time.monotonic() + WAIT_TIMEOUT
+                while time.monotonic() < deadline:
+                    time.sleep(WAIT_INTERVAL)
+                    entry = cache.get(key)
+                    if entry is not None and entry[0] == version:
+                        return _mark(entry[2], "hit")
+                return _mark(view(request, *args, **kwargs), "miss")
+
+            try:
+                response = view(request, *args, **kwargs)
+                if cacheable_response(request, response):
+                    entry = (version, time.time() + settings.PAGE_CACHE_TIMEOUT, response)
+                    cache.set(key, entry, settings.PAGE_CACHE_TIMEOUT + settings.PAGE_CACHE_STALE_TIMEOUT)
+            finally:
+                cache.delete(lock)
+            return _mark(response, "miss")
+        return wrapper
+    return decorator
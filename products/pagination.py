@@ -0,0 +1,228 @@
+"""
+Keyset (cursor) pagination for product listings.
+
+Instead of COUNT(*) + OFFSET, every page continues from the sort key of the
+last row it showed: WHERE (key, id) > (last_key, last_id) ORDER BY key, id.
+Cursors are opaque base64 strings carrying the sort mode, the key values of
+the boundary row and the direction to read in.
+
+NULL sort keys (products without a price or rating stats) are treated as the
+smallest value, matching SQLite: first in ascending sorts, last in descending.
+"""
+import base64
+import binascii
+import json
+from decimal import Decimal
+
+from django.db.models import F, Q
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# sort mode -> [(field, descending), ...]; the last key is always the unique id.
+# avg_rating and search_rank are annotations (see products.views and products.search).
+SORT_KEYS = {
+    "default": [("id", False)],
+    "price-asc": [("price", False), ("id", False)],
+    "price-desc": [("price", True), ("id", True)],
+    "rating": [("avg_rating", True), ("id", True)],
+    "AZ": [("name", False), ("id", False)],
+    "ZA": [("name", True), ("id", True)],
+    # Only valid on querysets filtered by products.search.filter_by_query.
+    "relevance": [("search_rank", False), ("id", False)],
+}
+
+# Totals are counted up to this many rows, beyond it they are reported as "at least".
+APPROXIMATE_TOTAL_CAP = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort, values, reverse=False):
+    payload = {"s": sort, "v": [str(v) if isinstance(v, Decimal) else v for v in values]}
+    if reverse:
+        payload["r"] = 1
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    """Returns (values, reverse). Raises InvalidCursor for garbage or a cursor of another sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = payload["v"]
+        reverse = bool(payload.get("r"))
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+    if payload.get("s") != sort or not isinstance(values, list) or len(values) != len(SORT_KEYS[sort]):
+        raise InvalidCursor(cursor)
+    return values, reverse
+
+
+def _order_expression(field, descending):
+    if descending:
+        return F(field).desc(nulls_last=True)
+    return F(field).asc(nulls_first=True)
+
+
+def _after(field, descending, value):
+    """Rows strictly after value in the given direction (NULL is the smallest value)."""
+    if not descending:
+        if value is None:
+            return Q(**{f"{field}__isnull": False})
+        return Q(**{f"{field}__gt": value})
+    if value is None:
+        return Q(pk__in=[])
+    return Q(**{f"{field}__lt": value}) | Q(**{f"{field}__isnull": True})
+
+
+def _equal(field, value):
+    if value is None:
+        return Q(**{f"{field}__isnull": True})
+    return Q(**{field: value})
+
+
+def keyset_filter(keys, values):
+    """(k1, k2, ...) > (v1, v2, ...) expanded into OR'd prefix comparisons."""
+    condition = Q(pk__in=[])
+    prefix = Q()
+    for (field, descending), value in zip(keys, values):
+        condition |= prefix & _after(field, descending, value)
+        prefix &= _equal(field, value)
+    return condition
+
+
+def _row_values(obj, keys):
+    return [getattr(obj, field) for field, _ in keys]
+
+
+class KeysetPage:
+    """A page of products plus the cursors around it; iterable like a Page."""
+
+    def __init__(self, object_list, sort, keys, has_next, has_previous):
+        self.object_list = object_list
+        self.sort = sort
+        self.keys = keys
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.object_list:
+            return None
+        return encode_cursor(self.sort, _row_values(self.object_list[-1], self.keys))
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous or not self.object_list:
+            return None
+        return encode_cursor(self.sort, _row_values(self.object_list[0], self.keys), reverse=True)
+
+
+def paginate_keyset(queryset, sort, cursor=None, per_page=10):
+    """
+    Returns a KeysetPage of queryset ordered by SORT_KEYS[sort]. An invalid
+    cursor falls back to the first page.
+    """
+    keys = SORT_KEYS[sort]
+    values, reverse = None, False
+    if cursor:
+        try:
+            values, reverse = decode_cursor(cursor, sort)
+        except InvalidCursor:
+            values = None
+
+    read_keys = [(field, descending != reverse) for field, descending in keys]
+    if sort == "rating" and "avg_rating" not in queryset.query.annotations:
+        queryset = queryset.annotate(avg_rating=F("rating_stats__mean"))
+    if values is not None:
+        queryset = queryset.filter(keyset_filter(read_keys, values))
+    queryset = queryset.order_by(*[_order_expression(field, descending) for field, descending in read_keys])
+
+    rows = list(queryset[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+        return KeysetPage(rows, sort, keys, has_next=True, has_previous=has_more)
+    return KeysetPage(rows, sort, keys, has_next=has_more, has_previous=values is not None)
+
+
+def approximate_total(queryset, cap=APPROXIMATE_TOTAL_CAP):
+    """
+    Counts at most cap + 1 rows so the cost stays bounded on large catalogs.
+    Returns (total, exact).
+    """
+    total = queryset.order_by()[:cap + 1].count()
+    return min(total, cap), total <= cap
+
+
+# ---------------- DRF ----------------
+class ProductKeysetPagination(BasePagination):
+    """
+    Cursor pagination for /api/products/ using the storefront sort modes:
+    ?sort=price-asc|price-desc|rating|AZ|ZA&cursor=<opaque>, search results
+    without a sort come best match first. Pass
+    ?with_total=1 to include an approximate total.
+    """
+    page_size = 15
+    cursor_query_param = "cursor"
+    sort_query_param = "sort"
+
+    def get_sort(self, request, queryset):
+        sort = request.query_params.get(self.sort_query_param)
+        if sort in SORT_KEYS and sort != "relevance":
+            return sort
+        if "search_rank" in queryset.query.annotations:
+            return "relevance"
+        return "default"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page = paginate_keyset(
+            queryset,
+            self.get_sort(request, queryset),
+            request.query_params.get(self.cursor_query_param),
+            per_page=self.page_size,
+        )
+        self.total = None
+        if request.query_params.get("with_total"):
+            self.total = approximate_total(queryset)
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        body = {
+            "next": self.get_link(self.page.next_cursor),
+            "previous": self.get_link(self.page.previous_cursor),
+        }
+        if self.total is not None:
+            body["total"], body["total_exact"] = self.total
+        body["results"] = data
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "total": {"type": "integer"},
+                "total_exact": {"type": "boolean"},
+                "results": schema,
+            },
+        }
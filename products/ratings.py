@@ -0,0 +1,71 @@
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Product, ProductRatingStats, empty_histogram
+
+
+def review_models():
+    """Both review tables feed the same per-product stats."""
+    return [apps.get_model("products", "Review"), apps.get_model("orders", "Review")]
+
+
+def compute_histograms(product_ids=None):
+    """
+    Returns {product_id: histogram} built from one grouped query per review table.
+    When product_ids is None every reviewed product is included.
+    """
+    histograms = defaultdict(empty_histogram)
+    for model in review_models():
+        rows = model.objects.all()
+        if product_ids is not None:
+            rows = rows.filter(product_id__in=product_ids)
+        for row in rows.values("product_id", "rating").annotate(n=Count("id")).order_by():
+            if 1 <= row["rating"] <= 10:
+                histograms[row["product_id"]][row["rating"] - 1] += row["n"]
+    return histograms
+
+
+def build_stats(product_id, histogram):
+    count = sum(histogram)
+    total = sum(rating * n for rating, n in enumerate(histogram, start=1))
+    return ProductRatingStats(
+        product_id=product_id,
+        count=count,
+        total=total,
+        mean=total / count if count else 0,
+        histogram=histogram,
+    )
+
+
+def save_stats(stats, batch_size=None):
+    ProductRatingStats.objects.bulk_create(
+        stats,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=["count", "total", "mean", "histogram"],
+    )
+
+
+def refresh_rating_stats(product_id):
+    """Recompute the stats row of a single product inside the caller's transaction."""
+    with transaction.atomic():
+        if not Product.objects.filter(pk=product_id).exists():
+            return
+        histogram = compute_histograms([product_id]).get(product_id, empty_histogram())
+        save_stats([build_stats(product_id, histogram)])
+
+
+def rebuild_rating_stats(batch_size=1000):
+    """Recompute the stats of every product. Returns the number of rows written."""
+    with transaction.atomic():
+        histograms = compute_histograms()
+        stats = [
+            build_stats(product_id, histograms.get(product_id, empty_histogram()))
+            for product_id in Product.objects.values_list("id", flat=True).iterator()
+        ]
+        save_stats(stats, batch_size=batch_size)
+    return len(stats)
@@ -0,0 +1,173 @@
+"""
+Full-text product search backed by an SQLite FTS5 table.
+
+products_search holds one row per product (rowid = product id) with the
+product's own text plus the names of its brand, category and subcategory.
+It is kept in sync by the signals in products.signals and can be rebuilt
+with the reindex_search management command. On other database backends,
+or if FTS5 is missing, search falls back to the icontains lookups.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+SEARCH_TABLE = "products_search"
+SEARCH_COLUMNS = ["name", "description", "brand", "category", "subcategory"]
+# bm25() column weights, same order as SEARCH_COLUMNS.
+SEARCH_WEIGHTS = [10.0, 1.0, 5.0, 3.0, 3.0]
+
+CREATE_SEARCH_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    f"{', '.join(SEARCH_COLUMNS)}, prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+)
+# Makes the hidden rank column use the weighted bm25() score.
+CONFIGURE_RANK = (
+    f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) "
+    f"VALUES ('rank', 'bm25({', '.join(str(w) for w in SEARCH_WEIGHTS)})')"
+)
+DROP_SEARCH_TABLE = f"DROP TABLE IF EXISTS {SEARCH_TABLE}"
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_available = None
+
+
+def search_available():
+    global _available
+    if connection.vendor != "sqlite":
+        return False
+    if _available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_TABLE])
+            _available = cursor.fetchone() is not None
+    return _available
+
+
+def build_match(query):
+    """
+    Turns free text into an FTS5 expression: every word must match,
+    the last one as a prefix so results follow the user while typing.
+    """
+    tokens = TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens[:-1]]
+    terms.append(f'"{tokens[-1]}"*')
+    return " AND ".join(terms)
+
+
+def search_product_ids(query, limit=100):
+    """Returns up to limit product ids matching query, best BM25 score first."""
+    match = build_match(query)
+    if match is None:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filter_by_query(queryset, query):
+    """
+    Restricts queryset to products matching query. When FTS is available the
+    index is joined in and each row gets a search_rank (lower is better).
+    """
+    if not search_available():
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(brand__name__icontains=query) |
+            Q(category__name__icontains=query) |
+            Q(subcategory__name__icontains=query)
+        ).distinct()
+
+    match = build_match(query)
+    if match is None:
+        return queryset.none()
+    product_table = Product._meta.db_table
+    return queryset.extra(
+        tables=[SEARCH_TABLE],
+        where=[f"{SEARCH_TABLE} MATCH %s", f"{SEARCH_TABLE}.rowid = {product_table}.id"],
+        params=[match],
+    ).annotate(search_rank=RawSQL(f"{SEARCH_TABLE}.rank", [], output_field=FloatField()))
+
+
+def order_by_relevance(queryset):
+    """Best matches first; a no-op when filter_by_query used the fallback."""
+    if "search_rank" in queryset.query.annotations:
+        return queryset.order_by("search_rank", "id")
+    return queryset
+
+
+# ---------------- INDEX MAINTENANCE ----------------
+def _documents(product_ids=None):
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+    rows = products.values_list(
+        "id", "name", "description", "brand__name", "category__name", "subcategory__name"
+    ).order_by("id")
+    for row in rows.iterator(chunk_size=2000):
+        yield [row[0]] + [value or "" for value in row[1:]]
+
+
+def _insert(cursor, documents):
+    placeholders = ", ".join(["%s"] * (len(SEARCH_COLUMNS) + 1))
+    cursor.executemany(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) VALUES ({placeholders})",
+        documents,
+    )
+
+
+def index_products(product_ids):
+    """(Re)indexes the given products, dropping ids that no longer exist."""
+    product_ids = list(product_ids)
+    if not product_ids or not search_available():
+        return
+    with connection.cursor() as cursor:
+        remove_products(product_ids, cursor=cursor)
+        _insert(cursor, list(_documents(product_ids)))
+
+
+def remove_products(product_ids, cursor=None):
+    product_ids = list(product_ids)
+    if not product_ids or not search_available():
+        return
+    if cursor is None:
+        with connection.cursor() as cursor:
+            return remove_products(product_ids, cursor=cursor)
+    for start in range(0, len(product_ids), 500):
+        chunk = product_ids[start:start + 500]
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})",
+            chunk,
+        )
+
+
+def rebuild_index(batch_size=2000):
+    """Drops and refills the whole index. Returns the number of indexed products."""
+    global _available
+    indexed = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(DROP_SEARCH_TABLE)
+        cursor.execute(CREATE_SEARCH_TABLE)
+        cursor.execute(CONFIGURE_RANK)
+        _available = True
+        batch = []
+        for document in _documents():
+            batch.append(document)
+            if len(batch) >= batch_size:
+                _insert(cursor, batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            _insert(cursor, batch)
+            indexed += len(batch)
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return indexed
@@ -1,14 +1,49 @@
+from django.db.models import prefetch_related_objects
+from django.db.models.manager import BaseManager
 from rest_framework import serializers
+from . import images
 from .models import Product, Review
 
+
+class BatchedListSerializer(serializers.ListSerializer):
+    """
+    Loads the relations named in the child's Meta.batch_prefetch for the
+    whole list at once: one query per relation, none for relations the
+    queryset already joined with select_related.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        prefetch_related_objects(items, *getattr(self.child.Meta, "batch_prefetch", ()))
+        return super().to_representation(items)
+
+
+def absolute(request, url):
+    return request.build_absolute_uri(url) if request is not None and url else url
+
+
+def image_srcset(request, product):
+    """srcset of product's image derivatives, with absolute URLs like ImageField's."""
+    if not product.image:
+        return ""
+    return ", ".join(
+        f"{absolute(request, images.thumbnail_url(product, width))} {width}w" for width in images.image_widths()
+    )
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = ["id", "rating", "comment", "created_at"]
 
 class ProductSerializer(serializers.ModelSerializer):
+    average_rating = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
+        list_serializer_class = BatchedListSerializer
+        batch_prefetch = ["rating_stats"]
         fields = [
             "id",
             "name",
@@ -19,5 +54,15 @@ class ProductSerializer(serializers.ModelSerializer):
             "price",
             "stock",
             "image",
+            "image_srcset",
             "average_rating",
         ]
+
+    def get_average_rating(self, obj):
+        # The list views annotate avg_rating; otherwise read the (batched) stats row.
+        if hasattr(obj, "avg_rating"):
+            return obj.avg_rating or 0
+        return obj.average_rating()
+
+    def get_image_srcset(self, obj):
+        return image_srcset(self.context.get("request"), obj)
@@ -0,0 +1,203 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Brand, Category, Product, ProductRatingStats, SubCategory
+from .ratings import refresh_rating_stats, review_models
+from . import cards, facets, images, search, similar, taxonomy
+from .catalog import bump_catalog_version
+
+
+@receiver(post_save, sender=Product)
+def create_rating_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ProductRatingStats.objects.get_or_create(product=instance)
+
+
+def remember_review_product(sender, instance, raw=False, **kwargs):
+    # An update may move the review to another product, whose stats change too.
+    instance._previous_product_id = None
+    if not raw and instance.pk is not None:
+        instance._previous_product_id = (
+            sender._default_manager.filter(pk=instance.pk).values_list("product_id", flat=True).first()
+        )
+
+
+def review_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        product_ids = {instance.product_id, getattr(instance, "_previous_product_id", None)} - {None}
+        for product_id in product_ids:
+            refresh_rating_stats(product_id)
+        cards.bump_card_versions(Product.objects.filter(pk__in=product_ids))
+        bump_catalog_version()
+
+
+def review_deleted(sender, instance, origin=None, **kwargs):
+    # The stats row goes away together with the product, nothing to refresh.
+    if isinstance(origin, Product):
+        return
+    refresh_rating_stats(instance.product_id)
+    cards.bump_card_versions(Product.objects.filter(pk=instance.product_id))
+    bump_catalog_version()
+
+
+def connect_review_signals():
+    for model in review_models():
+        pre_save.connect(
+            remember_review_product, sender=model, dispatch_uid=f"rating_stats_pre_save_{model._meta.label}"
+        )
+        post_save.connect(review_saved, sender=model, dispatch_uid=f"rating_stats_save_{model._meta.label}")
+        post_delete.connect(review_deleted, sender=model, dispatch_uid=f"rating_stats_delete_{model._meta.label}")
+
+
+# ---------------- SEARCH INDEX ----------------
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+def reindex_related_products(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_products(instance.products.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Brand)
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=SubCategory)
+def remember_related_products(sender, instance, **kwargs):
+    # The products are detached (SET_NULL) before post_delete fires.
+    instance._detached_product_ids = list(instance.products.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+def reindex_detached_products(sender, instance, **kwargs):
+    search.index_products(getattr(instance, "_detached_product_ids", []))
+
+
+# ---------------- FACETS ----------------
+@receiver(pre_save, sender=Product)
+def remember_facet_cell(sender, instance, raw=False, **kwargs):
+    instance._facet_cell = None
+    if raw or instance.pk is None:
+        return
+    old = Product.objects.filter(pk=instance.pk).only(
+        "category_id", "subcategory_id", "brand_id", "price", "stock"
+    ).first()
+    if old is not None:
+        instance._facet_cell = facets.product_cell(old)
+
+
+@receiver(post_save, sender=Product)
+def update_facet_cells(sender, instance, raw=False, **kwargs):
+    if not raw:
+        facets.move_product(getattr(instance, "_facet_cell", None), facets.product_cell(instance))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_facet_cells(sender, instance, **kwargs):
+    facets.move_product(facets.product_cell(instance), None)
+
+
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+def clear_facet_value(sender, instance, **kwargs):
+    facets.clear_facet_value(sender._meta.model_name, instance.pk)
+
+
+# ---------------- CATEGORY PATHS ----------------
+@receiver(pre_save, sender=Category)
+def validate_category_parent(sender, instance, raw=False, **kwargs):
+    if not raw:
+        taxonomy.check_parent(instance)
+
+
+@receiver(post_save, sender=Category)
+def update_category_path(sender, instance, raw=False, **kwargs):
+    if not raw:
+        taxonomy.category_saved(instance)
+
+
+@receiver(post_delete, sender=Category)
+def detach_category_children(sender, instance, **kwargs):
+    taxonomy.category_deleted(instance)
+
+
+# ---------------- PRODUCT CARDS ----------------
+@receiver(post_save, sender=Product)
+def invalidate_product_card(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # A full save already moved updated_at; saves limited to some fields may not have.
+    if not created and not raw and update_fields is not None:
+        cards.bump_card_versions(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def invalidate_related_cards(sender, instance, created, raw=False, **kwargs):
+    # The cards show the brand and category names.
+    if not created and not raw:
+        cards.bump_card_versions(instance.products.all())
+
+
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+def invalidate_detached_cards(sender, instance, **kwargs):
+    # Also moves updated_at, which the product API validators are built on.
+    cards.bump_card_versions(Product.objects.filter(pk__in=getattr(instance, "_detached_product_ids", [])))
+
+
+# ---------------- SIMILAR PRODUCTS ----------------
+@receiver(post_save, sender=Product)
+def refresh_similar_products(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Saves limited to fields the scores don't read (stock, say) leave the list as it is.
+    if raw or (update_fields is not None and not similar.SCORED_FIELDS & set(update_fields)):
+        return
+    # Scored after the writer's transaction commits, so it is not held meanwhile.
+    transaction.on_commit(lambda: similar.refresh_product(instance))
+
+
+# ---------------- IMAGE DERIVATIVES ----------------
+@receiver(pre_save, sender=Product)
+def remember_image_name(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._image_name = None
+    if raw or instance.pk is None or (update_fields is not None and "image" not in update_fields):
+        return
+    instance._image_name = Product.objects.filter(pk=instance.pk).values_list("image", flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def refresh_image_derivatives(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and "image" not in update_fields):
+        return
+    images.refresh_product_image(instance)
+
+
+# ---------------- CATALOG VERSION ----------------
+# Connected last so the version moves after every derived index is updated.
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+def catalog_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_catalog_version()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+def catalog_deleted(sender, instance, **kwargs):
+    bump_catalog_version()
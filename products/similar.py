@@ -0,0 +1,170 @@
+"""
+Precomputed "similar products" lists.
+
+For every product the top SIMILAR_PRODUCTS_COUNT neighbors are scored once
+and stored in ProductNeighbors, so the product page reads them with the
+product itself instead of running a subcategory query per view.
+
+Candidates are the products closest in price within the same subcategory
+and the same category (SIMILAR_PRODUCTS_WINDOW on each side), which keeps a
+full build linear in the catalog size. Each candidate is scored on shared
+subcategory / category, shared brand, price proximity and rating.
+"""
+import heapq
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Product, ProductNeighbors
+
+Candidate = namedtuple("Candidate", "id subcategory_id category_id brand_id price rating")
+
+SUBCATEGORY_WEIGHT = 4.0
+CATEGORY_WEIGHT = 2.0
+BRAND_WEIGHT = 1.5
+PRICE_WEIGHT = 2.0
+RATING_WEIGHT = 1.0
+# Product fields the scores read (the rating comes from ProductRatingStats).
+SCORED_FIELDS = frozenset({
+    "price", "brand", "brand_id", "category", "category_id", "subcategory", "subcategory_id",
+})
+
+
+def score(product, candidate):
+    value = 0.0
+    if product.subcategory_id and product.subcategory_id == candidate.subcategory_id:
+        value += SUBCATEGORY_WEIGHT
+    elif product.category_id and product.category_id == candidate.category_id:
+        value += CATEGORY_WEIGHT
+    if product.brand_id and product.brand_id == candidate.brand_id:
+        value += BRAND_WEIGHT
+    if product.price and candidate.price:
+        gap = abs(product.price - candidate.price) / max(product.price, candidate.price)
+        value += PRICE_WEIGHT * (1 - min(gap, 1.0))
+    value += RATING_WEIGHT * candidate.rating / 10
+    return value
+
+
+def load_candidates(queryset=None):
+    queryset = Product.objects.all() if queryset is None else queryset
+    rows = queryset.values_list(
+        "id", "subcategory_id", "category_id", "brand_id", "price", "rating_stats__mean"
+    ).order_by("id")
+    return [
+        Candidate(id, subcategory_id, category_id, brand_id, float(price) if price is not None else None, mean or 0)
+        for id, subcategory_id, category_id, brand_id, price, mean in rows.iterator(chunk_size=5000)
+    ]
+
+
+class PriceIndex:
+    """Candidates grouped by a key and sorted by price, for nearest-price windows."""
+
+    def __init__(self, candidates, key):
+        self.groups = {}
+        for candidate in candidates:
+            group_key = getattr(candidate, key)
+            if group_key:
+                self.groups.setdefault(group_key, []).append(candidate)
+        self.prices = {}
+        for group_key, group in self.groups.items():
+            group.sort(key=lambda c: (c.price or 0, c.id))
+            self.prices[group_key] = [c.price or 0 for c in group]
+
+    def window(self, group_key, price, size):
+        group = self.groups.get(group_key)
+        if not group:
+            return []
+        position = bisect_left(self.prices[group_key], price or 0)
+        return group[max(0, position - size):position + size]
+
+
+def neighbors_for(product, indexes, count, window):
+    pool = {}
+    for index, key in indexes:
+        for candidate in index.window(getattr(product, key), product.price, window):
+            if candidate.id != product.id:
+                pool[candidate.id] = candidate
+    best = heapq.nlargest(count, pool.values(), key=lambda c: (score(product, c), -c.id))
+    return [c.id for c in best]
+
+
+def build_neighbors(product_ids=None, batch_size=1000):
+    """
+    Recomputes the lists of product_ids (every product when None) against the
+    whole catalog. Returns the number of lists written.
+    """
+    count = settings.SIMILAR_PRODUCTS_COUNT
+    window = settings.SIMILAR_PRODUCTS_WINDOW
+    candidates = load_candidates()
+    indexes = [
+        (PriceIndex(candidates, "subcategory_id"), "subcategory_id"),
+        (PriceIndex(candidates, "category_id"), "category_id"),
+    ]
+    targets = candidates
+    if product_ids is not None:
+        wanted = set(product_ids)
+        targets = [c for c in candidates if c.id in wanted]
+
+    written = 0
+    for start in range(0, len(targets), batch_size):
+        rows = [
+            ProductNeighbors(product_id=product.id, neighbor_ids=ProductNeighbors.pack(
+                neighbors_for(product, indexes, count, window)
+            ))
+            for product in targets[start:start + batch_size]
+        ]
+        with transaction.atomic():
+            ProductNeighbors.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=["product"],
+                update_fields=["neighbor_ids", "computed_at"],
+            )
+        written += len(rows)
+    return written
+
+
+def affected_by(changed_ids):
+    """Changed products plus everything sharing a subcategory or category with them."""
+    changed = Product.objects.filter(id__in=changed_ids)
+    subcategories = set(changed.exclude(subcategory=None).values_list("subcategory_id", flat=True))
+    categories = set(changed.exclude(category=None).values_list("category_id", flat=True))
+    affected = set(changed_ids)
+    affected.update(Product.objects.filter(subcategory_id__in=subcategories).values_list("id", flat=True))
+    affected.update(Product.objects.filter(category_id__in=categories).values_list("id", flat=True))
+    return affected
+
+
+def build_changed_since(since, batch_size=1000):
+    """Refreshes the lists that may have moved because of products updated after since."""
+    changed = list(Product.objects.filter(updated_at__gte=since).values_list("id", flat=True))
+    if not changed:
+        return 0
+    return build_neighbors(affected_by(changed), batch_size=batch_size)
+
+
+def refresh_product(product):
+    """
+    Incremental update after one product changed: its own list is scored
+    against its subcategory and category only. Lists of other products
+    catch up on the next build_changed_since run.
+    """
+    related = Product.objects.filter(id=product.pk)
+    if product.subcategory_id:
+        related |= Product.objects.filter(subcategory_id=product.subcategory_id)
+    if product.category_id:
+        related |= Product.objects.filter(category_id=product.category_id)
+    candidates = load_candidates(related)
+    indexes = [
+        (PriceIndex(candidates, "subcategory_id"), "subcategory_id"),
+        (PriceIndex(candidates, "category_id"), "category_id"),
+    ]
+    target = next((c for c in candidates if c.id == product.pk), None)
+    if target is None:
+        return
+    ids = neighbors_for(target, indexes, settings.SIMILAR_PRODUCTS_COUNT, settings.SIMILAR_PRODUCTS_WINDOW)
+    ProductNeighbors.objects.update_or_create(
+        product_id=product.pk, defaults={"neighbor_ids": ProductNeighbors.pack(ids)}
+    )
@@ -0,0 +1,149 @@
+"""
+Category hierarchy index.
+
+Every Category stores the materialized path of its ancestors' ids including
+its own, e.g. "/1/4/7/" for category 7 under 4 under 1. A whole subtree is
+then one range scan on the indexed path column: every path that starts with
+"/1/4/" sorts between "/1/4/" and "/1/40" because "0" directly follows "/".
+
+Paths are kept in sync by the Category signals in products.signals (moving
+a category rewrites its subtree with one UPDATE) and can be recomputed with
+the rebuild_category_paths command.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Substr
+
+from .models import Category
+
+ROOT_PATH = "/"
+
+
+def child_path(parent_path, pk):
+    return f"{parent_path or ROOT_PATH}{pk}/"
+
+
+def path_depth(path):
+    return path.count("/") - 2
+
+
+def subtree_bounds(path):
+    """[low, high) covering path and every path below it."""
+    return path, path[:-1] + "0"
+
+
+def subtree_q(path, field="path"):
+    """Q matching path and its descendants; field may span a relation, e.g. category__path."""
+    low, high = subtree_bounds(path)
+    return Q(**{f"{field}__gte": low, f"{field}__lt": high})
+
+
+def subtree(category):
+    """Queryset of category and all its descendants."""
+    return Category.objects.filter(subtree_q(category.path))
+
+
+def check_parent(category):
+    """Rejects parents that would create a cycle."""
+    if category.pk is None or category.parent_id is None:
+        return
+    if category.parent_id == category.pk:
+        raise ValidationError({"parent": "A category cannot be its own parent."})
+    parent_path = Category.objects.filter(pk=category.parent_id).values_list("path", flat=True).first() or ""
+    if f"/{category.pk}/" in parent_path:
+        raise ValidationError({"parent": "A category cannot be moved under one of its descendants."})
+
+
+def move_subtree(old_path, new_path):
+    """Rewrites the prefix old_path to new_path for a category and all its descendants."""
+    if old_path == new_path:
+        return
+    depth_delta = path_depth(new_path) - path_depth(old_path)
+    Category.objects.filter(subtree_q(old_path)).update(
+        path=Concat(Value(new_path), Substr("path", len(old_path) + 1)),
+        depth=F("depth") + depth_delta,
+    )
+
+
+def category_saved(category):
+    """Brings the path of a saved category, and of its subtree if it moved, up to date."""
+    parent_path = ""
+    if category.parent_id:
+        parent_path = Category.objects.filter(pk=category.parent_id).values_list("path", flat=True).first()
+    new_path = child_path(parent_path, category.pk)
+    old_path = Category.objects.filter(pk=category.pk).values_list("path", flat=True).first()
+    if old_path == new_path:
+        return
+    with transaction.atomic():
+        if old_path:
+            move_subtree(old_path, new_path)
+        else:
+            Category.objects.filter(pk=category.pk).update(path=new_path, depth=path_depth(new_path))
+    category.path = new_path
+    category.depth = path_depth(new_path)
+
+
+def category_deleted(category):
+    """The children were detached (SET_NULL): their subtrees become top-level."""
+    if not category.path:
+        return
+    for child_id, path in Category.objects.filter(parent__isnull=True).filter(
+        subtree_q(category.path)
+    ).exclude(pk=category.pk).values_list("id", "path"):
+        move_subtree(path, child_path(ROOT_PATH, child_id))
+
+
+def rebuild_paths():
+    """Recomputes every path from the parent links. Returns the number of categories."""
+    parents = dict(Category.objects.values_list("id", "parent_id"))
+    paths = {}
+
+    def resolve(pk, seen=()):
+        if pk in paths:
+            return paths[pk]
+        parent_id = parents.get(pk)
+        if parent_id is None or parent_id not in parents or parent_id in seen:
+            paths[pk] = child_path(ROOT_PATH, pk)
+        else:
+            paths[pk] = child_path(resolve(parent_id, seen + (pk,)), pk)
+        return paths[pk]
+
+    for pk in parents:
+        resolve(pk)
+    categories = [Category(pk=pk, path=path, depth=path_depth(path)) for pk, path in paths.items()]
+    with transaction.atomic():
+        Category.objects.bulk_update(categories, ["path", "depth"], batch_size=500)
+    return len(categories)
+
+
+# ---------------- SNAPSHOT HELPERS ----------------
+def expand_subtrees(catalog, category_ids):
+    """Ids of the given categories and all their descendants, from a catalog snapshot."""
+    prefixes = [catalog.category_by_id[i].path for i in category_ids if i in catalog.category_by_id]
+    if not prefixes:
+        return set(category_ids)
+    return set(category_ids) | {
+        c.id for c in catalog.categories if any(c.path.startswith(prefix) for prefix in prefixes)
+    }
+
+
+def build_tree(catalog):
+    """
+    Nested taxonomy: [{id, name, children: [...], subcategories: [{id, name}]}],
+    ordered by name at every level.
+    """
+    nodes = {
+        c.id: {"id": c.id, "name": c.name, "children": [], "subcategories": []}
+        for c in catalog.categories
+    }
+    for subcategory in sorted(catalog.subcategories, key=lambda s: s.name):
+        if subcategory.category_id in nodes:
+            nodes[subcategory.category_id]["subcategories"].append(
+                {"id": subcategory.id, "name": subcategory.name}
+            )
+    roots = []
+    for category in sorted(catalog.categories, key=lambda c: c.name):
+        parent = nodes.get(category.parent_id)
+        (parent["children"] if parent else roots).append(nodes[category.id])
+    return roots
@@ -0,0 +1,17 @@
+from django import template
+
+from products import images
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail(product, width):
+    """{{ product|thumbnail:400 }} -> URL of the 400px WebP derivative."""
+    return images.thumbnail_url(product, int(width))
+
+
+@register.filter
+def srcset(product):
+    """{{ product|srcset }} -> "url 200w, url 400w, ..." for an <img srcset>."""
+    return images.srcset(product)
@@ -1,3 +1,276 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .importer import import_catalog
+from .models import Brand, Category, Product, ProductNeighbors, ProductRatingStats, Review, SubCategory
+from .taxonomy import subtree
+
+
+class CategoryPathTests(TestCase):
+    def setUp(self):
+        self.electronics = Category.objects.create(name="Electronics")
+        self.audio = Category.objects.create(name="Audio", parent=self.electronics)
+        self.headphones = Category.objects.create(name="Headphones", parent=self.audio)
+        self.gaming = Category.objects.create(name="Gaming")
+
+    def paths(self):
+        return dict(Category.objects.values_list("name", "path"))
+
+    def test_paths_follow_parents(self):
+        e, a, h = self.electronics.pk, self.audio.pk, self.headphones.pk
+        self.assertEqual(self.paths()["Headphones"], f"/{e}/{a}/{h}/")
+        self.assertEqual(Category.objects.get(pk=h).depth, 2)
+        self.assertEqual(
+            set(subtree(self.electronics).values_list("name", flat=True)),
+            {"Electronics", "Audio", "Headphones"},
+        )
+
+    def test_reparenting_moves_the_subtree(self):
+        self.audio.parent = self.gaming
+        self.audio.save()
+
+        g, a, h = self.gaming.pk, self.audio.pk, self.headphones.pk
+        self.assertEqual(self.paths()["Audio"], f"/{g}/{a}/")
+        self.assertEqual(self.paths()["Headphones"], f"/{g}/{a}/{h}/")
+        self.assertEqual(Category.objects.get(pk=h).depth, 2)
+        self.assertEqual(set(subtree(self.electronics).values_list("name", flat=True)), {"Electronics"})
+        self.assertEqual(
+            set(subtree(self.gaming).values_list("name", flat=True)),
+            {"Gaming", "Audio", "Headphones"},
+        )
+
+    def test_moving_to_the_top_level(self):
+        self.audio.parent = None
+        self.audio.save()
+        self.assertEqual(self.paths()["Headphones"], f"/{self.audio.pk}/{self.headphones.pk}/")
+        self.assertEqual(Category.objects.get(pk=self.headphones.pk).depth, 1)
+
+    def test_cycles_are_rejected(self):
+        self.electronics.parent = self.headphones
+        with self.assertRaises(ValidationError):
+            self.electronics.save()
+        self.assertEqual(self.paths()["Electronics"], f"/{self.electronics.pk}/")
+
+    def test_deleting_a_parent_promotes_its_children(self):
+        self.audio.delete()
+        self.assertEqual(self.paths()["Headphones"], f"/{self.headphones.pk}/")
+
+    def test_rebuild_command_restores_paths(self):
+        expected = self.paths()
+        Category.objects.update(path="", depth=0)
+        call_command("rebuild_category_paths", stdout=StringIO())
+        self.assertEqual(self.paths(), expected)
+
+    def test_home_filters_by_subtree(self):
+        sub = SubCategory.objects.create(name="Over-ear", category=self.headphones)
+        inside = Product.objects.create(
+            name="Studio", description="", category=self.headphones, subcategory=sub, price=10, stock=1
+        )
+        Product.objects.create(name="Pad", description="", category=self.gaming, price=10, stock=1)
+
+        response = self.client.get("/", {"category": "Electronics"})
+        self.assertEqual([p.pk for p in response.context["products"]], [inside.pk])
+
+        self.audio.parent = self.gaming
+        self.audio.save()
+        response = self.client.get("/", {"category": "Electronics"})
+        self.assertEqual(list(response.context["products"]), [])
+        response = self.client.get("/", {"category": "Gaming"})
+        self.assertEqual(len(response.context["products"]), 2)
+
+    def test_taxonomy_tree(self):
+        SubCategory.objects.create(name="Over-ear", category=self.headphones)
+        tree = self.client.get("/api/categories/tree/").json()
+        self.assertEqual([node["name"] for node in tree], ["Electronics", "Gaming"])
+        headphones = tree[0]["children"][0]["children"][0]
+        self.assertEqual(headphones["name"], "Headphones")
+        self.assertEqual(headphones["subcategories"][0]["name"], "Over-ear")
+
+    def test_category_list_counts(self):
+        acme = Brand.objects.create(name="Acme")
+        sub = SubCategory.objects.create(name="Over-ear", category=self.headphones)
+        Product.objects.create(
+            name="Studio", description="", brand=acme, category=self.headphones, subcategory=sub, price=10, stock=1
+        )
+        Product.objects.create(name="Pad", description="", category=self.audio, price=10, stock=1)
+
+        tree = self.client.get("/api/categories/").json()
+        electronics = tree[0]
+        self.assertEqual(electronics["product_count"], 2)
+        self.assertEqual(electronics["brands"], [{"id": acme.pk, "name": "Acme", "product_count": 1}])
+        over_ear = electronics["children"][0]["children"][0]["subcategories"][0]
+        self.assertEqual((over_ear["name"], over_ear["product_count"]), ("Over-ear", 1))
+        self.assertEqual(tree[1]["product_count"], 0)
+
+        # A catalog write retires the cached tree.
+        Product.objects.create(name="Cans", description="", brand=acme, category=self.gaming, price=10, stock=1)
+        self.assertEqual(self.client.get("/api/categories/").json()[1]["product_count"], 1)
+
+
+class ProductApiQueryTests(TestCase):
+    def setUp(self):
+        brand = Brand.objects.create(name="Acme")
+        category = Category.objects.create(name="Audio")
+        subcategory = SubCategory.objects.create(name="Speakers", category=category)
+        self.make = lambda n: [
+            Product.objects.create(
+                name=f"Speaker {i}", description="", brand=brand, category=category,
+                subcategory=subcategory, price=10 + i, stock=5,
+            )
+            for i in range(n)
+        ]
+
+    def queries_for(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_product_list_query_count_is_constant(self):
+        self.make(2)
+        small, _ = self.queries_for("/api/products/")
+        self.make(20)
+        large, data = self.queries_for("/api/products/")
+        self.assertEqual(len(data["results"]), 15)
+        self.assertEqual(large, small)
+        self.assertLessEqual(large, 2)
+
+
+class RatingStatsTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Audio")
+        self.first, self.second = (
+            Product.objects.create(name=name, description="", category=category, price=10, stock=1)
+            for name in ("Studio", "Pad")
+        )
+        self.users = [get_user_model().objects.create_user(f"user{i}", password="secret-pass-1") for i in range(3)]
+
+    def stats(self, product):
+        stats = ProductRatingStats.objects.get(product=product)
+        return stats.count, stats.mean, stats.histogram
+
+    def test_stats_follow_review_writes(self):
+        review = Review.objects.create(product=self.first, user=self.users[0], rating=8)
+        Review.objects.create(product=self.first, user=self.users[1], rating=4)
+        count, mean, histogram = self.stats(self.first)
+        self.assertEqual((count, mean, histogram[7], histogram[3]), (2, 6.0, 1, 1))
+
+        review.rating = 10
+        review.save()
+        self.assertEqual(self.stats(self.first)[:2], (2, 7.0))
+
+        # Moving a review refreshes the product it left as well.
+        review.product = self.second
+        review.save()
+        self.assertEqual(self.stats(self.first)[:2], (1, 4.0))
+        self.assertEqual(self.stats(self.second)[:2], (1, 10.0))
+
+        review.delete()
+        self.assertEqual(self.stats(self.second), (0, 0, [0] * 10))
+
+    def test_rebuild_command_restores_stats(self):
+        Review.objects.create(product=self.first, user=self.users[0], rating=6)
+        Review.objects.create(product=self.second, user=self.users[1], rating=2)
+        expected = [self.stats(self.first), self.stats(self.second)]
+        ProductRatingStats.objects.update(count=0, total=0, mean=0, histogram=[0] * 10)
+        call_command("rebuild_rating_stats", stdout=StringIO())
+        self.assertEqual([self.stats(self.first), self.stats(self.second)], expected)
+
+
+class ImportCatalogTests(TestCase):
+    def feed(self, name, text):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        path = os.path.join(directory, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_csv_import_creates_then_upserts(self):
+        path = self.feed("feed.csv", (
+            "sku,name,brand,category,subcategory,price,stock\n"
+            "A1,Studio,Sonar,Audio,Headphones,99.90,5\n"
+            "A2,Pad,Sonar,Audio,,12,3\n"
+        ))
+        call_command("import_catalog", path, "--skip-similar", stdout=StringIO())
+        studio = Product.objects.get(sku="A1")
+        self.assertEqual((studio.brand.name, studio.category.name, studio.subcategory.name), ("Sonar", "Audio", "Headphones"))
+        self.assertTrue(ProductRatingStats.objects.filter(product=studio).exists())
+
+        # A sku/price feed updates prices only; unknown skus cannot be created without a name.
+        result = import_catalog(self.feed("prices.csv", "sku,price\nA1,89.50\nA3,5\n"), refresh_similar=False)
+        self.assertEqual((result.rows, result.created, result.updated, result.error_count), (1, 0, 1, 1))
+        studio.refresh_from_db()
+        self.assertEqual((str(studio.price), studio.stock, studio.name), ("89.50", 5, "Studio"))
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(Category.objects.filter(name="Audio").count(), 1)
+
+    def test_jsonl_rows_are_checked_one_by_one(self):
+        rows = [
+            "[1, 2]",
+            "{not json",
+            json.dumps({"sku": "B0", "name": "Broken", "price": "NaN"}),
+            json.dumps({"sku": "B1", "name": "Speaker", "price": "12.5", "stock": 2}),
+            json.dumps({"sku": "B2", "name": "Amp", "price": "100000000"}),
+            json.dumps({"sku": "B3", "name": "Cable", "price": "Infinity"}),
+            json.dumps({"sku": "B4", "price": "3"}),
+            json.dumps({"sku": "B1", "name": "Speaker II", "stock": -1}),
+        ]
+        result = import_catalog(self.feed("feed.jsonl", "\n".join(rows) + "\n"), refresh_similar=False)
+        self.assertEqual((result.rows, result.created), (1, 1))
+        self.assertEqual([line for line, _ in result.errors], [1, 2, 3, 5, 6, 7, 8])
+        speaker = Product.objects.get(sku="B1")
+        self.assertEqual((speaker.name, str(speaker.price), speaker.stock), ("Speaker", "12.50", 2))
+
+        result = import_catalog(self.feed("again.jsonl", json.dumps({"sku": "B1", "name": "Speaker II"})), refresh_similar=False)
+        self.assertEqual((result.created, result.updated), (0, 1))
+        speaker.refresh_from_db()
+        self.assertEqual((speaker.name, str(speaker.price)), ("Speaker II", "12.50"))
+
+    def test_jsonl_rows_must_carry_the_first_rows_columns(self):
+        Product.objects.create(sku="B", name="B", description="", price=5, stock=1)
+        rows = [
+            {"sku": "A", "name": "A", "price": "7", "stock": 3},
+            {"sku": "B", "name": "B2"},
+            {"sku": "C", "name": "C", "price": "1", "stock": 1, "brand": "Sonar"},
+        ]
+        result = import_catalog(self.feed("feed.jsonl", "\n".join(map(json.dumps, rows))), refresh_similar=False)
+        self.assertEqual((result.rows, result.created, result.updated), (1, 1, 0))
+        self.assertEqual(result.errors, [
+            (2, "columns differ from the first row: missing price, stock"),
+            (3, "columns differ from the first row: unexpected brand"),
+        ])
+        self.assertEqual(Product.objects.filter(sku="B").values_list("name", "price", "stock").get(), ("B", 5, 1))
+
+
+class SimilarProductsTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Audio")
+        self.products = [
+            Product.objects.create(name=f"Speaker {i}", description="", category=category, price=10 + i, stock=1)
+            for i in range(3)
+        ]
+
+    def test_list_is_refreshed_after_commit_when_a_scored_field_changes(self):
+        product = self.products[0]
+        product.stock = 5
+        with self.captureOnCommitCallbacks() as callbacks:
+            product.save(update_fields=["stock"])
+        self.assertEqual(callbacks, [])
 
-# Create your tests here.
+        product.price = 12
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            product.save(update_fields=["price"])
+            self.assertFalse(ProductNeighbors.objects.filter(product=product).exists())
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(ProductNeighbors.objects.get(product=product).ids, [self.products[2].pk, self.products[1].pk])
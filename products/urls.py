@@ -1,7 +1,10 @@
 # products/urls.py
 from django.urls import path
-from .views import home, products_page, ProductList, ProductDetail, cart_view, category_list
-from shop.views import cart_api, add_to_cart_api, update_cart_api, remove_from_cart_api, add_to_cart
+from .views import (
+    home, products_page, ProductList, ProductDetail, cart_view, category_list,
+    product_facets, taxonomy_tree, catalog_stats, product_export, product_image,
+)
+from shop.views import cart_api, add_to_cart_api, update_cart_api, remove_from_cart_api, batch_cart_api, add_to_cart
 
 urlpatterns = [
     # ---------------- TEMPLATE VIEWS ----------------                   # /
@@ -15,14 +18,20 @@ urlpatterns = [
     # ---------------- API: Products ----------------
     path('api/products/', ProductList.as_view(), name='product-list'),
     path('api/products/<int:pk>/', ProductDetail.as_view(), name='product-detail'),
+    path('api/products/facets/', product_facets, name='product-facets'),
+    path('api/products/export/', product_export, name='product-export'),
+    path('images/products/<int:pk>/<int:width>/', product_image, name='product-image'),
 
     # ---------------- API: Categories ----------------
     path("api/categories/", category_list, name="category-list"),
+    path("api/categories/tree/", taxonomy_tree, name="taxonomy-tree"),
+    path("api/catalog/stats/", catalog_stats, name="catalog-stats"),
 
     # ---------------- API: Cart ----------------
     path('api/cart/', cart_api, name='cart-api'),                        # GET: get cart items
     path('api/cart/add/', add_to_cart_api, name='add-to-cart-api'),      # POST: add item
     path('api/cart/update/', update_cart_api, name='update-cart-api'),   # POST: update quantity
     path('api/cart/remove/<int:item_id>/', remove_from_cart_api, name='remove-from-cart-api'),
+    path('api/cart/batch/', batch_cart_api, name='batch-cart-api'),        # POST: several changes at once
 
 ]
@@ -1,136 +1,218 @@
 from rest_framework import generics, viewsets, permissions
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.shortcuts import render, get_object_or_404
 from django.conf import settings
-from django.db.models import Avg, Q
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse, QueryDict, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_GET
+from django.utils.decorators import method_decorator
+from django.db.models import F, Q
 from .models import Product, Category
 from .serializers import ProductSerializer
+from .search import filter_by_query
+from .catalog import catalog_cache, get_catalog
+from .cards import render_cards
+from .images import DerivativeError, derivative_name, ensure_derivatives, image_widths
+from .pagecache import cache_anonymous_page
+from .conditional import catalog_stamp, conditional_get, product_stamp
+from .export import EXPORT_FORMATS, blocks, export_lines, gzip_blocks, parse_since
+from .facets import (
+    build_facets, category_tree, cells_for_queryset, facet_counts, filter_products, parse_selection,
+)
+from .pagination import SORT_KEYS, ProductKeysetPagination, paginate_keyset
 from django.core.paginator import Paginator
 from django.shortcuts import render, redirect
 
 # ---------------- HOME VIEW ----------------
 from django.shortcuts import render, redirect
-from django.db.models import Avg, Q
+from django.db.models import F, Q
 from django.core.paginator import Paginator
 from .models import Product, Category
 
 # ---------------- HOME VIEW ----------------
-def stars10to5_py(avg_rating):
+def page_query(params, cursor):
+    """Normalized query string with the cursor swapped, for the pagination links."""
+    if cursor is None:
+        return None
+    params = params.copy()
+    params["cursor"] = cursor
+    return params.urlencode()
+
+
+def home_params(query_dict):
     """
-    Converts a 10-point rating to a list of 5 stars: 'full', 'half', 'empty'.
+    Canonical form of the home query string: unknown parameters dropped,
+    values cleaned, de-duplicated and sorted. home() only reads this, so it
+    is also the page cache key. None when the filters are being cleared.
     """
-    try:
-        avg_rating = float(avg_rating)
-    except (ValueError, TypeError):
-        return ["empty"] * 5
-
-    stars = []
-    five_scale = avg_rating / 2
-    for i in range(1, 6):
-        if five_scale >= i:
-            stars.append("full")
-        elif five_scale >= i - 0.5:
-            stars.append("half")
-        else:
-            stars.append("empty")
-    return stars
+    if query_dict.get("clear"):
+        return None
+    params = QueryDict(mutable=True)
+    query = " ".join(query_dict.get("q", "").split())
+    if query:
+        params["q"] = query
+    sort = query_dict.get("sort")
+    if sort in SORT_KEYS and sort != "relevance":
+        params["sort"] = sort
+    categories = {n.strip() for n in query_dict.getlist("category")}
+    params.setlist("category", sorted(n for n in categories if n and n.lower() != "none"))
+    for name in ("subcategory", "brand", "price"):
+        values = {int(v) for v in query_dict.getlist(name) if v.strip().isdigit()}
+        params.setlist(name, [str(v) for v in sorted(values)])
+    params.setlist("stock", sorted({v for v in query_dict.getlist("stock") if v in ("in", "out")}))
+    cursor = query_dict.get("cursor")
+    if cursor:
+        params["cursor"] = cursor
+    params._mutable = False
+    return params
 
-def home(request):
-    sort = request.GET.get("sort")
-    category = request.GET.get("category")
-    query = request.GET.get("q")
 
-    if request.GET.get("clear"):
+@cache_anonymous_page(normalize=home_params)
+def home(request):
+    params = home_params(request.GET)
+    if params is None:
         return redirect("home")
+    sort = params.get("sort")
+    query = params.get("q")
 
     # --- Base queryset ---
-    products_qs = Product.objects.all()
+    products_qs = (
+        Product.objects.select_related("brand", "category").defer("description")
+        .annotate(avg_rating=F("rating_stats__mean"))
+    )
 
     # --- SEARCH ---
     if query:
-        products_qs = products_qs.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(brand__name__icontains=query) |
-            Q(category__name__icontains=query) |
-            Q(subcategory__name__icontains=query)
-        ).distinct()
-
-    # --- CATEGORY FILTER ---
-    if category and category.lower() != "none":
-        products_qs = products_qs.filter(category__name=category)
-
-    # --- SORTING ---
-    if sort == "price-asc":
-        products_qs = products_qs.order_by("price")
-    elif sort == "price-desc":
-        products_qs = products_qs.order_by("-price")
-    elif sort == "rating":
-        products_qs = products_qs.annotate(latest_avg=Avg("order_reviews__rating")).order_by("-latest_avg")
-    elif sort == "AZ":
-        products_qs = products_qs.order_by("name")
-    elif sort == "ZA":
-        products_qs = products_qs.order_by("-name")
-
-    # --- PAGINATION ---
-    paginator = Paginator(products_qs, 10)
-    page = request.GET.get("page")
-    products_page = paginator.get_page(page)
-
-    # --- Precompute latest stars using order_reviews ---
-    product_ids = [p.id for p in products_page]
-    latest_ratings = (
-        Product.objects.filter(id__in=product_ids)
-        .annotate(avg_rating=Avg("order_reviews__rating"))
-        .values("id", "avg_rating")
-    )
-    rating_map = {item["id"]: item["avg_rating"] or 0 for item in latest_ratings}
+        products_qs = filter_by_query(products_qs, query)
+
+    # --- FACET FILTERS (category, subcategory, brand, price, stock) ---
+    selection = parse_selection(params)
+    cells = cells_for_queryset(products_qs) if query else None
+    facets = build_facets(selection, facet_counts(selection, cells))
+    products_qs = filter_products(products_qs, selection)
 
-    for product in products_page:
-        avg = rating_map.get(product.id, 0)
-        product.stars = stars10to5_py(avg)
+    # --- SORTING + PAGINATION (keyset, no COUNT/OFFSET) ---
+    if sort:
+        sort_key = sort
+    elif query and "search_rank" in products_qs.query.annotations:
+        sort_key = "relevance"
+    else:
+        sort_key = "default"
+    products_page = paginate_keyset(products_qs, sort_key, params.get("cursor"), per_page=10)
 
-    categories = Category.objects.values_list("name", flat=True).distinct()
+    # --- Cards from the fragment cache, rendered only on a miss ---
+    cards = render_cards(list(products_page), request.user.is_authenticated)
+
+    categories = get_catalog().category_names()
 
     return render(request, "products/home.html", {
         "products": products_page,
+        "cards": cards,
         "categories": categories,
+        "facets": facets,
         "page_obj": products_page,
+        "next_query": page_query(params, products_page.next_cursor),
+        "previous_query": page_query(params, products_page.previous_cursor),
         "selected_sort": sort,
-        "selected_category": category,
+        "selected_category": params.get("category"),
         "search_query": query,
     })
 
 # ---------------- API: Categories ----------------
 @api_view(["GET"])
+@conditional_get(catalog_stamp)
 def category_list(request):
     """
-    Returns distinct categories and subcategories from products.
+    The category -> subcategory tree with product counts and brands,
+    cached per catalog version (see products.facets.category_tree).
     """
-    categories = Product.objects.values_list("category", flat=True).distinct()
-    subcategories = Product.objects.values_list("subCategory", flat=True).distinct()
+    return Response(category_tree())
 
-    categories = [c for c in categories if c]
-    subcategories = [s for s in subcategories if s]
 
-    return Response({
-        "categories": categories,
-        "subcategories": subcategories,
-    })
+# ---------------- API: Taxonomy ----------------
+@api_view(["GET"])
+@conditional_get(catalog_stamp)
+def taxonomy_tree(request):
+    """
+    The category tree with subcategories, prebuilt once per catalog snapshot.
+    """
+    return Response(get_catalog().taxonomy)
+
+
+# ---------------- API: Facets ----------------
+@api_view(["GET"])
+@conditional_get(catalog_stamp)
+def product_facets(request):
+    """
+    Facet counts for the same filters /api/products/ accepts
+    (category, subcategory, brand, price, stock, q).
+    """
+    selection = parse_selection(request.query_params)
+    query = request.query_params.get("q")
+    cells = cells_for_queryset(filter_by_query(Product.objects.all(), query)) if query else None
+    return Response(build_facets(selection, facet_counts(selection, cells)))
+
+
+# ---------------- API: Export ----------------
+@require_GET
+def product_export(request):
+    """
+    Streams the catalog as NDJSON (default) or ?format=csv, optionally only
+    ?updated_since=<ISO date/time>. Gzipped on the fly when the client
+    accepts it.
+    """
+    format = request.GET.get("format", "ndjson")
+    if format not in EXPORT_FORMATS:
+        return JsonResponse({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}, status=400)
+    updated_since = None
+    if request.GET.get("updated_since"):
+        try:
+            updated_since = parse_since(request.GET["updated_since"])
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+    stream = blocks(export_lines(format, updated_since))
+    compress = "gzip" in request.headers.get("Accept-Encoding", "")
+    if compress:
+        stream = gzip_blocks(stream)
+    response = StreamingHttpResponse(stream, content_type=f"{EXPORT_FORMATS[format]}; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="catalog.{format}"'
+    if compress:
+        response["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
 
 
 # ---------------- API: Products ----------------
+@method_decorator(conditional_get(catalog_stamp), name="get")
 class ProductList(generics.ListCreateAPIView):
-    queryset = Product.objects.annotate(avg_rating=Avg("product_reviews__rating"))
+    queryset = Product.objects.select_related("rating_stats").annotate(avg_rating=F("rating_stats__mean"))
     serializer_class = ProductSerializer
+    pagination_class = ProductKeysetPagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        query = self.request.query_params.get("q")
+        if query:
+            queryset = filter_by_query(queryset, query)
+        return filter_products(queryset, parse_selection(self.request.query_params))
 
+
+@method_decorator(conditional_get(product_stamp), name="get")
 class ProductDetail(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Product.objects.annotate(avg_rating=Avg("product_reviews__rating"))
+    queryset = Product.objects.select_related("rating_stats").annotate(avg_rating=F("rating_stats__mean"))
     serializer_class = ProductSerializer
 
 
+@api_view(["GET"])
+@permission_classes([permissions.IsAdminUser])
+def catalog_stats(request):
+    """Hit/miss/rebuild counters of this worker's catalog snapshot."""
+    return Response(catalog_cache.stats())
+
+
 class IsStaffOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
         return (
@@ -140,17 +222,20 @@ class IsStaffOrReadOnly(permissions.BasePermission):
 
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.annotate(avg_rating=Avg("product_reviews__rating"))
+    queryset = Product.objects.select_related("rating_stats").annotate(avg_rating=F("rating_stats__mean"))
     serializer_class = ProductSerializer
     permission_classes = [IsStaffOrReadOnly]
+    pagination_class = ProductKeysetPagination
 
 
 # ---------------- TEMPLATE VIEWS ----------------
 def products_page(request):
-    products = Product.objects.annotate(avg_rating=Avg("product_reviews__rating"))
-    categories = Product.objects.values_list('category', flat=True).distinct()
+    catalog = get_catalog()
+    products = catalog.products
+    categories = catalog.category_names()
     return render(request, 'products/home.html', {
         'products': products,
+        'cards': render_cards(products, request.user.is_authenticated),
         'categories': categories,
     })
 
@@ -160,3 +245,26 @@ def cart_view(request):
         "STRIPE_PUBLIC_KEY": settings.STRIPE_PUBLIC_KEY
     })
 
+
+# ---------------- IMAGES ----------------
+@require_GET
+def product_image(request, pk, width):
+    """
+    Lazy derivative: renders the WebP copy of a product image that has none
+    yet, then redirects to the stored file (to the original if it cannot
+    be decoded).
+    """
+    if width not in image_widths():
+        raise Http404("Unknown image width")
+    product = get_object_or_404(Product.objects.only("image", "image_hash"), pk=pk)
+    if not product.image:
+        raise Http404("Product has no image")
+    try:
+        digest = ensure_derivatives(product.image.name, product.image_hash)
+    except DerivativeError:
+        return redirect(product.image.url)
+    if digest != product.image_hash:
+        Product.objects.filter(pk=pk).update(image_hash=digest)
+    response = redirect(default_storage.url(derivative_name(digest, width)))
+    patch_cache_control(response, public=True, max_age=3600)
+    return response
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class ShopConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'shop'
+
+    def ready(self):
+        from . import signals
+        signals.connect_stored_file_signals()
+        signals.connect_cart_signals()
@@ -0,0 +1,130 @@
+"""
+Several cart changes in one request (/api/cart/batch/).
+
+    {"operations": [
+        {"op": "add", "product_id": 12, "quantity": 2},
+        {"op": "set", "item_id": 40, "quantity": 5},
+        {"op": "remove", "item_id": 41}
+    ]}
+
+set and remove take the line's item_id or its product_id. Operations are
+applied in order with the same rules as the single-change endpoints (add
+is capped at the stock, set rejects more than the stock, removing a
+missing line is not an error). run_operations applies them in memory;
+the cart store (shop.carts) loads the lines and products involved and
+writes the outcome back in one go.
+"""
+OPERATIONS = ("add", "set", "remove")
+MAX_OPERATIONS = 500
+
+
+class BatchError(ValueError):
+    pass
+
+
+def _int(op, field, required=True, default=None):
+    value = op.get(field, default)
+    if value is None:
+        if required:
+            raise BatchError(f"{field} is required")
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BatchError(f"{field} must be an integer")
+
+
+def parse_operations(data):
+    """Validates the request body; returns [(op, item_id, product_id, quantity)]."""
+    operations = data.get("operations") if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise BatchError("operations must be a non-empty list")
+    if len(operations) > MAX_OPERATIONS:
+        raise BatchError(f"at most {MAX_OPERATIONS} operations per batch")
+    parsed = []
+    for index, op in enumerate(operations):
+        try:
+            if not isinstance(op, dict) or op.get("op") not in OPERATIONS:
+                raise BatchError(f"op must be one of {', '.join(OPERATIONS)}")
+            kind = op["op"]
+            if kind == "add":
+                item_id, product_id = None, _int(op, "product_id")
+            else:
+                item_id = _int(op, "item_id", required=False)
+                product_id = _int(op, "product_id", required=item_id is None)
+            quantity = _int(op, "quantity", required=kind == "set", default=1 if kind == "add" else None)
+            if kind == "add" and quantity < 1:
+                raise BatchError("quantity must be at least 1")
+        except BatchError as e:
+            raise BatchError(f"operation {index}: {e}")
+        parsed.append((kind, item_id, product_id, quantity))
+    return parsed
+
+
+def _cap(quantity, stock):
+    return quantity if stock is None else min(quantity, stock)
+
+
+class BatchResult:
+    def __init__(self):
+        self.results = []
+        self.changed = {}   # product_id -> CartItem created or updated
+        self.removed = []   # ids of deleted lines
+
+    @property
+    def applied(self):
+        return bool(self.changed or self.removed)
+
+
+def referenced(operations):
+    """The item ids and the product ids named by operations."""
+    item_ids = {item_id for _, item_id, _, _ in operations if item_id is not None}
+    product_ids = {product_id for _, _, product_id, _ in operations if product_id is not None}
+    return item_ids, product_ids
+
+
+def run_operations(lines, products, operations, new_line):
+    """
+    Applies operations in order to lines ({product_id: CartItem}) in memory.
+    products holds every product involved by id; new_line(product) makes
+    the line of a product that is not in the cart yet. Lines that existed
+    before the batch and were removed end up in result.removed.
+    """
+    result = BatchResult()
+    existing = {line.id for line in lines.values() if line.id is not None}
+    by_id = {line.id: line for line in lines.values()}
+    removed = set()
+
+    for index, (kind, item_id, product_id, quantity) in enumerate(operations):
+        line = by_id.get(item_id) if item_id is not None else lines.get(product_id)
+        if line is not None and line.id in removed:
+            line = None
+
+        if kind == "add":
+            product = products.get(product_id)
+            if product is None:
+                result.results.append({"index": index, "ok": False, "error": "Product not found"})
+                continue
+            if line is None:
+                line = lines[product_id] = new_line(product)
+            line.quantity = _cap(line.quantity + quantity, product.stock)
+            result.changed[product_id] = line
+        elif kind == "set":
+            if line is None:
+                result.results.append({"index": index, "ok": False, "error": "Item not found"})
+                continue
+            stock = products[line.product_id].stock
+            if stock is not None and quantity > stock:
+                result.results.append({"index": index, "ok": False, "error": "Not enough stock"})
+                continue
+            line.quantity = max(1, quantity)
+            result.changed[line.product_id] = line
+        elif line is not None:
+            result.changed.pop(line.product_id, None)
+            del lines[line.product_id]
+            if line.id in existing:
+                removed.add(line.id)
+        result.results.append({"index": index, "ok": True})
+
+    result.removed = sorted(removed)
+    return result
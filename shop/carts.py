@@ -0,0 +1,318 @@
+"""
+Cart stores: where the lines of the current session's cart live.
+
+With CART_STORE = "database" every cart is a Cart row with CartItem rows
+(shop.utils.get_user_cart). With CART_STORE = "cache" the carts of
+anonymous visitors are kept in the CART_CACHE cache instead, so filling
+a cart writes nothing to the database; signed-in users keep their carts
+in the database. A cached cart is written to its Cart row
+
+- when its owner signs in, after which the row is the user's cart,
+- at checkout, when the cart is emptied, and
+- by `python manage.py flush_carts`, run periodically, which writes
+  every cached cart changed since its previous run,
+
+and is read back from that row if the cache lost it. The cache must be
+shared by all workers and the flush command (not the per-process local
+memory cache).
+
+Both stores answer the same calls (key, version, items, lines, apply,
+totals, clear, persist), so the cart API responds the same whichever is configured.
+The lines of a cached cart are identified by their product id. A change
+to a cached cart rewrites one cache entry; of two changes of the same
+visitor racing each other the later one wins.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from products.models import Product
+from .batch import referenced, run_operations
+from .models import Cart, CartItem
+from .utils import CART_SESSION_KEY, bump_cart_version, cart_totals, get_user_cart
+
+# Session key holding the token a cached cart is stored under; unlike the
+# session key it survives the key cycling at login.
+CART_TOKEN_KEY = "cart_token"
+
+# Every cached cart that changes after a flush gets one journal entry,
+# numbered by a counter in the cache; flush_carts walks the entries added
+# since its previous run.
+JOURNAL_COUNTER = "cart-journal"
+JOURNAL_FLUSHED = "cart-journal-flushed"
+JOURNAL_CHUNK = 500
+
+SERIALIZED_RELATIONS = ("brand", "category", "subcategory", "rating_stats")
+STOCK_FIELDS = ("id", "name", "price", "stock")
+
+
+def cart_cache():
+    return caches[settings.CART_CACHE]
+
+
+def cart_key(token):
+    return f"cart:{token}"
+
+
+def dirty_key(token):
+    return f"cart-dirty:{token}"
+
+
+def journal_key(number):
+    return f"cart-journal:{number}"
+
+
+class DatabaseCart:
+    """A Cart row and its CartItem rows."""
+
+    def __init__(self, cart):
+        self.cart = cart
+        # Identifies the cart across requests (memoized quotes, see orders.pricing).
+        self.key = f"db-{cart.pk}"
+
+    @property
+    def version(self):
+        return self.cart.version
+
+    def items(self, ids=None):
+        """The lines (or those with the given ids) with everything CartItemSerializer reads joined."""
+        lines = self.cart.items.select_related(
+            *(f"product__{relation}" for relation in SERIALIZED_RELATIONS)
+        ).order_by("id")
+        return lines if ids is None else lines.filter(pk__in=ids)
+
+    def apply(self, operations):
+        """Applies parsed operations (see shop.batch) in one transaction; returns the BatchResult."""
+        item_ids, product_ids = referenced(operations)
+        with transaction.atomic():
+            lines = {
+                line.product_id: line
+                for line in self.cart.items.filter(Q(pk__in=item_ids) | Q(product_id__in=product_ids))
+            }
+            products = Product.objects.only(*STOCK_FIELDS).in_bulk(product_ids | set(lines))
+            result = run_operations(lines, products, operations, lambda product: CartItem(
+                cart=self.cart, product=product, quantity=0, name=product.name, price=product.price,
+            ))
+            changed = result.changed.values()
+            CartItem.objects.bulk_create([line for line in changed if line.pk is None])
+            CartItem.objects.bulk_update([line for line in changed if line.pk is not None], ["quantity"])
+            if result.removed:
+                CartItem.objects.filter(cart=self.cart, pk__in=result.removed).delete()
+            if result.applied:
+                bump_cart_version(self.cart)
+        return result
+
+    def lines(self):
+        """(product_id, quantity) of every line."""
+        return list(self.cart.items.values_list("product_id", "quantity"))
+
+    def totals(self):
+        return cart_totals(self.cart)
+
+    def clear(self):
+        with transaction.atomic():
+            self.cart.items.all().delete()
+            bump_cart_version(self.cart)
+
+    def persist(self):
+        return self.cart
+
+
+class CachedCart:
+    """
+    An anonymous visitor's cart in the CART_CACHE cache:
+    {"version": 3, "session_key": "...", "lines": {product_id: [quantity, price]}}.
+    """
+
+    def __init__(self, request):
+        self.session = request.session
+        self.cache = cart_cache()
+        self.token = self.session.get(CART_TOKEN_KEY)
+        self.data = self.cache.get(cart_key(self.token)) if self.token else None
+        if self.data is None:
+            self.data = self.restore()
+
+    def restore(self):
+        """The cart's last database copy, if it ever had one (the cache lost it, or CART_STORE changed)."""
+        data = {"version": 0, "session_key": self.session.session_key, "lines": {}}
+        if not self.token and CART_SESSION_KEY not in self.session:
+            return data
+        cart_id = self.session.get(CART_SESSION_KEY)
+        carts = Cart.objects.filter(pk=cart_id) if cart_id else Cart.objects.filter(session_key=data["session_key"])
+        cart = carts.first()
+        if cart is not None:
+            data["version"] = cart.version
+            data["lines"] = {
+                product_id: [quantity, price]
+                for product_id, quantity, price in cart.items.order_by("id").values_list("product_id", "quantity", "price")
+            }
+        if cart is not None or self.token:
+            self.save(data)
+        return data
+
+    def save(self, data):
+        session = self.session
+        if not session.session_key:
+            session.save()
+        if not self.token:
+            self.token = session[CART_TOKEN_KEY] = uuid.uuid4().hex
+        data["session_key"] = session.session_key
+        self.cache.set(cart_key(self.token), data, settings.SESSION_COOKIE_AGE)
+
+    def changed(self):
+        self.data["version"] += 1
+        self.save(self.data)
+        # Journal the cart once per flush; later changes find the dirty mark.
+        if self.cache.add(dirty_key(self.token), True, settings.SESSION_COOKIE_AGE):
+            try:
+                number = self.cache.incr(JOURNAL_COUNTER)
+            except ValueError:
+                self.cache.add(JOURNAL_COUNTER, 0, None)
+                number = self.cache.incr(JOURNAL_COUNTER)
+            self.cache.set(journal_key(number), self.token, settings.SESSION_COOKIE_AGE)
+
+    @property
+    def key(self):
+        return self.token
+
+    @property
+    def version(self):
+        return self.data["version"]
+
+    def items(self, ids=None):
+        lines = self.data["lines"]
+        if ids is not None:
+            ids = set(ids)
+            lines = {product_id: line for product_id, line in lines.items() if product_id in ids}
+        products = Product.objects.select_related(*SERIALIZED_RELATIONS).in_bulk(list(lines))
+        return [
+            CartItem(
+                id=product_id, product=products[product_id], quantity=quantity,
+                name=products[product_id].name, price=price,
+            )
+            for product_id, (quantity, price) in lines.items()
+            if product_id in products
+        ]
+
+    def apply(self, operations):
+        item_ids, product_ids = referenced(operations)
+        named = {product_id for product_id in self.data["lines"] if product_id in item_ids | product_ids}
+        products = Product.objects.only(*STOCK_FIELDS).in_bulk(product_ids | named)
+        lines = {
+            product_id: CartItem(id=product_id, product_id=product_id, quantity=quantity, price=price)
+            for product_id, (quantity, price) in self.data["lines"].items()
+            if product_id in named and product_id in products
+        }
+        result = run_operations(lines, products, operations, lambda product: CartItem(
+            id=product.pk, product=product, quantity=0, name=product.name, price=product.price,
+        ))
+        for product_id in result.removed:
+            del self.data["lines"][product_id]
+        for product_id, line in result.changed.items():
+            self.data["lines"][product_id] = [line.quantity, line.price]
+        if result.applied:
+            self.changed()
+        return result
+
+    def lines(self):
+        return [(product_id, quantity) for product_id, (quantity, _) in self.data["lines"].items()]
+
+    def totals(self):
+        lines = self.data["lines"]
+        prices = dict(Product.objects.filter(pk__in=list(lines)).values_list("id", "price"))
+        present = [(quantity, prices[product_id]) for product_id, (quantity, _) in lines.items() if product_id in prices]
+        return {
+            "lines": len(present),
+            "quantity": sum(quantity for quantity, _ in present),
+            "total_price": float(sum(quantity * price for quantity, price in present)),
+        }
+
+    def clear(self):
+        self.data["lines"] = {}
+        self.changed()
+        self.persist()
+
+    def persist(self):
+        """Writes the cart to its Cart row now; returns the row (None for a cart that never had lines)."""
+        if self.token:
+            self.cache.delete(dirty_key(self.token))
+        return write_cart(self.data, self.session.session_key)
+
+    def hand_over(self):
+        """Moves the cart to the database for good (sign-in); the session then points at the row."""
+        cart = self.persist()
+        if self.token:
+            self.cache.delete(cart_key(self.token))
+        self.session.pop(CART_TOKEN_KEY, None)
+        if cart is not None:
+            self.session[CART_SESSION_KEY] = cart.pk
+        return cart
+
+
+def write_cart(data, session_key=None):
+    """
+    Replaces the lines of the Cart row of a cached cart with data's lines.
+    The row is found by the current session key or the one the cart was
+    last saved under, and is created only when there are lines to write.
+    """
+    keys = [key for key in dict.fromkeys((session_key, data.get("session_key"))) if key]
+    if not keys:
+        return None
+    with transaction.atomic():
+        carts = {cart.session_key: cart for cart in Cart.objects.filter(session_key__in=keys)}
+        cart = next((carts[key] for key in keys if key in carts), None)
+        if cart is None:
+            if not data["lines"]:
+                return None
+            try:
+                with transaction.atomic():
+                    cart = Cart.objects.create(session_key=keys[0])
+            except IntegrityError:
+                cart = Cart.objects.get(session_key=keys[0])
+        cart.session_key, cart.version = keys[0], data["version"]
+        cart.save(update_fields=["session_key", "version"])
+
+        names = dict(Product.objects.filter(pk__in=list(data["lines"])).values_list("id", "name"))
+        cart.items.all().delete()
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_id, quantity=quantity, name=names[product_id], price=price)
+            for product_id, (quantity, price) in data["lines"].items()
+            if product_id in names
+        ])
+    return cart
+
+
+def flush_carts():
+    """Writes every cached cart changed since the previous flush to the database; returns how many."""
+    cache = cart_cache()
+    last, current = cache.get(JOURNAL_FLUSHED, 0), cache.get(JOURNAL_COUNTER, 0)
+    if current < last:
+        # The cache was cleared and the counter started over.
+        last = 0
+    flushed = 0
+    for start in range(last + 1, current + 1, JOURNAL_CHUNK):
+        numbers = range(start, min(start + JOURNAL_CHUNK, current + 1))
+        tokens = dict.fromkeys(cache.get_many([journal_key(number) for number in numbers]).values())
+        for token in tokens:
+            cache.delete(dirty_key(token))
+            data = cache.get(cart_key(token))
+            if data is not None:
+                write_cart(data)
+                flushed += 1
+        cache.delete_many([journal_key(number) for number in numbers])
+    cache.set(JOURNAL_FLUSHED, current, None)
+    return flushed
+
+
+def get_cart(request):
+    """The cart of the current request, in the store CART_STORE selects."""
+    if settings.CART_STORE == "cache":
+        if not request.user.is_authenticated:
+            return CachedCart(request)
+        if CART_TOKEN_KEY in request.session:
+            # Signed in without the login signal (token authentication).
+            CachedCart(request).hand_over()
+    return DatabaseCart(get_user_cart(request))
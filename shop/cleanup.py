@@ -0,0 +1,133 @@
+"""
+Garbage collection of abandoned carts and expired sessions.
+
+    python manage.py purge_carts [--batch-size 500] [--pause 0.2] [--vacuum]
+
+Every visitor gets a session and a cart (shop.utils.get_user_cart), bots
+included, and carts are bound to their session: once the session has
+expired or is gone nobody can reach the cart again. purge_carts deletes
+those carts with their lines, then the expired sessions themselves.
+
+Rows are deleted in small primary-key-ordered batches, each in its own
+short transaction, with a pause in between, so the SQLite write lock is
+only ever held for one batch and requests keep going while it runs. Run
+it periodically (cron, a systemd timer).
+
+Deleting rows leaves free pages in the SQLite file. --vacuum returns
+them to the filesystem: with incremental auto-vacuum enabled a few
+pages at a time, otherwise with one full VACUUM, which also switches the
+database to incremental auto-vacuum so later runs can take the cheap
+path.
+"""
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+DB_SESSION_ENGINES = ("django.contrib.sessions.backends.db", "django.contrib.sessions.backends.cached_db")
+# SQLite PRAGMA auto_vacuum value of incremental mode.
+INCREMENTAL = 2
+
+
+class Purge:
+    def __init__(self, batch_size=500, pause=0.2, dry_run=False):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.dry_run = dry_run
+        self.reclaimed = {"carts": 0, "cart items": 0, "sessions": 0}
+
+    def rest(self):
+        if self.pause:
+            time.sleep(self.pause)
+
+    def live_sessions(self, keys):
+        """The keys among keys whose session still exists and has not expired."""
+        if settings.SESSION_ENGINE in DB_SESSION_ENGINES:
+            return set(
+                Session.objects.filter(session_key__in=keys, expire_date__gt=timezone.now())
+                .values_list("session_key", flat=True)
+            )
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        return {key for key in keys if store.exists(key)}
+
+    def carts(self):
+        """Deletes the anonymous carts whose session is gone, batch by batch."""
+        last = 0
+        while True:
+            batch = list(
+                Cart.objects.filter(pk__gt=last, user__isnull=True).order_by("pk")
+                .values_list("pk", "session_key")[:self.batch_size]
+            )
+            if not batch:
+                return
+            last = batch[-1][0]
+            live = self.live_sessions([key for _, key in batch if key])
+            dead = [pk for pk, key in batch if key not in live]
+            if dead:
+                if self.dry_run:
+                    self.reclaimed["cart items"] += CartItem.objects.filter(cart_id__in=dead).count()
+                    self.reclaimed["carts"] += len(dead)
+                else:
+                    with transaction.atomic():
+                        self.reclaimed["cart items"] += CartItem.objects.filter(cart_id__in=dead).delete()[0]
+                        self.reclaimed["carts"] += Cart.objects.filter(pk__in=dead).delete()[0]
+                self.rest()
+
+    def sessions(self):
+        """Deletes the expired database sessions, batch by batch."""
+        if settings.SESSION_ENGINE not in DB_SESSION_ENGINES:
+            # Other engines expire their sessions themselves (or through clearsessions).
+            if not self.dry_run:
+                import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()
+            return
+        expired = Session.objects.filter(expire_date__lte=timezone.now()).order_by("pk")
+        if self.dry_run:
+            self.reclaimed["sessions"] = expired.count()
+            return
+        while True:
+            keys = list(expired.values_list("pk", flat=True)[:self.batch_size])
+            if not keys:
+                return
+            self.reclaimed["sessions"] += Session.objects.filter(pk__in=keys).delete()[0]
+            self.rest()
+
+    def run(self):
+        self.carts()
+        self.sessions()
+        return self.reclaimed
+
+
+def pragma(name, argument=None):
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA {name}" if argument is None else f"PRAGMA {name}({argument})")
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def vacuum(step=1000, pause=0.2):
+    """
+    Returns the free pages of the SQLite database to the filesystem;
+    returns the bytes released, or None on other databases.
+    """
+    if connection.vendor != "sqlite":
+        return None
+    before = pragma("page_count")
+    if pragma("auto_vacuum") == INCREMENTAL:
+        free = pragma("freelist_count")
+        while free:
+            pragma("incremental_vacuum", step)
+            free, previous = pragma("freelist_count"), free
+            if free >= previous:
+                break
+            time.sleep(pause)
+    else:
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA auto_vacuum = {INCREMENTAL}")
+            cursor.execute("VACUUM")
+    # Switching to incremental mode adds a few pointer-map pages.
+    return max(before - pragma("page_count"), 0) * pragma("page_size")
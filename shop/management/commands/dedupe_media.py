@@ -0,0 +1,77 @@
+import posixpath
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from products.cards import bump_card_versions
+from products.catalog import bump_catalog_version
+from products.models import Product
+from shop.storage import (
+    content_fields, content_name, content_storage, file_digest, name_digest, rebuild_refcounts,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move uploaded images stored under their upload names to content-addressed names, "
+        "point the rows at them and delete the duplicates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would move without touching anything.")
+
+    def handle(self, *args, **options):
+        storage = content_storage()
+        dry_run = options["dry_run"]
+
+        # Every legacy file: the ones rows point at, and whatever else sits in the upload directories.
+        legacy = set()
+        for model, field in content_fields():
+            names = model._default_manager.exclude(**{field: ""}).exclude(**{field: None})
+            legacy.update(name for name in names.values_list(field, flat=True).distinct() if not name_digest(name))
+            upload_to = model._meta.get_field(field).upload_to
+            if isinstance(upload_to, str) and storage.exists(upload_to):
+                directory = upload_to.rstrip("/")
+                legacy.update(posixpath.join(directory, name) for name in storage.listdir(directory)[1])
+
+        moved, created, missing, reclaimed = {}, set(), [], 0
+        for old in sorted(legacy):
+            if not storage.exists(old):
+                missing.append(old)
+                continue
+            with storage.open(old, "rb") as f:
+                content = File(f, old)
+                new = content_name(old, file_digest(content))
+                # Only the first copy of each content survives, in its new place.
+                if new in created or storage.exists(new):
+                    reclaimed += storage.size(old)
+                else:
+                    created.add(new)
+                if not dry_run:
+                    storage.save(old, content)
+            moved[old] = new
+
+        changed = 0
+        if not dry_run:
+            for model, field in content_fields():
+                renamed = []
+                for old, new in moved.items():
+                    if model._default_manager.filter(**{field: old}).update(**{field: new}):
+                        renamed.append(new)
+                changed += len(renamed)
+                if model is Product and renamed:
+                    # The cached cards carry the old URLs.
+                    bump_card_versions(Product.objects.filter(image__in=renamed))
+            for old in moved:
+                storage.delete(old)
+            rebuild_refcounts()
+            if changed:
+                bump_catalog_version()
+
+        for name in missing:
+            self.stderr.write(f"Missing file: {name}")
+        prefix = "Would move" if dry_run else "Moved"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {len(moved)} files to {len(set(moved.values()))} content names "
+            f"({changed} names rewritten, {reclaimed} bytes of duplicates reclaimed)."
+        ))
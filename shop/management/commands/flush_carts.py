@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.carts import flush_carts
+
+
+class Command(BaseCommand):
+    help = "Write the cached anonymous carts changed since the previous run to the database (CART_STORE = 'cache')."
+
+    def handle(self, *args, **options):
+        if settings.CART_STORE != "cache":
+            self.stdout.write("CART_STORE is not 'cache'; carts are already in the database.")
+            return
+        flushed = flush_carts()
+        self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} carts."))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from shop.cleanup import Purge, vacuum
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the carts of expired or missing sessions and the expired sessions, in small batches. "
+        "Meant to run periodically (see shop.cleanup)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows deleted per transaction.")
+        parser.add_argument("--pause", type=float, default=0.2, help="Seconds to wait between batches.")
+        parser.add_argument(
+            "--vacuum", action="store_true",
+            help="Return the freed pages to the filesystem afterwards (SQLite).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Count what would be deleted.")
+
+    def handle(self, *args, **options):
+        purge = Purge(batch_size=options["batch_size"], pause=options["pause"], dry_run=options["dry_run"])
+        reclaimed = purge.run()
+
+        prefix = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} " + ", ".join(f"{count} {table}" for table, count in reclaimed.items()) + "."
+        ))
+        if options["vacuum"] and not options["dry_run"]:
+            released = vacuum(pause=options["pause"])
+            if released is None:
+                self.stdout.write("Not a SQLite database; nothing to vacuum.")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Vacuum released {released} bytes."))
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.images import delete_derivatives
+from shop.models import StoredFile
+from shop.storage import content_storage, name_digest, referenced_names
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed media files that no row references any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours", type=float, default=24,
+            help="Keep files released (or uploaded) less than this long ago.",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        storage = content_storage()
+        cutoff = timezone.now() - timedelta(hours=options["grace_hours"])
+        # The counters are a hint: recheck against the rows before deleting anything.
+        live = referenced_names()
+        live_digests = {name_digest(name) for name in live}
+
+        deleted, freed, recounted = 0, 0, 0
+        for stored in StoredFile.objects.filter(refs=0, updated_at__lt=cutoff).order_by("id"):
+            if stored.name in live:
+                StoredFile.objects.filter(pk=stored.pk).update(refs=live[stored.name])
+                recounted += 1
+                continue
+            deleted += 1
+            freed += stored.size
+            if options["dry_run"]:
+                continue
+            storage.delete(stored.name)
+            digest = name_digest(stored.name)
+            if digest and digest not in live_digests:
+                delete_derivatives(digest)
+            stored.delete()
+
+        prefix = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {deleted} orphaned files ({freed} bytes); {recounted} miscounted files kept."
+        ))
@@ -0,0 +1,110 @@
+"""
+Serves the built static assets (see shop.staticfiles) straight from
+STATIC_ROOT when no reverse proxy sits in front of Django.
+
+Fingerprinted names from the manifest are immutable and cached for a
+year; anything else must be revalidated. The .br or .gz sibling is sent
+when the client accepts it. Requests for files that are not in
+STATIC_ROOT fall through to the rest of the stack.
+"""
+import json
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+TEXT_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+
+def accepted_encodings(header):
+    """The content codings an Accept-Encoding header allows; a q of 0 refuses one."""
+    accepted, refused = set(), set()
+    for token in header.split(","):
+        coding, *params = [part.strip() for part in token.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except SuspiciousFileOperation:
+                    q = 0.0
+        (accepted if q > 0 else refused).add(coding.lower())
+    if "*" in accepted:
+        accepted |= {coding for coding, _ in ENCODINGS}
+    return accepted - refused
+
+
+class StaticAssetsMiddleware:
+    def __init__(self, get_response):
+        if not settings.SERVE_STATIC or not settings.STATIC_ROOT or "://" in settings.STATIC_URL:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.root = str(settings.STATIC_ROOT)
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith("/") else f"/{settings.STATIC_URL}"
+        self.manifest_path = os.path.join(self.root, "staticfiles.json")
+        self.manifest_mtime = None
+        self.hashed = frozenset()
+
+    def hashed_names(self):
+        """The fingerprinted names of the current build (reloaded after each collectstatic)."""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            return frozenset()
+        if mtime != self.manifest_mtime:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.hashed = frozenset(json.load(f).get("paths", {}).values())
+            self.manifest_mtime = mtime
+        return self.hashed
+
+    def __call__(self, request):
+        if request.method not in ("GET", "HEAD") or not request.path.startswith(self.prefix):
+            return self.get_response(request)
+        name = request.path[len(self.prefix):]
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            # Outside STATIC_ROOT (../ and the like): not ours to answer.
+            return self.get_response(request)
+        if name.endswith((".gz", ".br")) or not os.path.isfile(path):
+            return self.get_response(request)
+        return self.serve(request, name, path)
+
+    def serve(self, request, name, path):
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith(TEXT_TYPES):
+            content_type += "; charset=utf-8"
+        encoding = None
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        for candidate, suffix in ENCODINGS:
+            if candidate in accepted and os.path.isfile(path + suffix):
+                encoding, path = candidate, path + suffix
+                break
+
+        stat = os.stat(path)
+        response = get_conditional_response(request, last_modified=int(stat.st_mtime))
+        if response is None:
+            if request.method == "HEAD":
+                response = HttpResponse(content_type=content_type)
+            else:
+                response = FileResponse(open(path, "rb"), content_type=content_type)
+            response["Content-Length"] = stat.st_size
+            if encoding:
+                response["Content-Encoding"] = encoding
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if name in self.hashed_names():
+            patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+        return response
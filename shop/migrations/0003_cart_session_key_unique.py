@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+def drop_duplicate_carts(apps, schema_editor):
+    # Same rule get_user_cart applied so far: the oldest cart of a session wins.
+    Cart = apps.get_model("shop", "Cart")
+    keep = {}
+    for pk, session_key in Cart.objects.exclude(session_key=None).order_by("id").values_list("id", "session_key"):
+        keep.setdefault(session_key, pk)
+    Cart.objects.exclude(session_key=None).exclude(pk__in=keep.values()).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_storedfile'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_carts, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cart',
+            name='session_key',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -4,8 +4,11 @@ from products.models import Product
 
 class Cart(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
-    session_key = models.CharField(max_length=255, null=True, blank=True)
+    # One cart per session; shop.utils.get_user_cart relies on it to resolve carts race-free.
+    session_key = models.CharField(max_length=255, null=True, blank=True, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Moves on every change to the cart's lines; delta responses carry it (see shop.views).
+    version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         if self.user:
@@ -35,3 +38,17 @@ class CartItem(models.Model):
 
     def total_price(self):
         return float(self.price) * self.quantity
+
+
+class StoredFile(models.Model):
+    """
+    A file in the content-addressed media storage and the number of rows
+    pointing at it (see shop.storage). Files at zero refs are orphans.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refs = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} refs)"
@@ -1,7 +1,8 @@
 # shop/serializers.py
 from rest_framework import serializers
 from .models import Cart, CartItem
-from products.serializers import ProductSerializer  # optional, if you want product details
+from products.serializers import BatchedListSerializer, ProductSerializer, absolute, image_srcset  # optional, if you want product details
+from products.images import image_widths, thumbnail_url
 from products.models import Product
 
 
@@ -16,10 +17,15 @@ class CartItemSerializer(serializers.ModelSerializer):
     price = serializers.DecimalField(source="product.price", max_digits=10, decimal_places=2, read_only=True)
     average_rating = serializers.FloatField(source="product.average_rating", read_only=True)
 
+    thumbnail = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+
     total_price = serializers.SerializerMethodField()
 
     class Meta:
         model = CartItem
+        list_serializer_class = BatchedListSerializer
+        batch_prefetch = ["product__brand", "product__category", "product__subcategory", "product__rating_stats"]
         fields = [
             "id",
             "product",  # keep reference to product object (optional)
@@ -29,12 +35,21 @@ class CartItemSerializer(serializers.ModelSerializer):
             "category",
             "subcategory",
             "image",
+            "thumbnail",
+            "image_srcset",
             "price",
             "quantity",
             "total_price",
             "average_rating",
         ]
 
+    def get_thumbnail(self, obj):
+        # The smallest derivative: the cart shows its images at thumbnail size.
+        return absolute(self.context.get("request"), thumbnail_url(obj.product, min(image_widths())))
+
+    def get_image_srcset(self, obj):
+        return image_srcset(self.context.get("request"), obj.product)
+
     def get_total_price(self, obj):
         try:
             return float(obj.product.price) * obj.quantity
@@ -60,6 +60,7 @@ SIMPLE_JWT = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'shop.middleware.StaticAssetsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -100,6 +101,25 @@ DATABASES = {
     }
 }
 
+# Cache: per-process local memory by default; CACHE_BACKEND=file shares one
+# directory cache between the workers of a host
+if os.environ.get('CACHE_BACKEND') == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', BASE_DIR / 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'shop',
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
@@ -117,11 +137,63 @@ USE_TZ = True
 # Static files
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+# collectstatic builds fingerprinted, minified and precompressed copies here (see shop.staticfiles)
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'shop.staticfiles.BuildStaticFilesStorage'},
+}
+# Serve STATIC_ROOT from Django itself (shop.middleware) when no reverse proxy does
+SERVE_STATIC = os.environ.get('SERVE_STATIC', 'True') == 'True'
 
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Seconds a worker trusts its in-memory catalog snapshot before re-checking
+# the shared catalog version (see products.catalog)
+CATALOG_SNAPSHOT_CHECK_INTERVAL = 2
+
+# Similar products: list length, and how many nearest-priced products on each
+# side are scored per product (see products.similar)
+SIMILAR_PRODUCTS_COUNT = 10
+SIMILAR_PRODUCTS_WINDOW = 50
+
+# Cache alias and lifetime of the rendered storefront product cards (see
+# products.cards); keys are versioned, so the timeout only bounds memory
+PRODUCT_CARD_CACHE = 'default'
+PRODUCT_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Anonymous full-page cache (see products.pagecache): seconds an entry is
+# fresh, then how long it may still be served while one request re-renders
+PAGE_CACHE = 'default'
+PAGE_CACHE_TIMEOUT = 60
+PAGE_CACHE_STALE_TIMEOUT = 300
+
+# Seconds shared caches may reuse a catalog API response before revalidating
+# it with its ETag (see products.conditional)
+CATALOG_API_SHARED_MAX_AGE = 30
+
+# Cache holding the counted category tree of /api/categories/ (keyed by catalog version)
+CATEGORY_TREE_CACHE = 'default'
+CATEGORY_TREE_CACHE_TIMEOUT = 86400
+
+# Widths (px) of the WebP derivatives generated for product images, and their quality
+PRODUCT_IMAGE_WIDTHS = [200, 400, 800]
+PRODUCT_IMAGE_QUALITY = 80
+
+# Where carts live: 'database' (Cart rows), or 'cache' to keep anonymous
+# carts in CART_CACHE and write them to the database only at sign-in,
+# checkout and `manage.py flush_carts` (see shop.carts). The cache store
+# needs a cache shared by all processes (CACHE_BACKEND=file)
+CART_STORE = os.environ.get('CART_STORE', 'database')
+CART_CACHE = 'default'
+
+# Cache alias and lifetime of memoized cart quotes (see orders.pricing); keys
+# carry the cart, catalog and coupon, so the timeout only bounds coupon edits
+QUOTE_CACHE = 'default'
+QUOTE_CACHE_TIMEOUT = 300
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -131,6 +203,11 @@ LOGOUT_REDIRECT_URL = '/'
 # Stripe keys (from environment)
 STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY")
 STRIPE_PUBLIC_KEY = os.environ.get("STRIPE_PUBLIC_KEY")
+# Stripe API base URL (the local stub, `manage.py stripe_stub`, works offline),
+# (connect, read) timeouts in seconds and retries of failed calls (see orders.payments)
+STRIPE_API_BASE = os.environ.get("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_TIMEOUT = (3.05, 20)
+STRIPE_MAX_NETWORK_RETRIES = 2
 
 # Email configuration (from environment)
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
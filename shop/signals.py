@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .storage import content_fields, release, retain
+
+
+# ---------------- STORED FILE REFCOUNTS ----------------
+def remember_stored_files(sender, instance, raw=False, **kwargs):
+    instance._stored_files = {}
+    if raw or instance.pk is None:
+        return
+    fields = [field for model, field in content_fields() if model is sender]
+    row = sender._default_manager.filter(pk=instance.pk).values(*fields).first()
+    if row is not None:
+        instance._stored_files = row
+
+
+def count_stored_files(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, "_stored_files", {})
+    for model, field in content_fields():
+        if model is not sender or (update_fields is not None and field not in update_fields):
+            continue
+        before, after = old.get(field) or "", getattr(instance, field).name or ""
+        if before == after:
+            continue
+        if after:
+            retain(after)
+        if before:
+            release(before)
+
+
+def release_stored_files(sender, instance, **kwargs):
+    for model, field in content_fields():
+        if model is sender and getattr(instance, field).name:
+            release(getattr(instance, field).name)
+
+
+def connect_stored_file_signals():
+    for model in {model for model, field in content_fields()}:
+        label = model._meta.label
+        pre_save.connect(remember_stored_files, sender=model, dispatch_uid=f"stored_files_pre_save_{label}")
+        post_save.connect(count_stored_files, sender=model, dispatch_uid=f"stored_files_save_{label}")
+        post_delete.connect(release_stored_files, sender=model, dispatch_uid=f"stored_files_delete_{label}")
+
+
+# ---------------- CACHED CARTS ----------------
+def hand_over_cached_cart(sender, request, user, **kwargs):
+    """At sign-in the anonymous cart moves from the cache to its Cart row (see shop.carts)."""
+    from .carts import CART_TOKEN_KEY, CachedCart
+
+    if settings.CART_STORE == "cache" and request is not None and CART_TOKEN_KEY in request.session:
+        CachedCart(request).hand_over()
+
+
+def connect_cart_signals():
+    user_logged_in.connect(hand_over_cached_cart, dispatch_uid="hand_over_cached_cart")
@@ -0,0 +1,93 @@
+"""
+Static asset build: collectstatic fingerprints, minifies and precompresses.
+
+    python manage.py collectstatic --noinput --clear
+
+copies static/ to STATIC_ROOT through BuildStaticFilesStorage, which
+
+- minifies CSS and JavaScript as they are copied (rcssmin / rjsmin),
+- stores a content-hashed copy of every file (css/style.3f2a1b9c8d7e.css)
+  and records the mapping in STATIC_ROOT/staticfiles.json, rewriting the
+  url() references between stylesheets and fonts on the way,
+- writes .gz and .br siblings next to every text asset.
+
+{% static %} resolves names through that manifest, so a deploy changes
+the URL of every asset whose content changed and the hashed URLs can be
+cached forever (see shop.middleware.StaticAssetsMiddleware). Without a
+build (development, tests) the plain names are used.
+
+The minifiers and Brotli are optional: without them files are copied as
+they are and only .gz siblings are written.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".ttf", ".otf", ".map")
+# A sibling that saves less than this fraction is not worth the extra file.
+MIN_SAVING = 0.05
+
+
+def minify(name, text):
+    if ".min." in name:
+        return text
+    if name.endswith(".css") and rcssmin:
+        return rcssmin.cssmin(text)
+    if name.endswith(".js") and rjsmin:
+        return rjsmin.jsmin(text)
+    return text
+
+
+def compressed_variants(data):
+    """(suffix, bytes) of the precompressed siblings worth writing for data."""
+    variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli:
+        variants.append((".br", brotli.compress(data, quality=11)))
+    return [(suffix, packed) for suffix, packed in variants if len(packed) < len(data) * (1 - MIN_SAVING)]
+
+
+class BuildStaticFilesStorage(ManifestStaticFilesStorage):
+    def _save(self, name, content):
+        if name.endswith((".css", ".js")):
+            content = ContentFile(minify(name, b"".join(content.chunks()).decode("utf-8")).encode("utf-8"))
+        return super()._save(name, content)
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected yet: serve the plain name.
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                self.write_compressed(name)
+
+    def write_compressed(self, name):
+        with self.open(name) as f:
+            data = f.read()
+        for suffix, packed in compressed_variants(data):
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            super()._save(name + suffix, ContentFile(packed))
@@ -0,0 +1,146 @@
+"""
+Content-addressed media storage for uploaded images.
+
+Product.image and CustomUser.profile_image store their files under the
+sha256 of the bytes instead of the uploaded name:
+
+    products/ab/abcdef....jfif
+
+Uploading the same bytes again resolves to the file that is already
+there, so re-uploads are no-ops and nothing gets a random suffix.
+
+Because a file may be shared by many rows, it can only go once nothing
+points at it. StoredFile keeps a reference count per file, maintained by
+the signals in shop.signals for every field using this storage; the
+purge_media_orphans command deletes the files left at zero. Writes that
+bypass the model signals (queryset.update(), the catalog importer) are
+caught up by dedupe_media, which also moves files stored under their
+upload names to their content names.
+"""
+import functools
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils import timezone
+
+CONTENT_NAME = re.compile(r"(?:^|/)([0-9a-f]{2})/(\1[0-9a-f]{62})(\.[^/]*)?$")
+
+
+def file_digest(content):
+    """sha256 hex digest of a File, read in chunks; leaves it rewound."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def content_name(name, digest):
+    """products/photo.JPG + digest -> products/ab/abcdef....jpg"""
+    directory, filename = posixpath.split(name)
+    extension = os.path.splitext(filename)[1].lower()
+    return posixpath.join(directory, digest[:2], digest + extension)
+
+
+def name_digest(name):
+    """The digest a content name was stored under, or None for any other name."""
+    match = CONTENT_NAME.search(name or "")
+    return match.group(2) if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = content_name(name, file_digest(content))
+        validate_file_name(name, allow_relative_path=True)
+        if not self.exists(name):
+            try:
+                self._save(name, content)
+            except FileExistsError:
+                # Written concurrently by another upload of the same bytes.
+                pass
+        track(name, self.size(name))
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Only reached when _save loses a race for a content name: the file
+        # already holds the same bytes, there is no other name to pick.
+        raise FileExistsError(name)
+
+
+_storage = ContentAddressedStorage()
+
+
+def content_storage():
+    """Callable for FileField(storage=...), so migrations reference it by path."""
+    return _storage
+
+
+# ---------------- REFERENCE COUNTS ----------------
+def track(name, size):
+    """Registers a stored file (with no references yet)."""
+    from .models import StoredFile
+    StoredFile.objects.get_or_create(name=name, defaults={"size": size})
+
+
+def retain(name):
+    from .models import StoredFile
+    if not StoredFile.objects.filter(name=name).update(refs=F("refs") + 1, updated_at=Now()):
+        size = _storage.size(name) if _storage.exists(name) else 0
+        StoredFile.objects.get_or_create(name=name, defaults={"size": size, "refs": 1})
+
+
+def release(name):
+    from .models import StoredFile
+    StoredFile.objects.filter(name=name, refs__gt=0).update(refs=F("refs") - 1, updated_at=Now())
+
+
+@functools.lru_cache(maxsize=None)
+def content_fields():
+    """(model, field name) of every file field stored in this storage."""
+    from django.apps import apps
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(getattr(field, "storage", None), ContentAddressedStorage)
+    ]
+
+
+def referenced_names():
+    """{name: number of rows pointing at it} across all content fields."""
+    counts = {}
+    for model, field in content_fields():
+        for name in model._default_manager.exclude(**{field: ""}).exclude(**{field: None}).values_list(field, flat=True):
+            counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def rebuild_refcounts():
+    """Recounts every StoredFile from the rows; returns the number of rows changed."""
+    from .models import StoredFile
+    counts = referenced_names()
+    now = timezone.now()
+    changed = []
+    for stored in StoredFile.objects.all():
+        refs = counts.pop(stored.name, 0)
+        if stored.refs != refs:
+            stored.refs, stored.updated_at = refs, now
+            changed.append(stored)
+    StoredFile.objects.bulk_update(changed, ["refs", "updated_at"], batch_size=500)
+    StoredFile.objects.bulk_create([
+        StoredFile(name=name, refs=refs, size=_storage.size(name) if _storage.exists(name) else 0)
+        for name, refs in counts.items()
+    ], batch_size=500)
+    return len(changed) + len(counts)
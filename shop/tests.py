@@ -0,0 +1,274 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from PIL import Image
+
+from products.images import derivative_name, image_widths
+from products.models import Brand, Category, Product, SubCategory
+from .carts import flush_carts
+from .middleware import StaticAssetsMiddleware
+from .models import Cart, CartItem, StoredFile
+from .storage import content_storage, name_digest, rebuild_refcounts
+from .utils import get_user_cart
+
+
+class CartApiQueryTests(TestCase):
+    def setUp(self):
+        self.brand = Brand.objects.create(name="Acme")
+        self.category = Category.objects.create(name="Audio")
+        self.subcategory = SubCategory.objects.create(name="Speakers", category=self.category)
+
+    def fill_cart(self, n):
+        # The first request creates the session and its cart.
+        self.client.get("/api/cart/")
+        cart = get_user_cart(self.client)
+        for i in range(n):
+            product = Product.objects.create(
+                name=f"Speaker {i}", description="", brand=self.brand, category=self.category,
+                subcategory=self.subcategory, price=10 + i, stock=5,
+            )
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+
+    def queries_for_cart(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/cart/")
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_cart_query_count_is_constant(self):
+        self.fill_cart(1)
+        small, _ = self.queries_for_cart()
+        self.fill_cart(30)
+        large, data = self.queries_for_cart()
+        self.assertEqual(len(data), 31)
+        self.assertEqual(data[0]["brand"], "Acme")
+        self.assertEqual(large, small)
+        self.assertLessEqual(large, 4)
+
+    def test_cart_is_resolved_from_the_session(self):
+        self.client.get("/api/cart/")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/cart/")
+        cart_queries = [q["sql"] for q in queries if '"shop_cart"' in q["sql"] and "shop_cartitem" not in q["sql"]]
+        self.assertEqual(len(cart_queries), 1)
+        self.assertIn('"shop_cart"."id" =', cart_queries[0])
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_delta_mutations_return_the_changed_line(self):
+        self.fill_cart(3)
+        response = self.client.get("/api/cart/")
+        version = int(response["X-Cart-Version"])
+        item = response.json()[0]
+
+        response = self.client.post(
+            "/api/cart/update/", {"item_id": item["id"], "quantity": 4}, content_type="application/json",
+            HTTP_X_CART_DELTA="1", HTTP_X_CART_VERSION=str(version),
+        )
+        data = response.json()
+        self.assertEqual(data["item"]["quantity"], 4)
+        self.assertEqual(data["version"], version + 1)
+        self.assertFalse(data["stale"])
+        self.assertEqual(data["totals"]["quantity"], 6)
+
+        # A client still holding the old version is told to refetch.
+        response = self.client.delete(
+            f"/api/cart/remove/{item['id']}/?delta=1", HTTP_X_CART_VERSION=str(version)
+        )
+        data = response.json()
+        self.assertTrue(data["stale"])
+        self.assertEqual(data["removed"], item["id"])
+        self.assertEqual(data["totals"]["lines"], 2)
+
+    def test_purge_deletes_carts_of_dead_sessions(self):
+        now = timezone.now()
+        Session.objects.create(session_key="live", session_data="", expire_date=now + timedelta(days=1))
+        Session.objects.create(session_key="expired", session_data="", expire_date=now - timedelta(days=1))
+        product = Product.objects.create(name="Speaker", description="", category=self.category, price=10, stock=5)
+        for key in ("live", "expired", "missing"):
+            CartItem.objects.create(cart=Cart.objects.create(session_key=key), product=product)
+
+        out = StringIO()
+        call_command("purge_carts", batch_size=1, pause=0, stdout=out)
+        self.assertIn("Deleted 2 carts, 2 cart items, 1 sessions.", out.getvalue())
+        self.assertEqual(list(Cart.objects.values_list("session_key", flat=True)), ["live"])
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["live"])
+
+    def test_batch_applies_operations_in_order(self):
+        self.fill_cart(2)
+        first, second = self.client.get("/api/cart/").json()
+        extra = Product.objects.create(
+            name="Sub", description="", brand=self.brand, category=self.category,
+            subcategory=self.subcategory, price=50, stock=3,
+        )
+        operations = [
+            {"op": "add", "product_id": extra.pk, "quantity": 5},
+            {"op": "set", "item_id": first["id"], "quantity": 4},
+            {"op": "set", "item_id": second["id"], "quantity": 99},
+            {"op": "remove", "item_id": second["id"]},
+            {"op": "add", "product_id": 0},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/cart/batch/", {"operations": operations}, content_type="application/json",
+                HTTP_X_CART_DELTA="1",
+            )
+        data = response.json()
+        self.assertEqual([r["ok"] for r in data["results"]], [True, True, False, True, False])
+        self.assertEqual(data["removed"], [second["id"]])
+        quantities = {item["product"]: item["quantity"] for item in data["items"]}
+        self.assertEqual(quantities, {first["product"]: 4, extra.pk: 3})
+        self.assertEqual(data["totals"]["quantity"], 7)
+        self.assertLessEqual(len(queries), 16)
+
+        response = self.client.post("/api/cart/batch/", {"operations": []}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CART_STORE="cache")
+class CachedCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Audio")
+        self.products = [
+            Product.objects.create(name=f"Speaker {i}", description="", category=category, price=10, stock=5)
+            for i in range(2)
+        ]
+
+    def test_anonymous_cart_is_written_behind(self):
+        first, second = self.products
+        self.client.post("/api/cart/add/", {"item_id": first.pk, "quantity": 2}, content_type="application/json")
+        data = self.client.post(
+            "/api/cart/add/", {"item_id": second.pk}, content_type="application/json", HTTP_X_CART_DELTA="1",
+        ).json()
+        self.assertEqual((data["item"]["id"], data["version"]), (second.pk, 2))
+        self.assertEqual(data["totals"], {"lines": 2, "quantity": 3, "total_price": 30.0})
+        self.client.post("/api/cart/update/", {"item_id": first.pk, "quantity": 4}, content_type="application/json")
+        self.assertFalse(CartItem.objects.exists())
+
+        self.assertEqual(flush_carts(), 1)
+        self.assertEqual(flush_carts(), 0)
+        cart = Cart.objects.get()
+        self.assertEqual(cart.version, 3)
+        self.assertEqual(dict(cart.items.values_list("product_id", "quantity")), {first.pk: 4, second.pk: 1})
+
+        # Signing in moves the cart to its row for good.
+        self.client.delete(f"/api/cart/remove/{second.pk}/")
+        user = get_user_model().objects.create_user("buyer", password="secret-pass-1")
+        self.client.force_login(user)
+        response = self.client.get("/api/cart/")
+        self.assertEqual([item["product"] for item in response.json()], [first.pk])
+        self.assertEqual(response["X-Cart-Version"], "4")
+        self.assertEqual(Cart.objects.get().items.count(), 1)
+
+    def test_form_adds_to_the_cart(self):
+        product = self.products[0]
+        for _ in range(2):
+            response = self.client.post(f"/add-to-cart/{product.pk}/")
+            self.assertRedirects(response, "/products/", fetch_redirect_response=False)
+        self.assertEqual([(item["product"], item["quantity"]) for item in self.client.get("/api/cart/").json()], [(product.pk, 2)])
+        self.assertEqual(self.client.post("/add-to-cart/0/").status_code, 404)
+
+
+class StaticAssetsMiddlewareTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        for name, data in (("app.js", b"plain"), ("app.js.gz", b"gzipped")):
+            with open(os.path.join(root.name, name), "wb") as f:
+                f.write(data)
+        with override_settings(SERVE_STATIC=True, STATIC_ROOT=root.name, STATIC_URL="/static/"):
+            self.middleware = StaticAssetsMiddleware(lambda request: HttpResponse("app", status=404))
+
+    def get(self, path, **headers):
+        return self.middleware(RequestFactory().get(path, **headers))
+
+    def test_encoding_follows_accept_encoding_tokens(self):
+        response = self.get("/static/app.js", HTTP_ACCEPT_ENCODING="br, gzip;q=0.5")
+        self.assertEqual((response["Content-Encoding"], b"".join(response.streaming_content)), ("gzip", b"gzipped"))
+        response = self.get("/static/app.js", HTTP_ACCEPT_ENCODING="gzip;q=0, deflate")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content), b"plain")
+
+    def test_paths_outside_the_root_fall_through(self):
+        self.assertEqual(self.get("/static/../manage.py").status_code, 404)
+        self.assertEqual(self.get("/static/missing.js").status_code, 404)
+
+
+class StoredFileTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.category = Category.objects.create(name="Audio")
+
+    def upload(self, name, color):
+        data = BytesIO()
+        Image.new("RGB", (8, 8), color).save(data, "PNG")
+        return SimpleUploadedFile(name, data.getvalue(), content_type="image/png")
+
+    def product(self, image):
+        return Product.objects.create(name="Speaker", description="", category=self.category, price=10, image=image)
+
+    def refs(self, name):
+        return StoredFile.objects.get(name=name).refs
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command("purge_media_orphans", *args, stdout=out)
+        return out.getvalue()
+
+    def test_identical_uploads_share_one_counted_file(self):
+        first = self.product(self.upload("a.png", "red"))
+        second = self.product(self.upload("b.png", "red"))
+        shared = first.image.name
+        self.assertEqual(second.image.name, shared)
+        self.assertEqual(self.refs(shared), 2)
+
+        second.image = self.upload("c.png", "blue")
+        second.save()
+        self.assertEqual((self.refs(shared), self.refs(second.image.name)), (1, 1))
+        first.delete()
+        self.assertEqual(self.refs(shared), 0)
+        self.assertTrue(content_storage().exists(shared))
+
+        # Writes that bypass the signals are caught up by a recount.
+        StoredFile.objects.update(refs=5)
+        self.assertEqual(rebuild_refcounts(), 2)
+        self.assertEqual((self.refs(shared), self.refs(second.image.name)), (0, 1))
+
+    def test_purge_deletes_only_expired_orphans(self):
+        kept, orphan = self.product(self.upload("a.png", "red")), self.product(self.upload("b.png", "blue"))
+        name = orphan.image.name
+        digest = name_digest(name)
+        orphan.delete()
+        derivatives = [derivative_name(digest, width) for width in image_widths()]
+        self.assertTrue(all(content_storage().exists(d) for d in derivatives))
+
+        # Within the grace window.
+        self.assertIn("Deleted 0 orphaned files", self.purge())
+        self.assertTrue(content_storage().exists(name))
+
+        # Past the cutoff; the other file is miscounted at zero but a row still points at it.
+        old = timezone.now() - timedelta(days=2)
+        StoredFile.objects.update(refs=0, updated_at=old)
+        self.assertIn("Deleted 1 orphaned files", self.purge())
+        self.assertFalse(content_storage().exists(name))
+        self.assertFalse(any(content_storage().exists(d) for d in derivatives))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertTrue(content_storage().exists(kept.image.name))
+        self.assertEqual(self.refs(kept.image.name), 1)
@@ -1,20 +1,61 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Sum
+
+from .models import Cart
+
+# Session key holding the id of the session's cart.
+CART_SESSION_KEY = "cart_id"
 
-from .models import Cart, CartItem
 
 def get_user_cart(request):
-    session_key = request.session.session_key
-    if not session_key:
-        request.session.save()
-        session_key = request.session.session_key
-
-    # Remove duplicates automatically
-    carts = Cart.objects.filter(session_key=session_key)
-    if carts.count() > 1:
-        cart = carts.first()
-        carts.exclude(id=cart.id).delete()
-    elif carts.exists():
-        cart = carts.first()
-    else:
-        cart = Cart.objects.create(session_key=session_key)
+    """
+    The cart of the current session. Once the session knows its cart id
+    this is a single primary-key fetch; otherwise one lookup on the unique
+    session_key index, creating the cart if there is none. Two first
+    requests racing to create it end up with the same row.
+    """
+    session = request.session
+    session_key = session.session_key
+    cart_id = session.get(CART_SESSION_KEY)
+    if cart_id is not None:
+        cart = Cart.objects.filter(pk=cart_id).first()
+        if cart is not None:
+            if session_key and cart.session_key != session_key:
+                # The session key was cycled (login): the cart follows the session.
+                cart.session_key = session_key
+                cart.save(update_fields=["session_key"])
+            return cart
 
+    if not session_key:
+        session.save()
+        session_key = session.session_key
+    cart = Cart.objects.filter(session_key=session_key).first()
+    if cart is None:
+        try:
+            with transaction.atomic():
+                cart = Cart.objects.create(session_key=session_key)
+        except IntegrityError:
+            cart = Cart.objects.get(session_key=session_key)
+    session[CART_SESSION_KEY] = cart.pk
     return cart
+
+
+def bump_cart_version(cart):
+    """Moves cart to its next version and returns it; call inside the mutating transaction."""
+    Cart.objects.filter(pk=cart.pk).update(version=F("version") + 1)
+    cart.version = Cart.objects.filter(pk=cart.pk).values_list("version", flat=True).get()
+    return cart.version
+
+
+def cart_totals(cart):
+    """Line count, quantity and price of the cart at current product prices, in one query."""
+    totals = cart.items.aggregate(
+        line_count=Count("id"),
+        total_quantity=Sum("quantity"),
+        total=Sum(F("quantity") * F("product__price"), output_field=DecimalField()),
+    )
+    return {
+        "lines": totals["line_count"],
+        "quantity": totals["total_quantity"] or 0,
+        "total_price": float(totals["total"] or 0),
+    }
@@ -10,8 +10,8 @@ from rest_framework.response import Response
 from rest_framework import status
 
 from products.models import Product
-from .models import CartItem
-from .utils import get_user_cart
+from .batch import BatchError, parse_operations
+from .carts import get_cart
 from .serializers import CartItemSerializer
 
 
@@ -19,75 +19,158 @@ from .serializers import CartItemSerializer
 # 🔹 API VIEWS
 # ==========================
 
+# Single changes answer with the status of the error their operation hit.
+ERROR_STATUS = {
+    "Product not found": status.HTTP_404_NOT_FOUND,
+    "Item not found": status.HTTP_404_NOT_FOUND,
+    "Not enough stock": status.HTTP_400_BAD_REQUEST,
+}
+
+
+def apply_one(cart, kind, item_id=None, product_id=None, quantity=None):
+    """Applies one change through the cart store; returns (changed line, error response)."""
+    result = cart.apply([(kind, item_id, product_id, quantity)])
+    outcome = result.results[0]
+    if not outcome["ok"]:
+        return None, Response({"error": outcome["error"]}, status=ERROR_STATUS[outcome["error"]])
+    return next(iter(result.changed.values()), None), None
+
+
+def as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Delta protocol: a mutation sent with "X-Cart-Delta: 1" (or ?delta=1) answers
+# with the changed line and the cart totals instead of the whole cart. Every
+# cart response carries the cart version in X-Cart-Version; a client that
+# sends the version it holds gets "stale": true when the cart also changed
+# elsewhere, and only then needs to fetch the full cart again.
+VERSION_HEADER = "X-Cart-Version"
+
+
+def wants_delta(request):
+    return request.headers.get("X-Cart-Delta") == "1" or request.query_params.get("delta") == "1"
+
+
+def full_response(cart, data):
+    response = Response(data)
+    response[VERSION_HEADER] = cart.version
+    return response
+
+
+def is_stale(request, cart, changed=True):
+    """Whether the cart moved on from the version the client holds by more than this change."""
+    try:
+        known = int(request.headers.get(VERSION_HEADER, ""))
+    except ValueError:
+        return False
+    return known != (cart.version - 1 if changed else cart.version)
+
+
+def delta_response(request, cart, item=None, removed=None, changed=True):
+    """The changed line (or the id of the removed one), the totals and the version."""
+    response = Response({
+        "version": cart.version,
+        "stale": is_stale(request, cart, changed),
+        "item": CartItemSerializer(cart.items([item.id])[0]).data if item else None,
+        "removed": removed,
+        "totals": cart.totals(),
+    })
+    response[VERSION_HEADER] = cart.version
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def cart_api(request):
     """Return all cart items for the current user/session."""
-    cart = get_user_cart(request)
-    serializer = CartItemSerializer(cart.items.all(), many=True)
-    return Response(serializer.data)
+    cart = get_cart(request)
+    serializer = CartItemSerializer(cart.items(), many=True)
+    return full_response(cart, serializer.data)
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def add_to_cart_api(request):
     """Add a product to the cart (API version)."""
-    cart = get_user_cart(request)
-    product_id = request.data.get("item_id")
+    cart = get_cart(request)
+    product_id = as_id(request.data.get("item_id"))
     quantity = int(request.data.get("quantity", 1))
 
-    try:
-        product = Product.objects.get(id=product_id)
-    except Product.DoesNotExist:
-        return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
-
-    item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-    if not created:
-        item.quantity = min(item.quantity + quantity, product.stock)
-    else:
-        item.quantity = min(quantity, product.stock)
-    item.save()
+    item, error = apply_one(cart, "add", product_id=product_id, quantity=quantity)
+    if error:
+        return error
 
-    serializer = CartItemSerializer(cart.items.all(), many=True)
-    return Response(serializer.data)
+    if wants_delta(request):
+        return delta_response(request, cart, item=item)
+    serializer = CartItemSerializer(cart.items(), many=True)
+    return full_response(cart, serializer.data)
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def update_cart_api(request):
     """Update quantity of an item in the cart (API version)."""
-    cart = get_user_cart(request)
-    cart_item_id = request.data.get("item_id")  # now using CartItem id
+    cart = get_cart(request)
+    cart_item_id = as_id(request.data.get("item_id"))  # now using CartItem id
     quantity = int(request.data.get("quantity", 1))
 
-    try:
-        item = cart.items.get(id=cart_item_id)  # fetch by CartItem ID
-    except CartItem.DoesNotExist:
-        return Response({"error": "Item not found"}, status=status.HTTP_404_NOT_FOUND)
-
-    if quantity > item.product.stock:
-        return Response({"error": "Not enough stock"}, status=status.HTTP_400_BAD_REQUEST)
-
-    item.quantity = max(1, quantity)
-    item.save()
+    item, error = apply_one(cart, "set", item_id=cart_item_id, quantity=quantity)
+    if error:
+        return error
 
-    serializer = CartItemSerializer(cart.items.all(), many=True)
-    return Response({"cart": serializer.data})  # wrap in "cart" key for JS
+    if wants_delta(request):
+        return delta_response(request, cart, item=item)
+    serializer = CartItemSerializer(cart.items(), many=True)
+    return full_response(cart, {"cart": serializer.data})  # wrap in "cart" key for JS
 
 
 @api_view(['DELETE'])
 @permission_classes([AllowAny])
 def remove_from_cart_api(request, item_id):
     """Remove a cart item by its ID."""
-    cart = get_user_cart(request)
+    cart = get_cart(request)
+    removed = bool(cart.apply([("remove", item_id, None, None)]).removed)
+
+    if wants_delta(request):
+        return delta_response(request, cart, removed=item_id, changed=removed)
+    serializer = CartItemSerializer(cart.items(), many=True)
+    return full_response(cart, {"cart": serializer.data})  # wrap in "cart" key
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def batch_cart_api(request):
+    """
+    Applies a list of add / set / remove operations in one transaction (see
+    shop.batch). Returns the per-operation results with the full cart, or
+    with only the changed lines and totals under the delta protocol.
+    """
     try:
-        item = cart.items.get(id=item_id)
-        item.delete()
-    except CartItem.DoesNotExist:
-        pass
+        operations = parse_operations(request.data)
+    except BatchError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    cart = get_cart(request)
+    result = cart.apply(operations)
+
+    if wants_delta(request):
+        ids = [line.id for line in result.changed.values()]
+        response = Response({
+            "results": result.results,
+            "version": cart.version,
+            "stale": is_stale(request, cart, result.applied),
+            "items": CartItemSerializer(cart.items(ids), many=True).data,
+            "removed": result.removed,
+            "totals": cart.totals(),
+        })
+        response[VERSION_HEADER] = cart.version
+        return response
+    serializer = CartItemSerializer(cart.items(), many=True)
+    return full_response(cart, {"results": result.results, "cart": serializer.data})
 
-    serializer = CartItemSerializer(cart.items.all(), many=True)
-    return Response({"cart": serializer.data})  # wrap in "cart" key
 
 # ==========================
 # 🔹 TEMPLATE (SECURE) VIEW
@@ -104,15 +187,9 @@ def add_to_cart(request, product_id):
           <button type="submit">Add to Cart</button>
       </form>
     """
-    cart = get_user_cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(Product, id=product_id)
+    apply_one(cart, "add", product_id=product.id, quantity=1)
 
-    item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-    if not created:
-        item.quantity = min(item.quantity + 1, product.stock)
-    else:
-        item.quantity = 1
-    item.save()
-
-    # Redirect back to main page (adjust name as needed)
-    return redirect('products_page')
+    # Redirect back to the products page
+    return redirect('products-page')
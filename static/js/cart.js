@@ -14,6 +14,7 @@ document.addEventListener("DOMContentLoaded", () => {
   const couponMessage = document.getElementById("coupon-message");
 
   let cart = [];
+  let cartVersion = null;
   let stripe, cardElementMounted = false, cardElement;
   let isProcessing = false;
 
@@ -41,6 +42,7 @@ document.addEventListener("DOMContentLoaded", () => {
       });
       const data = await resp.json();
       cart = data;
+      cartVersion = resp.headers.get("X-Cart-Version");
       renderCart();
       await fetchDiscountedTotal();
     } catch (err) {
@@ -54,15 +56,8 @@ document.addEventListener("DOMContentLoaded", () => {
     if (!cart.length) return;
 
     try {
-      const resp = await fetch("/orders/create-payment-intent/", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          "X-CSRFToken": getCookie("csrftoken"),
-        },
-        credentials: "include",
-        body: JSON.stringify({ cart }),
-      });
+      // Pricing only: the PaymentIntent is created when the visitor pays.
+      const resp = await fetch("/orders/quote/", { credentials: "include" });
 
       const data = await resp.json();
 
@@ -108,7 +103,7 @@ document.addEventListener("DOMContentLoaded", () => {
       const div = document.createElement("div");
       div.classList.add("cart-item");
       div.innerHTML = `
-        ${item.image ? `<img src="${item.image}" class="cart-item-image">` : ""}
+        ${item.image ? `<img src="${item.thumbnail || item.image}" class="cart-item-image" loading="lazy">` : ""}
         <h3>${item.name}</h3>
         <p>Brand: ${item.brand || "N/A"}</p>
         <p>Category: ${item.category || "N/A"}</p>
@@ -140,41 +135,71 @@ document.addEventListener("DOMContentLoaded", () => {
     };
   }
 
-  const debouncedUpdateCart = debounce(async (id, quantity) => {
+  // ---------------- DELTA UPDATES ----------------
+  // Mutations ask for the changed line only; the full cart is refetched
+  // when the server reports that it also changed somewhere else.
+  function deltaHeaders() {
+    const headers = { "X-CSRFToken": getCookie("csrftoken"), "X-Cart-Delta": "1" };
+    if (cartVersion !== null) headers["X-Cart-Version"] = cartVersion;
+    return headers;
+  }
+
+  async function applyDelta(resp) {
+    const data = await resp.json();
+    if (!resp.ok) {
+      console.error("Cart change rejected:", data.error);
+      return fetchCart();
+    }
+    if (data.stale) return fetchCart();
+
+    cartVersion = data.version;
+    // Single changes answer with item/removed, batches with items/removed lists.
+    const removed = [].concat(data.removed ?? []).map(Number);
+    cart = cart.filter(item => !removed.includes(item.id));
+    for (const changed of data.items || (data.item ? [data.item] : [])) {
+      const index = cart.findIndex(item => item.id === changed.id);
+      if (index >= 0) cart[index] = changed;
+      else cart.push(changed);
+    }
+    renderCart();
+    await fetchDiscountedTotal();
+  }
+
+  // Quantity edits are collected and sent together as one batch once the
+  // user pauses, so quick edits on several lines cost a single request.
+  const pendingQuantities = new Map();
+
+  const flushQuantities = debounce(async () => {
+    const operations = [...pendingQuantities].map(([id, quantity]) => ({ op: "set", item_id: id, quantity }));
+    pendingQuantities.clear();
+    if (!operations.length) return;
     try {
-      const resp = await fetch("/api/cart/update/", {
+      const resp = await fetch("/api/cart/batch/", {
         method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          "X-CSRFToken": getCookie("csrftoken"),
-        },
+        headers: { ...deltaHeaders(), "Content-Type": "application/json" },
         credentials: "include",
-        body: JSON.stringify({ item_id: id, quantity }),
+        body: JSON.stringify({ operations }),
       });
-
-      const data = await resp.json();
-      cart = data.cart;
-      renderCart();
-      await fetchDiscountedTotal();
-
+      await applyDelta(resp);
     } catch (err) {
       console.error("Cart update failed:", err);
     }
   }, 400);
 
+  function debouncedUpdateCart(id, quantity) {
+    pendingQuantities.set(Number(id), quantity);
+    flushQuantities();
+  }
+
   // ---------------- REMOVE ITEM ----------------
   async function removeFromCart(id) {
     try {
       const resp = await fetch(`/api/cart/remove/${id}/`, {
         method: "DELETE",
-        headers: { "X-CSRFToken": getCookie("csrftoken") },
+        headers: deltaHeaders(),
         credentials: "include",
       });
-
-      const data = await resp.json();
-      cart = data.cart;
-      renderCart();
-      await fetchDiscountedTotal();
+      await applyDelta(resp);
     } catch (err) {
       console.error("Remove failed:", err);
     }
@@ -279,7 +304,6 @@ document.addEventListener("DOMContentLoaded", () => {
           body: JSON.stringify({
             address,
             email,
-            cart,
             paymentIntentId: "FREE_ORDER",
           }),
         });
@@ -316,7 +340,6 @@ document.addEventListener("DOMContentLoaded", () => {
         body: JSON.stringify({
           address,
           email,
-          cart,
           paymentIntentId: result.paymentIntent.id,
         }),
       });
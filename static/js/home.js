@@ -30,6 +30,7 @@ document.addEventListener('click', async function (event) {
             headers: {
                 'Content-Type': 'application/json',
                 'X-CSRFToken': getCSRFToken(),
+                'X-Cart-Delta': '1', // the response body is not used
             },
             body: JSON.stringify({
                 item_id: productId,
@@ -42,3 +42,71 @@ document.addEventListener("DOMContentLoaded", () => {
     });
 });
 
+
+
+// ---------------- Load more reviews ----------------
+
+// Same conversion as the stars10to5 template filter
+function stars10to5(rating) {
+    const fiveScale = rating / 2;
+    const stars = [];
+    for (let i = 1; i <= 5; i++) {
+        if (fiveScale >= i) stars.push("fa-solid fa-star");
+        else if (fiveScale >= i - 0.5) stars.push("fa-solid fa-star-half-stroke");
+        else stars.push("fa-regular fa-star");
+    }
+    return stars;
+}
+
+function reviewItem(review) {
+    const item = document.createElement("div");
+    item.className = "review-item";
+
+    const header = document.createElement("div");
+    header.className = "user-comment-wrap";
+    const user = document.createElement("strong");
+    user.textContent = review.user || "";
+    const stars = document.createElement("span");
+    stars.className = "stars";
+    stars10to5(review.rating).forEach(cls => {
+        const star = document.createElement("i");
+        star.className = `${cls} rating`;
+        stars.appendChild(star);
+    });
+    header.append(user, stars);
+
+    const rule = document.createElement("hr");
+    rule.className = "hr";
+    const comment = document.createElement("p");
+    comment.textContent = review.comment;
+
+    item.append(header, rule, comment);
+    return item;
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+    const button = document.getElementById("load-more-reviews");
+    const list = document.getElementById("reviews-list");
+    if (!button || !list) return;
+
+    button.addEventListener("click", async () => {
+        button.disabled = true;
+        try {
+            const url = `${button.dataset.url}?cursor=${encodeURIComponent(button.dataset.cursor)}`;
+            const response = await fetch(url, { headers: { "Accept": "application/json" } });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const data = await response.json();
+
+            data.results.forEach(review => list.appendChild(reviewItem(review)));
+            if (data.next) {
+                button.dataset.cursor = data.next;
+                button.disabled = false;
+            } else {
+                button.remove();
+            }
+        } catch (error) {
+            console.error("Could not load reviews:", error);
+            button.disabled = false;
+        }
+    });
+});
@@ -61,6 +61,7 @@ async function addToCart(product) {
             headers: {
                 "Content-Type": "application/json",
                 "X-CSRFToken": getCookie("csrftoken"),
+                "X-Cart-Delta": "1", // only the changed line comes back
             },
             body: JSON.stringify({
                 item_id: parseInt(product.id),
@@ -70,7 +71,9 @@ async function addToCart(product) {
 
         if (!resp.ok) throw new Error(`Failed to add item to cart. Status: ${resp.status}`);
         const data = await resp.json();
-        cart = data; // Assuming DRF returns list of cart items
+        const index = cart.findIndex(item => item.id === data.item.id);
+        if (index >= 0) cart[index] = data.item;
+        else cart.push(data.item);
         updateCartCount();
     } catch (err) {
         console.error("Add to cart failed:", err);